@@ -0,0 +1,415 @@
+#!/usr/bin/env python3
+"""
+Mergeable aggregates for analyzer.py.
+
+An AgeHistogram bins an age column (days or months since last access) once
+into a (group, age bucket) histogram of file counts and sizes. Every
+threshold, cumulative or per-group age report is then a difference of
+cumulative sums over the buckets instead of another filtered pass over the
+files, so the number of passes does not grow with the number of thresholds.
+
+Moments and SizeStats summarize value columns the same way, and TopK keeps
+the largest files per group. Everything here can be built per chunk and
+merged, which is what the analyzer's streaming mode relies on.
+"""
+import numpy as np
+import pandas as pd
+
+# Default relative error of the SizeStats percentile estimates
+SIZE_RELATIVE_ACCURACY = 0.01
+# Width of the SizeStats mode histogram's bins: a quarter of a doubling, about 19%
+SIZE_MODE_BINS_PER_DOUBLING = 4
+# Files compared at once against the running k-th largest sizes when filling a TopK
+TOP_K_BLOCK_ROWS = 1 << 16
+
+def group_codes(codes):
+    """
+    Integer group codes as int64. Float codes are refused rather than cast: a NaN code would
+    become an arbitrary, platform-dependent group.
+    """
+    codes = np.asarray(codes)
+    if codes.size and not np.issubdtype(codes.dtype, np.integer):
+        raise TypeError(f"Group codes must be integers, not {codes.dtype}; use -1 for files without a group")
+    return codes.astype(np.int64, copy=False)
+
+class AgeHistogram:
+    """
+    File count and total size per (group, age bucket).
+
+    Bucket i holds ages with edges[i-1] < age <= edges[i]; the first bucket holds everything up
+    to edges[0] and the last everything above edges[-1]. Query bounds must be bucket edges.
+    The histogram has one row per group plus a last row for files without a group (missing
+    keys, or every file when no groups are given); totals include that row.
+    """
+    def __init__(self, edges, groups=None):
+        self.edges = np.unique(np.asarray(edges, dtype=np.float64))
+        self.groups = pd.Index([] if groups is None else groups)
+        shape = (len(self.groups) + 1, len(self.edges) + 1)
+        self.size = np.zeros(shape)
+        self.count = np.zeros(shape, dtype=np.int64)
+        self._cumulative = None
+
+    @classmethod
+    def from_values(cls, ages, sizes, edges, groups=None):
+        """
+        Build a histogram in one pass.
+
+        Args:
+            ages (array-like): Age of every file (NaN ages are skipped).
+            sizes (array-like): Size of every file.
+            edges (list): Bucket edges.
+            groups (pd.Series or None): Group key of every file; NaN keys go to the no-group row.
+
+        Returns:
+            AgeHistogram: The filled histogram.
+        """
+        if groups is None:
+            return cls.from_codes(ages, sizes, edges, np.full(len(sizes), -1), [])
+        codes, labels = pd.factorize(groups)
+        return cls.from_codes(ages, sizes, edges, codes, labels)
+
+    @classmethod
+    def from_codes(cls, ages, sizes, edges, codes, labels):
+        """
+        Build a histogram from integer group codes into labels (-1 for no group).
+        """
+        histogram = cls(edges, labels)
+        ages = np.asarray(ages, dtype=np.float64)
+        valid = ~np.isnan(ages)
+        codes = group_codes(codes)[valid]
+        rows = np.where(codes < 0, len(histogram.groups), codes)
+        buckets = np.searchsorted(histogram.edges, ages[valid], side='left')
+        cells = rows * histogram.size.shape[1] + buckets
+        weights = np.asarray(sizes, dtype=np.float64)[valid]
+        histogram.size += np.bincount(cells, weights=weights, minlength=histogram.size.size).reshape(histogram.size.shape)
+        histogram.count += np.bincount(cells, minlength=histogram.count.size).reshape(histogram.count.shape)
+        return histogram
+
+    def merge(self, other):
+        """
+        Add another histogram with the same edges into this one; groups are unioned.
+        """
+        if not np.array_equal(self.edges, other.edges):
+            raise ValueError("Cannot merge age histograms with different bucket edges")
+        groups = self.groups.append(other.groups.difference(self.groups, sort=False))
+        if len(groups) != len(self.groups):
+            extra = len(groups) - len(self.groups)
+            # Keep the no-group row last
+            self.size = np.insert(self.size, len(self.groups), np.zeros((extra, self.size.shape[1])), axis=0)
+            self.count = np.insert(self.count, len(self.groups), np.zeros((extra, self.count.shape[1]), dtype=np.int64), axis=0)
+            self.groups = groups
+        # Group labels are unique, so the rows are too
+        rows = np.append(self.groups.get_indexer(other.groups), len(self.groups))
+        self.size[rows] += other.size
+        self.count[rows] += other.count
+        self._cumulative = None
+        return self
+
+    def cumulative(self):
+        if self._cumulative is None:
+            self._cumulative = (np.cumsum(self.size, axis=1), np.cumsum(self.count, axis=1))
+        return self._cumulative
+
+    def edge_position(self, age):
+        position = np.searchsorted(self.edges, age)
+        if position >= len(self.edges) or self.edges[position] != age:
+            raise ValueError(f"{age} is not a bucket edge of this histogram")
+        return position
+
+    def select(self, min_age=None, max_age=None, counts=False):
+        """
+        Per-row totals of files with min_age < age <= max_age (open-ended when None).
+        """
+        cumulative = self.cumulative()[1 if counts else 0]
+        high = cumulative[:, -1] if max_age is None else cumulative[:, self.edge_position(max_age)]
+        low = 0 if min_age is None else cumulative[:, self.edge_position(min_age)]
+        return high - low
+
+    def by_group(self, min_age=None, max_age=None, counts=False):
+        """
+        Totals per group as a Series (files without a group are left out).
+        """
+        return pd.Series(self.select(min_age, max_age, counts)[:-1], index=self.groups)
+
+    def total(self, min_age=None, max_age=None, counts=False):
+        """
+        Total over all files, including those without a group.
+        """
+        return self.select(min_age, max_age, counts).sum()
+
+class Moments:
+    """
+    Count, means, variances and covariance of two columns, merged with Chan's pairwise formulas
+    so chunked sums stay as stable as a single pass.
+    """
+    def __init__(self):
+        self.count = 0
+        self.mean = np.zeros(2)
+        self.m2 = np.zeros((2, 2))
+
+    @classmethod
+    def from_values(cls, x, y):
+        moments = cls()
+        values = np.column_stack([np.asarray(x, dtype=np.float64), np.asarray(y, dtype=np.float64)])
+        values = values[~np.isnan(values).any(axis=1)]
+        moments.count = len(values)
+        if moments.count:
+            moments.mean = values.mean(axis=0)
+            centered = values - moments.mean
+            moments.m2 = centered.T @ centered
+        return moments
+
+    def merge(self, other):
+        count = self.count + other.count
+        if other.count:
+            delta = other.mean - self.mean
+            self.m2 = self.m2 + other.m2 + np.outer(delta, delta) * self.count * other.count / count
+            self.mean = self.mean + delta * other.count / count
+        self.count = count
+        return self
+
+    def correlation(self, names):
+        """
+        Pearson correlation matrix as a DataFrame, like DataFrame.corr().
+        """
+        scale = np.sqrt(np.diag(self.m2))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            matrix = self.m2 / np.outer(scale, scale)
+        np.fill_diagonal(matrix, np.where(scale > 0, 1.0, np.nan))
+        return pd.DataFrame(matrix, index=names, columns=names)
+
+class SizeStats:
+    """
+    One-pass file size statistics: exact count, sum, min, max, mean and standard deviation,
+    exact log and reciprocal sums of the positive sizes for the geometric and harmonic means,
+    and a histogram of log-spaced buckets (bucket i holds gamma**(i-1) < size <= gamma**i)
+    from which percentiles and the mode are estimated.
+
+    The buckets form a relative-error quantile sketch: with
+    gamma = (1 + relative_accuracy) / (1 - relative_accuracy), every estimated percentile is
+    within relative_accuracy of the true one. A 64-bit size range needs about
+    22 / relative_accuracy buckets, however many files are added. The mode comes from the
+    same buckets regrouped into a coarser log-scale histogram, since the fine buckets are
+    too narrow to have a stable most populated one.
+    """
+    def __init__(self, relative_accuracy=SIZE_RELATIVE_ACCURACY):
+        if not 0 < relative_accuracy < 1:
+            raise ValueError("relative_accuracy must be between 0 and 1")
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self.count = 0
+        self.total = 0
+        self.min = np.nan
+        self.max = np.nan
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.positive = 0
+        self.log_sum = 0.0
+        self.reciprocal_sum = 0.0
+        self.zeros = 0
+        self.buckets = np.zeros(int(np.ceil(64 * np.log(2) / np.log(self.gamma))) + 1, dtype=np.int64)
+
+    @classmethod
+    def from_values(cls, sizes, relative_accuracy=SIZE_RELATIVE_ACCURACY):
+        """
+        Summarize an array of sizes in one pass (NaN sizes are skipped).
+        """
+        stats = cls(relative_accuracy)
+        sizes = np.asarray(sizes, dtype=np.float64)
+        sizes = sizes[~np.isnan(sizes)]
+        stats.count = len(sizes)
+        if not stats.count:
+            return stats
+        stats.total = sizes.sum()
+        stats.min = sizes.min()
+        stats.max = sizes.max()
+        stats.mean = stats.total / stats.count
+        stats.m2 = np.square(sizes - stats.mean).sum()
+        positive = sizes[sizes > 0]
+        stats.positive = len(positive)
+        stats.log_sum = np.log(positive).sum()
+        stats.reciprocal_sum = (1.0 / positive).sum()
+        stats.zeros = int((sizes == 0).sum())
+        buckets = np.ceil(np.log(positive) / np.log(stats.gamma)).astype(np.int64)
+        stats.buckets += np.bincount(np.maximum(buckets, 0), minlength=len(stats.buckets))
+        return stats
+
+    def merge(self, other):
+        """
+        Add the statistics of another chunk or scan shard; both must use the same accuracy.
+        """
+        if self.relative_accuracy != other.relative_accuracy:
+            raise ValueError("Cannot merge size statistics with different relative accuracies")
+        count = self.count + other.count
+        if other.count:
+            delta = other.mean - self.mean
+            self.m2 += other.m2 + delta * delta * self.count * other.count / count
+            self.mean += delta * other.count / count
+            self.min = np.fmin(self.min, other.min)
+            self.max = np.fmax(self.max, other.max)
+        self.count = count
+        self.total += other.total
+        self.positive += other.positive
+        self.log_sum += other.log_sum
+        self.reciprocal_sum += other.reciprocal_sum
+        self.zeros += other.zeros
+        self.buckets += other.buckets
+        return self
+
+    def std(self):
+        return np.sqrt(self.m2 / (self.count - 1)) if self.count > 1 else np.nan
+
+    def geometric_mean(self):
+        return np.exp(self.log_sum / self.positive) if self.positive else np.nan
+
+    def harmonic_mean(self):
+        return self.positive / self.reciprocal_sum if self.positive else np.nan
+
+    def bucket_value(self, bucket):
+        # Value with the smallest relative error (relative_accuracy) to anything in the bucket,
+        # clamped to the exact range
+        value = 2 * self.gamma ** bucket / (self.gamma + 1)
+        return float(min(max(value, self.min), self.max))
+
+    def quantile(self, q):
+        """
+        Estimated q-quantile (0 <= q <= 1) within relative_accuracy of the value at rank q * (count - 1).
+        """
+        if not self.count:
+            return np.nan
+        rank = q * (self.count - 1)
+        if rank < self.zeros:
+            return 0.0
+        bucket = np.searchsorted(np.cumsum(self.buckets), rank - self.zeros, side='right')
+        return self.bucket_value(bucket)
+
+    def mode(self, bins_per_doubling=SIZE_MODE_BINS_PER_DOUBLING):
+        """
+        Geometric centre of the most populated bin of a log-scale histogram with bins_per_doubling
+        bins per doubling of the size (zero-sized files counting as their own bin).
+        """
+        if not self.count:
+            return np.nan
+        bins = np.floor(np.arange(len(self.buckets)) * np.log2(self.gamma) * bins_per_doubling).astype(np.int64)
+        counts = np.bincount(bins, weights=self.buckets)
+        densest = int(np.argmax(counts))
+        if self.zeros >= counts[densest]:
+            return 0.0
+        value = 2 ** ((densest + 0.5) / bins_per_doubling)
+        return float(min(max(value, self.min), self.max))
+
+def top_rows(sizes, codes, groups, k, block_rows=TOP_K_BLOCK_ROWS):
+    """
+    Positions of the k largest sizes of every group (codes into range(groups), -1 for none),
+    earlier positions first among equal sizes, like nlargest(k, keep='first') per group.
+
+    The sizes are taken a block at a time. Every group's k-th largest size so far acts as the
+    root of a bounded min-heap: one vectorized comparison drops the files that cannot enter,
+    and only the survivors are sorted together with the files kept so far.
+    """
+    sizes = np.asarray(sizes, dtype=np.float64)
+    codes = np.asarray(codes, dtype=np.int64)
+    threshold = np.full(groups, -np.inf)
+    kept = np.empty(0, dtype=np.int64)
+    for start in range(0, len(sizes), block_rows):
+        block = np.arange(start, min(start + block_rows, len(sizes)))
+        block = block[codes[block] >= 0]
+        # Ties with a full group's k-th file lose to it, which is earlier; NaN sizes never enter
+        candidates = block[sizes[block] > threshold[codes[block]]]
+        if not len(candidates):
+            continue
+        rows = np.concatenate([kept, candidates])
+        rows = rows[np.lexsort((rows, -sizes[rows], codes[rows]))]
+        row_codes = codes[rows]
+        starts = np.flatnonzero(np.r_[True, row_codes[1:] != row_codes[:-1]])
+        rank = np.arange(len(rows)) - np.repeat(starts, np.diff(np.r_[starts, len(rows)]))
+        kept = rows[rank < k]
+        full = rank == k - 1
+        threshold[row_codes[full]] = sizes[rows[full]]
+    return kept
+
+class TopK:
+    """
+    The k largest files of every group (or overall) with payload columns such as the path,
+    as nlargest(k, 'size') per group would list them, kept in one pass without copying the
+    files. Merging chunks in order gives the same files as a single pass over all of them:
+    ties keep the earlier file.
+
+    entries holds 'size', the payload columns and, for grouped instances, 'group', in
+    decreasing size order.
+    """
+    def __init__(self, k, grouped=False):
+        if k < 1:
+            raise ValueError("k must be at least 1")
+        self.k = k
+        self.grouped = grouped
+        self.entries = pd.DataFrame({'size': pd.Series(dtype=np.float64)})
+
+    @classmethod
+    def from_values(cls, k, sizes, groups=None, payload=None):
+        """
+        Keep the k largest sizes, per group when groups are given.
+
+        Args:
+            k (int): Files kept per group.
+            sizes (array-like): Size of every file (NaN sizes are skipped).
+            groups (pd.Series or None): Group key of every file; files with NaN keys are skipped.
+            payload (callable or None): Called with the positions of the kept files, returns a dict
+                of columns for them (e.g. their paths), so payloads are only built for those.
+
+        Returns:
+            TopK: The filled instance.
+        """
+        if groups is None:
+            return cls.from_codes(k, sizes, np.zeros(len(sizes), dtype=np.int64), None, payload)
+        codes, labels = pd.factorize(groups)
+        return cls.from_codes(k, sizes, codes, labels, payload)
+
+    @classmethod
+    def from_codes(cls, k, sizes, codes, labels, payload=None):
+        """
+        Keep the k largest sizes per integer group code into labels (-1 for files to skip); labels
+        None keeps the k largest of all files with code 0, e.g. of a class given as a 0/-1 mask.
+        """
+        top = cls(k, grouped=labels is not None)
+        sizes = np.asarray(sizes, dtype=np.float64)
+        codes = group_codes(codes)
+        rows = top_rows(sizes, codes, 1 if labels is None else len(labels), k)
+        rows = rows[np.lexsort((rows, -sizes[rows]))]
+        entries = {'size': sizes[rows]}
+        if labels is not None:
+            entries['group'] = np.asarray(labels, dtype=object)[codes[rows]]
+        if payload is not None:
+            entries.update(payload(rows))
+        top.entries = pd.DataFrame(entries)
+        return top
+
+    def merge(self, other):
+        """
+        Add the files of a later chunk or shard into this instance.
+        """
+        if self.k != other.k or self.grouped != other.grouped:
+            raise ValueError("Cannot merge top-k lists of different sizes or grouping")
+        if other.entries.empty:
+            return self
+        if self.entries.empty:
+            self.entries = other.entries.copy()
+            return self
+        # Stable, with this instance's (earlier) entries first
+        entries = pd.concat([self.entries, other.entries], ignore_index=True).sort_values('size', ascending=False, kind='stable')
+        entries = entries.groupby('group', sort=False).head(self.k) if self.grouped else entries.head(self.k)
+        self.entries = entries.reset_index(drop=True)
+        return self
+
+    def top(self, group=None):
+        """
+        Entries of one group (or of all files for an ungrouped instance), largest first.
+
+        Returns:
+            pd.DataFrame: 'size' and the payload columns.
+        """
+        if not self.grouped:
+            return self.entries
+        # Group labels may be tuples, which a vectorized == would take for sequences
+        matches = np.array([label == group for label in self.entries['group']], dtype=bool)
+        return self.entries[matches].drop(columns='group')
@@ -1,11 +1,53 @@
 import pandas as pd
 import numpy as np
-import re
 import os
 import logging
 import argparse
 import time
-from scipy import stats
+import tempfile
+import functools
+from multiprocessing import Pool
+from dirtree import DirectoryTree
+from arrowcache import ArrowCache
+from aggregates import AgeHistogram, Moments, SizeStats, TopK, SIZE_RELATIVE_ACCURACY
+from pathcodec import encode_frame, frame_paths, scan_columns
+
+# Access-age groups of the coldness reports (days since access, right-closed bins as for pd.cut)
+AGE_GROUP_BINS = [0, 30, 90, 180, 365, 730, np.inf]
+AGE_GROUP_LABELS = ['<1m', '1-3m', '3-6m', '6-12m', '1-2y', '>2y']
+
+# Thresholds of the "Data not accessed in last N days" and "Data accessed in last N months" insights
+COLD_INDICATION_DAYS = [30, 90, 180, 365, 730]
+ACCESS_MONTHS = range(1, 25)
+
+# Especially hot: hot files accessed more than a year after creation
+ES_HOT_GAP_DAYS = 365
+# Especially cold: cold files accessed within 7 days of creation and not in the last 90 days
+ES_COLD_ACCESS_GAP_DAYS = 7
+ES_COLD_LAST_ACCESS_DAYS = 90
+
+# Part of the cache key of cleaned tables: bump whenever clean_and_engineer() output changes
+ANALYZER_VERSION = '2.3'
+
+# Number of largest files listed overall, hot and cold
+TOP_FILES = 20
+# Number of largest files listed per file extension and per consistent folder
+TOP_FILES_PER_GROUP = 5
+# Number of largest file extensions whose largest files are listed
+TOP_EXTENSIONS = 10
+# Directory of files whose path has none (e.g. 'notes.txt'); '' is the root of absolute paths
+NO_DIRECTORY = '.'
+
+# Columns read from the scan ('path' is read as pathcodec's directory/name/extension when the file has them)
+SCAN_COLUMNS = ['path', 'access_time', 'modify_time', 'size']
+SCAN_DTYPES = {
+    'path': 'string[pyarrow]',
+    'access_time': 'string',
+    'modify_time': 'string',
+    'change_time': 'string',
+    'size': 'int64',
+    'file_type': 'string'
+}
 
 # 1. Utility Function for Human-Readable Sizes
 def sizeof_fmt(num, suffix='B'):
@@ -43,11 +85,17 @@ def parse_arguments():
         argparse.Namespace: Parsed arguments.
     """
     parser = argparse.ArgumentParser(description='Analyze file system data.')
-    parser.add_argument('--file', type=str, default='race2024.csv', help='Path to the CSV file.')
+    parser.add_argument('--file', type=str, default='race2024.csv', help='Path to the CSV file (or a Parquet file written by megacollector/scanmerge).')
     parser.add_argument('--current_date', type=str, default='2024-11-07', help='Current date in YYYY-MM-DD format.')
     parser.add_argument('--hot_threshold', type=int, default=30, help='Days threshold for hot data.')
     parser.add_argument('--cold_threshold', type=int, default=180, help='Days threshold for cold data.')
     parser.add_argument('--max_depth', type=int, default=None, help='Maximum directory depth to analyze.')
+    parser.add_argument('--cache_dir', type=str, default=None, help='Directory of the Arrow cache of cleaned data (default: .analyzer_cache next to the input file).')
+    parser.add_argument('--no_cache', action='store_true', help='Neither read nor write the cache of cleaned data.')
+    parser.add_argument('--streaming', action='store_true', help='Read the data in chunks and merge per-chunk aggregates, so memory use is bounded by the chunk size rather than the dataset size.')
+    parser.add_argument('--size_accuracy', type=float, default=SIZE_RELATIVE_ACCURACY, help='Relative error of the file size median, percentiles and mode (default: 0.01).')
+    parser.add_argument('--chunk_rows', type=int, default=1000000, help='Rows per chunk in streaming and parallel mode (Parquet is read row group by row group in batches of at most this size).')
+    parser.add_argument('--workers', type=int, default=1, help='Aggregate chunks in this many processes over a memory-mapped Arrow IPC copy of the data, written to --cache_dir or the temp directory (default: 1, no pool).')
     args = parser.parse_args()
     return args
 
@@ -57,48 +105,67 @@ def load_data(file_path):
     Load the data using optimized methods.
 
     Args:
-        file_path (str): Path to the CSV file.
+        file_path (str): Path to the CSV or Parquet file.
 
     Returns:
         pd.DataFrame: Loaded DataFrame.
     """
-    parquet_file = file_path.replace('.csv', '.parquet')
-    if os.path.exists(parquet_file):
+    if file_path.endswith('.parquet'):
         try:
-            df = pd.read_parquet(parquet_file)
+            import pyarrow.parquet as pq
+            df = pd.read_parquet(file_path, columns=scan_columns(SCAN_COLUMNS, pq.read_schema(file_path).names))
             logging.info("Parquet file loaded successfully.")
-            return df
         except Exception as e:
             logging.error(f"Error loading Parquet file: {e}")
-            logging.info("Attempting to load CSV file instead.")
-    
-    # If Parquet loading fails or file doesn't exist, load CSV
-    dtype = {
-        'path': 'string',
-        'access_time': 'string',
-        'modify_time': 'string',
-        'change_time': 'string',
-        'size': 'int64',
-        'file_type': 'string'
-    }
+            exit(1)
+        return df
+
     try:
         df = pd.read_csv(
             file_path,
-            dtype=dtype,
+            dtype=SCAN_DTYPES,
             engine='pyarrow',
-            usecols=['path', 'access_time', 'modify_time', 'size']
+            usecols=SCAN_COLUMNS
         )
         logging.info("CSV file loaded successfully using PyArrow.")
-        # Save as Parquet for future use
-        df.to_parquet(parquet_file)
-        logging.info("Data saved as Parquet for future use.")
     except Exception as e:
         logging.error(f"Error loading CSV file: {e}")
         exit(1)
     return df
 
+def iter_chunks(file_path, chunk_rows):
+    """
+    Yield the data in chunks of at most chunk_rows rows without loading it all.
+
+    Parquet is read batch by batch, which never holds more than one row group; CSV is read in chunks.
+
+    Args:
+        file_path (str): Path to the CSV or Parquet file.
+        chunk_rows (int): Maximum rows per chunk.
+
+    Yields:
+        pd.DataFrame: The next chunk.
+    """
+    if file_path.endswith('.parquet'):
+        import pyarrow.parquet as pq
+        parquet = pq.ParquetFile(file_path)
+        logging.info(f"Streaming Parquet file with {parquet.metadata.num_row_groups} row groups.")
+        columns = scan_columns(SCAN_COLUMNS, parquet.schema_arrow.names)
+        for batch in parquet.iter_batches(batch_size=chunk_rows, columns=columns):
+            yield batch.to_pandas()
+        return
+
+    logging.info("Streaming CSV file in chunks.")
+    try:
+        reader = pd.read_csv(file_path, dtype=SCAN_DTYPES, usecols=SCAN_COLUMNS, chunksize=chunk_rows)
+    except Exception as e:
+        logging.error(f"Error loading CSV file: {e}")
+        exit(1)
+    with reader:
+        yield from reader
+
 # 5. Data Cleaning and Feature Engineering
-def clean_and_engineer(df, current_date_str, max_depth):
+def clean_and_engineer(df, current_date_str, max_depth, directory_columns=True):
     """
     Clean the DataFrame and perform feature engineering with optimizations.
 
@@ -106,6 +173,8 @@ def clean_and_engineer(df, current_date_str, max_depth):
         df (pd.DataFrame): The original DataFrame.
         current_date_str (str): Current date as a string.
         max_depth (int or None): Maximum directory depth to analyze.
+        directory_columns (bool): Also create the dir_depth_N, leaf_dir and last_two_leaf_dirs
+            columns (the reports answer those from the directory tree and do not need them).
 
     Returns:
         pd.DataFrame: Cleaned and feature-engineered DataFrame.
@@ -119,197 +188,494 @@ def clean_and_engineer(df, current_date_str, max_depth):
     for col in date_columns:
         df[col] = pd.to_datetime(df[col], errors='coerce')
 
-    # Drop rows with missing 'path' or 'access_time'
-    initial_shape = df.shape
-    df = df.dropna(subset=['path', 'access_time'])
-    logging.info(f"Dropped {initial_shape[0] - df.shape[0]} records with missing 'path' or 'access_time'.")
-
-    # Normalize path separators to '/'
-    df['path'] = df['path'].str.replace('\\', '/', regex=False)
+    # Paths as interned directories, file names and extensions ('\\' separators read as '/')
+    df = encode_frame(df)
 
-    # Calculate days since last access
+    # Rows with missing 'path' or 'access_time' and rows with a future 'access_time' are
+    # dropped together below, with one copy of the kept rows instead of one per condition
     current_date = pd.to_datetime(current_date_str)
-    df['days_since_access'] = (current_date - df['access_time']).dt.days
+    missing = (df['name'].isna() | df['access_time'].isna()).to_numpy()
+    future = (df['access_time'] > current_date).to_numpy() & ~missing
+    logging.info(f"Dropped {missing.sum()} records with missing 'path' or 'access_time'.")
 
     # Identify and log files with future 'access_time'
-    future_dates = df[df['access_time'] > current_date]
-    future_dates_count = future_dates.shape[0]
-    if future_dates_count > 0:
-        logging.warning(f"Found {future_dates_count} records with 'access_time' in the future.")
+    future_rows = np.flatnonzero(future)
+    if len(future_rows) > 0:
+        logging.warning(f"Found {len(future_rows)} records with 'access_time' in the future.")
         logging.warning("Listing files with future 'access_time':")
-        for _, row in future_dates.iterrows():
-            logging.warning(f"File: {row['path']}, Access Time: {row['access_time']}")
+        future_dates = df.iloc[future_rows]
+        for path, access_time in zip(frame_paths(future_dates), future_dates['access_time']):
+            logging.warning(f"File: {path}, Access Time: {access_time}")
 
     # Exclude records with future 'access_time'
-    df = df[df['access_time'] <= current_date]
-    logging.info(f"Excluded {future_dates_count} records with future 'access_time'.")
+    if missing.any() or len(future_rows) > 0:
+        df = df.take(np.flatnonzero(~(missing | future)))
+    logging.info(f"Excluded {len(future_rows)} records with future 'access_time'.")
 
-    # Extract directory from path
-    df['directory'] = df['path'].str.rsplit('/', n=1).str[0]
-
-    # Pre-compile regex for extension extraction
-    ext_pattern = re.compile(r'\.([^.\/]+)$')
-    df['extension'] = df['path'].str.extract(ext_pattern, expand=False).str.lower()
+    # Calculate days since last access
+    df['days_since_access'] = (current_date - df['access_time']).dt.days
 
     # Calculate gap between creation (modify_time) and last access
     df['creation_access_gap'] = (df['access_time'] - df['modify_time']).dt.days
 
-    # Compute depth of each path
-    df['depth'] = df['path'].str.count('/') + 1
+    # Directories are already interned: every unique directory is decomposed once and the
+    # per-file columns are codes into the directory table, numbered in order of appearance
+    # (files without any directory get NO_DIRECTORY, shared with paths like './notes.txt')
+    dir_codes, used_codes = pd.factorize(df['directory'].cat.codes.to_numpy())
+    has_directory = used_codes[dir_codes] >= 0
+    categories = df['directory'].cat.categories
+    label_codes, dir_uniques = pd.factorize(pd.Index([categories[code] if code >= 0 else NO_DIRECTORY for code in used_codes], dtype=object))
+    dir_codes = label_codes[dir_codes]
+    dir_parts = [directory.split('/') for directory in dir_uniques]
+    df['directory'] = pd.Categorical.from_codes(dir_codes, categories=dir_uniques)
+    logging.info(f"Interned {len(dir_uniques)} unique directories for {len(df)} files.")
+
+    # Compute depth of each path: the directory's components plus the file name
+    df['depth'] = np.where(has_directory, np.array([len(parts) + 1 for parts in dir_parts])[dir_codes], 1)
 
     # Determine the actual maximum directory depth
     actual_max_depth = df['depth'].max() if max_depth is None else min(df['depth'].max(), max_depth)
     logging.info(f"Determined maximum directory depth: {actual_max_depth}")
+    max_depth = actual_max_depth
+
+    def directory_column(values):
+        # Per-directory values -> Categorical per file
+        codes, categories = pd.factorize(pd.Series(values, dtype='object'))
+        return pd.Categorical.from_codes(codes[dir_codes], categories=categories)
+
+    # For consistent folder structure analysis (path components 1-3; the file name
+    # itself when the file sits directly above that level)
+    dir_part_counts = np.array([len(parts) for parts in dir_parts])[dir_codes] * has_directory
+    file_names = df['name']
+    for index, col_name in ((1, 'mountpoint'), (2, 'season'), (3, 'event')):
+        component = directory_column([parts[index] if len(parts) > index else None for parts in dir_parts])
+        is_file_name = dir_part_counts == index
+        if is_file_name.any():
+            names = file_names[is_file_name].astype('object')
+            component = component.add_categories(pd.Index(names.unique()).difference(component.categories))
+            component[is_file_name] = names.to_numpy()
+        df[col_name] = component
+
+    if directory_columns:
+        # Create directory depth columns; files shallower than a depth keep their own directory
+        for depth in range(1, max_depth + 1):
+            col_name = f'dir_depth_{depth}'
+            df[col_name] = directory_column(['/'.join(parts[:depth]) for parts in dir_parts])
+            logging.info(f"Created column: {col_name}")
 
-    # Split the path into parts
-    df['path_parts'] = df['path'].str.split('/')
+        # Extract leaf directory name
+        df['leaf_dir'] = directory_column([parts[-1] for parts in dir_parts])
+        logging.info("Created column: leaf_dir")
 
-    # Optimize directory depth columns
-    max_depth = min(actual_max_depth, df['path_parts'].str.len().max())
-    path_parts_list = df['path_parts'].tolist()
+        # Extract last two leaf directories
+        df['last_two_leaf_dirs'] = directory_column(['/'.join(parts[-2:]) for parts in dir_parts])
+        logging.info("Created column: last_two_leaf_dirs")
 
-    # Pre-allocate lists for new columns
-    dir_depth_cols = {f'dir_depth_{depth}': [] for depth in range(1, max_depth + 1)}
-    leaf_dirs = []
-    last_two_leaf_dirs = []
+    section_end_time = time.time()
+    df.processing_time = section_end_time - section_start_time
+    logging.info(f"Data cleaning and feature engineering completed in {df.processing_time:.2f} seconds.")
 
-    # For consistent folder structure analysis
-    df['mountpoint'] = df['path_parts'].str[1]
-    df['season'] = df['path_parts'].str[2]
-    df['event'] = df['path_parts'].str[3]
+    return df, actual_max_depth
 
-    for parts in path_parts_list:
-        # Create directory depth columns
-        for depth in range(1, max_depth + 1):
-            col_name = f'dir_depth_{depth}'
-            if len(parts) >= depth:
-                dir_depth_cols[col_name].append('/'.join(parts[:depth]))
+# 5a. Report Aggregates
+def build_report_aggregates(df, args):
+    """
+    Reduce a feature-engineered frame (the whole dataset or one chunk of it) to the mergeable
+    aggregates every report is computed from: access-age histograms per directory and class
+    (all files and the especially hot/cold subsets), per extension, per consistent folder
+    (mountpoint/season/event) and in months, size statistics, the size/age moments behind the
+    correlation matrix, the largest files (overall, hot, cold, per extension and per folder) and
+    the modification counts per month.
+
+    Args:
+        df (pd.DataFrame): The feature-engineered DataFrame.
+        args (argparse.Namespace): Parsed command-line arguments.
+
+    Returns:
+        dict: The aggregates; combine those of several chunks with merge_report_aggregates().
+    """
+    days = df['days_since_access']
+    gap = df['creation_access_gap']
+    hot = days <= args.hot_threshold
+    cold = days > args.cold_threshold
+    classes = {
+        'es_hot': (hot & (gap > ES_HOT_GAP_DAYS)).to_numpy(),
+        'es_cold': (cold & (gap <= ES_COLD_ACCESS_GAP_DAYS) & (days > ES_COLD_LAST_ACCESS_DAYS)).to_numpy(),
+    }
+    # Age-group and threshold edges for the directory and folder reports, which can have many groups
+    tree_edges = AGE_GROUP_BINS[:-1] + [args.hot_threshold, args.cold_threshold]
+
+    # Days since access per extension, bucketed at the edges the reports ask about only
+    day_edges = tree_edges + COLD_INDICATION_DAYS
+    sizes = df['size'].to_numpy()
+
+    # Folders are numbered in order of appearance so that merged chunks keep the same order
+    folders = df.groupby(['mountpoint', 'season', 'event'], observed=True, sort=False)
+    current_date = pd.to_datetime(args.current_date)
+    months_since_access = (current_date.year - df['access_time'].dt.year) * 12 + (current_date.month - df['access_time'].dt.month)
+
+    def paths(rows):
+        # Full paths are only built for the few files kept (without a directory, just the name)
+        files = df.iloc[rows]
+        return {'path': frame_paths(files).where(files['depth'] > 1, files['name']).to_numpy()}
+
+    # Files without a mountpoint, season or event have no folder (NaN group number)
+    folder_codes = folders.ngroup().fillna(-1).astype(np.int64).to_numpy()
+    return {
+        'directories': DirectoryTree.directory_histograms(df, tree_edges, classes),
+        'extension': AgeHistogram.from_values(days.to_numpy(), sizes, day_edges, df['extension']),
+        'folder': AgeHistogram.from_codes(days.to_numpy(), sizes, tree_edges, folder_codes, folders.size().index),
+        'months': AgeHistogram.from_values(months_since_access.to_numpy(), sizes, range(0, max(ACCESS_MONTHS) + 1)),
+        'size': SizeStats.from_values(sizes, args.size_accuracy),
+        'size_days': Moments.from_values(sizes, days.to_numpy()),
+        # Classes are 0/-1 codes rather than masked copies of the files
+        'largest': {
+            'overall': TopK.from_values(TOP_FILES, sizes, payload=paths),
+            'hot': TopK.from_codes(TOP_FILES, sizes, np.where(hot, 0, -1), None, paths),
+            'cold': TopK.from_codes(TOP_FILES, sizes, np.where(cold, 0, -1), None, paths),
+            'extension': TopK.from_values(TOP_FILES_PER_GROUP, sizes, df['extension'], paths),
+            'folder': TopK.from_codes(TOP_FILES_PER_GROUP, sizes, folder_codes, folders.size().index, paths),
+        },
+        'modifications': df['modify_time'].dt.to_period('M').value_counts(),
+    }
+
+# 5b. Merge Report Aggregates
+def merge_report_aggregates(aggregates, other):
+    """
+    Add the aggregates of another chunk into aggregates.
+
+    Args:
+        aggregates (dict): Aggregates from build_report_aggregates(), updated in place.
+        other (dict): Aggregates of the next chunk.
+
+    Returns:
+        dict: The merged aggregates.
+    """
+    for name, histogram in other['directories'].items():
+        aggregates['directories'][name].merge(histogram)
+    for key in ('extension', 'folder', 'months', 'size', 'size_days'):
+        aggregates[key].merge(other[key])
+    for name, largest in other['largest'].items():
+        # Earlier chunks first, so ties resolve as in a single pass over all rows
+        aggregates['largest'][name].merge(largest)
+    aggregates['modifications'] = aggregates['modifications'].add(other['modifications'], fill_value=0).astype('int64')
+    return aggregates
+
+# 5c. Chunk Aggregation
+def start_timer():
+    """
+    Start times of a section: (wall clock, CPU time of this process).
+    """
+    return time.time(), time.process_time()
+
+def stop_timer(start):
+    """
+    (wall, CPU) seconds since start_timer().
+    """
+    return time.time() - start[0], time.process_time() - start[1]
+
+def add_times(first, second):
+    return first[0] + second[0], first[1] + second[1]
+
+def aggregate_chunk(chunk, args):
+    """
+    Clean one chunk of raw records and reduce it to report aggregates.
+
+    Args:
+        chunk (pd.DataFrame): Raw records as loaded.
+        args (argparse.Namespace): Parsed command-line arguments.
+
+    Returns:
+        dict: 'rows' read, 'kept' after cleaning, 'max_depth', the chunk's 'aggregates'
+            (None when no records are left) and (wall, CPU) 'times' of cleaning and aggregating.
+    """
+    result = {'rows': len(chunk), 'kept': 0, 'max_depth': 0, 'aggregates': None, 'times': {}}
+
+    # Per-chunk cleaning details would repeat for every chunk; warnings still get through
+    section_start = start_timer()
+    logging.disable(logging.INFO)
+    try:
+        chunk, chunk_max_depth = clean_and_engineer(chunk, args.current_date, args.max_depth, directory_columns=False)
+    finally:
+        logging.disable(logging.NOTSET)
+    result['times']['clean'] = stop_timer(section_start)
+
+    section_start = start_timer()
+    if len(chunk):
+        result['kept'] = len(chunk)
+        result['max_depth'] = int(chunk_max_depth)
+        result['aggregates'] = build_report_aggregates(chunk, args)
+    result['times']['aggregate'] = stop_timer(section_start)
+    return result
+
+def reduce_chunk_results(results):
+    """
+    Merge the results of aggregate_chunk() in chunk order.
+
+    Args:
+        results (iterable): aggregate_chunk() results, each with its (wall, CPU) 'load' time and
+            optionally the 'log' records it produced, which are emitted here in chunk order.
+
+    Returns:
+        dict: The merged aggregates.
+        int: Actual maximum directory depth in the data.
+        dict: (wall, CPU) loading, cleaning and aggregation times summed over the chunks, and
+            the time spent merging them here.
+    """
+    aggregates = None
+    actual_max_depth = 0
+    times = {'load': (0.0, 0.0), 'clean': (0.0, 0.0), 'aggregate': (0.0, 0.0), 'merge': (0.0, 0.0)}
+    rows = kept = 0
+    for chunk_index, result in enumerate(results, start=1):
+        for record in result.get('log', []):
+            logging.getLogger().handle(record)
+        rows += result['rows']
+        kept += result['kept']
+        actual_max_depth = max(actual_max_depth, result['max_depth'])
+        for stage, stage_time in result['times'].items():
+            times[stage] = add_times(times[stage], stage_time)
+        if result['aggregates'] is not None:
+            section_start = start_timer()
+            if aggregates is None:
+                aggregates = result['aggregates']
             else:
-                dir_depth_cols[col_name].append('/'.join(parts))
+                merge_report_aggregates(aggregates, result['aggregates'])
+            times['merge'] = add_times(times['merge'], stop_timer(section_start))
+        logging.info(f"Chunk {chunk_index}: {rows} records read, {kept} kept so far.")
 
-        # Extract leaf directory name
-        leaf_dirs.append(parts[-2] if len(parts) >= 2 else '')
+    if aggregates is None:
+        logging.error("No records left to analyze.")
+        exit(1)
+    logging.info(f"Dropped or excluded {rows - kept} of {rows} records.")
+    logging.info(f"Determined maximum directory depth: {actual_max_depth}")
+    return aggregates, actual_max_depth, times
 
-        # Extract last two leaf directories
-        if len(parts) >= 3:
-            last_two_leaf_dirs.append('/'.join(parts[-3:-1]))
-        elif len(parts) >= 2:
-            last_two_leaf_dirs.append(parts[-2])
-        else:
-            last_two_leaf_dirs.append('')
+# 5d. Streaming Aggregation
+def stream_report_aggregates(args):
+    """
+    Build the report aggregates chunk by chunk, holding only one chunk of files in memory.
 
-    # Assign new columns to DataFrame
-    for col_name, col_data in dir_depth_cols.items():
-        df[col_name] = col_data
-        logging.info(f"Created column: {col_name}")
+    Args:
+        args (argparse.Namespace): Parsed command-line arguments.
 
-    df['leaf_dir'] = leaf_dirs
-    logging.info("Created column: leaf_dir")
+    Returns:
+        See reduce_chunk_results().
+    """
+    def chunk_results():
+        load_start = start_timer()
+        for chunk in iter_chunks(args.file, args.chunk_rows):
+            load_time = stop_timer(load_start)
+            result = aggregate_chunk(chunk, args)
+            result['times']['load'] = load_time
+            yield result
+            load_start = start_timer()
+
+    return reduce_chunk_results(chunk_results())
+
+# 5e. Parallel Aggregation
+class LogCollector(logging.Handler):
+    """
+    Logging handler that keeps the records, so a worker's log can be emitted by the parent.
+    """
+    def __init__(self):
+        super().__init__()
+        self.records = []
 
-    df['last_two_leaf_dirs'] = last_two_leaf_dirs
-    logging.info("Created column: last_two_leaf_dirs")
+    def emit(self, record):
+        self.records.append(record)
 
-    # Identify low cardinality columns
-    categorical_cols = ['extension', 'leaf_dir', 'last_two_leaf_dirs', 'mountpoint', 'season', 'event']
-    low_cardinality_cols = [col for col in categorical_cols if df[col].nunique() < 1000]
-    logging.info(f"Identified {len(low_cardinality_cols)} low cardinality columns for category conversion.")
+def write_arrow_ipc(file_path, ipc_path, chunk_rows):
+    """
+    Copy the scan columns into an uncompressed Arrow IPC file, which workers can memory-map
+    and slice without decoding or copying anything they do not use.
 
-    # Convert only low cardinality columns to 'category'
-    for col in low_cardinality_cols:
-        df[col] = df[col].astype('category')
-        logging.info(f"Converted column to category: {col}")
+    Args:
+        file_path (str): Path to the CSV or Parquet file.
+        ipc_path (str): Arrow IPC file to write.
+        chunk_rows (int): Rows per record batch.
 
-    # Drop 'path_parts' column
-    df = df.drop(columns=['path_parts'])
+    Returns:
+        int: Number of rows written.
+    """
+    import pyarrow as pa
+    if file_path.endswith('.parquet'):
+        import pyarrow.parquet as pq
+        parquet = pq.ParquetFile(file_path)
+        batches = parquet.iter_batches(batch_size=chunk_rows, columns=scan_columns(SCAN_COLUMNS, parquet.schema_arrow.names))
+    else:
+        from pyarrow import csv
+        column_types = {col: (pa.int64() if col == 'size' else pa.string()) for col in SCAN_COLUMNS}
+        batches = csv.open_csv(
+            file_path,
+            convert_options=csv.ConvertOptions(include_columns=SCAN_COLUMNS, column_types=column_types)
+        )
 
-    section_end_time = time.time()
-    df.processing_time = section_end_time - section_start_time
-    logging.info(f"Data cleaning and feature engineering completed in {df.processing_time:.2f} seconds.")
+    rows = 0
+    writer = None
+    try:
+        for batch in batches:
+            if writer is None:
+                # Every Parquet batch has its own dictionaries, which an IPC file cannot replace;
+                # the encoded path columns are stored as plain strings and re-encoded per slice
+                schema = pa.schema([
+                    (field.name, field.type.value_type if pa.types.is_dictionary(field.type) else field.type)
+                    for field in batch.schema
+                ])
+                writer = pa.ipc.new_file(ipc_path, schema)
+            writer.write_batch(batch.cast(schema))
+            rows += batch.num_rows
+    finally:
+        if writer is not None:
+            writer.close()
+    return rows
+
+def aggregate_ipc_rows(row_range, ipc_path, args):
+    """
+    Pool worker: aggregate_chunk() over rows [start, stop) of the memory-mapped Arrow IPC file,
+    with the log records collected instead of written.
+    """
+    import pyarrow as pa
+    collector = LogCollector()
+    root_logger = logging.getLogger()
+    handlers = root_logger.handlers[:]
+    root_logger.handlers = [collector]
+    try:
+        load_start = start_timer()
+        start, stop = row_range
+        # Zero-copy: only the pages of this slice are read from the page cache
+        table = pa.ipc.open_file(pa.memory_map(ipc_path)).read_all()
+        chunk = table.slice(start, stop - start).to_pandas()
+        load_time = stop_timer(load_start)
+        result = aggregate_chunk(chunk, args)
+    finally:
+        root_logger.handlers = handlers
+    result['times']['load'] = load_time
+    result['log'] = collector.records
+    return result
+
+def parallel_report_aggregates(args):
+    """
+    Build the report aggregates with a pool of args.workers processes. The scan columns are
+    written once to an Arrow IPC file that every worker memory-maps, so workers share the data
+    through the page cache and only their aggregates are sent back. Chunks of args.chunk_rows
+    rows are merged in order, so the report matches the other modes.
 
-    return df, actual_max_depth
+    Args:
+        args (argparse.Namespace): Parsed command-line arguments.
+
+    Returns:
+        See reduce_chunk_results(); the stage times are summed over the workers, and 'ipc' is the
+        time spent writing the Arrow IPC file.
+    """
+    load_start = start_timer()
+    # The copy goes to the cache directory when one is given, otherwise the system temp directory
+    # (the input's directory may be read-only)
+    if args.cache_dir:
+        os.makedirs(args.cache_dir, exist_ok=True)
+    fd, ipc_path = tempfile.mkstemp(suffix='.arrow', dir=args.cache_dir)
+    os.close(fd)
+    try:
+        rows = write_arrow_ipc(args.file, ipc_path, args.chunk_rows)
+        ipc_time = stop_timer(load_start)
+        logging.info(f"Wrote {rows} records to Arrow IPC file {ipc_path} for {args.workers} workers.")
+
+        row_ranges = [(start, min(start + args.chunk_rows, rows)) for start in range(0, rows, args.chunk_rows)]
+        with Pool(processes=args.workers) as pool:
+            results = pool.imap(functools.partial(aggregate_ipc_rows, ipc_path=ipc_path, args=args), row_ranges)
+            aggregates, actual_max_depth, times = reduce_chunk_results(results)
+    finally:
+        os.remove(ipc_path)
+    times['ipc'] = ipc_time
+    return aggregates, actual_max_depth, times
 
 # 6. Analyze Data
-def analyze_data(df, args, actual_max_depth):
+def analyze_data(aggregates, args, actual_max_depth):
     """
     Perform analysis on the data.
 
     Args:
-        df (pd.DataFrame): The feature-engineered DataFrame.
+        aggregates (dict): Report aggregates of the whole dataset.
         args (argparse.Namespace): Parsed command-line arguments.
         actual_max_depth (int): Actual maximum directory depth in the data.
 
     Returns:
-        dict: Dictionary containing processing times for each section.
+        dict: (wall, CPU) seconds of each section.
     """
     processing_times = {}
-    start_time = time.time()
+    start = start_timer()
 
     # Extract thresholds from arguments
     hot_threshold_days = args.hot_threshold
     cold_threshold_days = args.cold_threshold
 
+    # Build the Directory Tree Index once for all directory reports
+    section_start = start_timer()
+    tree = DirectoryTree.from_histograms(aggregates['directories'])
+    logging.info(f"Built directory tree index with {len(tree.paths)} directories.")
+    processing_times['build_directory_tree'] = stop_timer(section_start)
+
     # Analyze Cold Data
-    section_start_time = time.time()
-    cold_data = df[df['days_since_access'] > cold_threshold_days]
-    analyze_cold_data(cold_data, actual_max_depth)
-    processing_times['analyze_cold_data'] = time.time() - section_start_time
+    section_start = start_timer()
+    analyze_cold_data(aggregates['extension'], actual_max_depth, tree, cold_threshold_days)
+    processing_times['analyze_cold_data'] = stop_timer(section_start)
 
     # Analyze Hot Data
-    section_start_time = time.time()
-    hot_data = df[df['days_since_access'] <= hot_threshold_days]
-    analyze_hot_data(hot_data, actual_max_depth)
-    processing_times['analyze_hot_data'] = time.time() - section_start_time
+    section_start = start_timer()
+    analyze_hot_data(aggregates['extension'], actual_max_depth, tree, hot_threshold_days)
+    processing_times['analyze_hot_data'] = stop_timer(section_start)
 
     # Analyze Especially Hot Data
-    section_start_time = time.time()
-    es_hot_data = analyze_es_hot_data(hot_data, actual_max_depth)
-    processing_times['analyze_es_hot_data'] = time.time() - section_start_time
+    section_start = start_timer()
+    analyze_es_hot_data(actual_max_depth, tree)
+    processing_times['analyze_es_hot_data'] = stop_timer(section_start)
 
     # Analyze Especially Cold Data
-    section_start_time = time.time()
-    es_cold_data = analyze_es_cold_data(cold_data, actual_max_depth)
-    processing_times['analyze_es_cold_data'] = time.time() - section_start_time
+    section_start = start_timer()
+    analyze_es_cold_data(actual_max_depth, tree)
+    processing_times['analyze_es_cold_data'] = stop_timer(section_start)
 
     # Additional Insights
-    section_start_time = time.time()
-    additional_insights(df, hot_data, cold_data, args)
-    processing_times['additional_insights'] = time.time() - section_start_time
+    section_start = start_timer()
+    additional_insights(aggregates, args)
+    processing_times['additional_insights'] = stop_timer(section_start)
 
     # Analyze File Type Coldness
-    section_start_time = time.time()
-    analyze_file_type_coldness(df, args)
-    processing_times['analyze_file_type_coldness'] = time.time() - section_start_time
+    section_start = start_timer()
+    analyze_file_type_coldness(args, aggregates['extension'])
+    processing_times['analyze_file_type_coldness'] = stop_timer(section_start)
 
     # Analyze Folder Coldness
-    section_start_time = time.time()
-    analyze_folder_coldness(df, args)
-    processing_times['analyze_folder_coldness'] = time.time() - section_start_time
+    section_start = start_timer()
+    analyze_folder_coldness(args, tree, aggregates['folder'], aggregates['largest']['folder'])
+    processing_times['analyze_folder_coldness'] = stop_timer(section_start)
 
-    total_time = time.time() - start_time
-    processing_times['total_analysis_time'] = total_time
+    processing_times['total_analysis_time'] = stop_timer(start)
 
     return processing_times
 
 # 7. Analyze Cold Data
-def analyze_cold_data(cold_data, max_depth):
+def analyze_cold_data(extension_ages, max_depth, tree, cold_threshold_days):
     """
     Analyze cold data and group by directory depths and leaf directories.
 
     Args:
-        cold_data (pd.DataFrame): The cold data DataFrame.
+        extension_ages (AgeHistogram): Days since access per extension.
         max_depth (int): Maximum directory depth.
+        tree (DirectoryTree): Directory tree index of the whole dataset.
+        cold_threshold_days (int): Days threshold for cold data.
 
     Returns:
         None
     """
-    total_cold_files = cold_data.shape[0]
-    total_cold_size = cold_data['size'].sum()
+    total_cold_files = extension_ages.total(min_age=cold_threshold_days, counts=True)
+    total_cold_size = extension_ages.total(min_age=cold_threshold_days)
 
     logging.info(f"\nTotal Number of Cold Files: {total_cold_files}")
     logging.info(f"Total Size of Cold Data: {sizeof_fmt(total_cold_size)}")
 
     # Cold Data by File Extension (Include Size, Sort by Size)
-    cold_by_extension = cold_data.groupby('extension', observed=True)['size'].sum().sort_values(ascending=False)
+    cold_files_by_extension = extension_ages.by_group(min_age=cold_threshold_days, counts=True)
+    cold_by_extension = extension_ages.by_group(min_age=cold_threshold_days)[cold_files_by_extension > 0].sort_values(ascending=False)
     logging.info("\nCold Data by File Extension (Sorted by Total Size):")
     for ext, size in cold_by_extension.items():
         logging.info(f"{ext}: {sizeof_fmt(size)}")
@@ -317,10 +683,10 @@ def analyze_cold_data(cold_data, max_depth):
     # Cold Data by Directory Depth Based on Total Size
     logging.info("\nCold Data by Directory Depth:")
     for depth in range(1, max_depth + 1):
-        depth_col = f'dir_depth_{depth}'
-        unique_values = cold_data[depth_col].nunique()
+        cold_by_depth = tree.sizes_at_depth(depth, min_days=cold_threshold_days)
+        unique_values = len(cold_by_depth)
         if unique_values > 1:
-            cold_by_dir = cold_data.groupby(depth_col, observed=True)['size'].sum().sort_values(ascending=False).head(20)
+            cold_by_dir = cold_by_depth.sort_values(ascending=False).head(20)
             logging.info(f"\nTop 20 Directories at Depth {depth} with Cold Data (By Total Size):")
             for dir_path, size in cold_by_dir.items():
                 logging.info(f"{dir_path}: {sizeof_fmt(size)}")
@@ -329,36 +695,39 @@ def analyze_cold_data(cold_data, max_depth):
 
     # Cold Data by Leaf Directory
     logging.info("\nCold Data by Leaf Directory (Bottom-Level Directories):")
-    cold_by_leaf = cold_data.groupby('leaf_dir', observed=True)['size'].sum().sort_values(ascending=False).head(20)
+    cold_by_leaf = tree.sizes_by_leaf(min_days=cold_threshold_days).sort_values(ascending=False).head(20)
     for leaf_dir, size in cold_by_leaf.items():
         logging.info(f"{leaf_dir}: {sizeof_fmt(size)}")
 
     # Cold Data by Last Two Leaf Directories
     logging.info("\nCold Data by Last Two Leaf Directories:")
-    cold_by_last_two_leaf = cold_data.groupby('last_two_leaf_dirs', observed=True)['size'].sum().sort_values(ascending=False).head(20)
+    cold_by_last_two_leaf = tree.sizes_by_leaf(min_days=cold_threshold_days, levels=2).sort_values(ascending=False).head(20)
     for last_two_leaf, size in cold_by_last_two_leaf.items():
         logging.info(f"{last_two_leaf}: {sizeof_fmt(size)}")
 
 # 8. Analyze Hot Data
-def analyze_hot_data(hot_data, max_depth):
+def analyze_hot_data(extension_ages, max_depth, tree, hot_threshold_days):
     """
     Analyze hot data and group by directory depths and leaf directories.
 
     Args:
-        hot_data (pd.DataFrame): The hot data DataFrame.
+        extension_ages (AgeHistogram): Days since access per extension.
         max_depth (int): Maximum directory depth.
+        tree (DirectoryTree): Directory tree index of the whole dataset.
+        hot_threshold_days (int): Days threshold for hot data.
 
     Returns:
         None
     """
-    total_hot_files = hot_data.shape[0]
-    total_hot_size = hot_data['size'].sum()
+    total_hot_files = extension_ages.total(max_age=hot_threshold_days, counts=True)
+    total_hot_size = extension_ages.total(max_age=hot_threshold_days)
 
     logging.info(f"\nTotal Number of Hot Files: {total_hot_files}")
     logging.info(f"Total Size of Hot Data: {sizeof_fmt(total_hot_size)}")
 
     # Hot Data by File Extension (Include Size, Sort by Size)
-    hot_by_extension = hot_data.groupby('extension', observed=True)['size'].sum().sort_values(ascending=False)
+    hot_files_by_extension = extension_ages.by_group(max_age=hot_threshold_days, counts=True)
+    hot_by_extension = extension_ages.by_group(max_age=hot_threshold_days)[hot_files_by_extension > 0].sort_values(ascending=False)
     logging.info("\nHot Data by File Extension (Sorted by Total Size):")
     for ext, size in hot_by_extension.items():
         logging.info(f"{ext}: {sizeof_fmt(size)}")
@@ -366,10 +735,10 @@ def analyze_hot_data(hot_data, max_depth):
     # Hot Data by Directory Depth Based on Total Size
     logging.info("\nHot Data by Directory Depth:")
     for depth in range(1, max_depth + 1):
-        depth_col = f'dir_depth_{depth}'
-        unique_values = hot_data[depth_col].nunique()
+        hot_by_depth = tree.sizes_at_depth(depth, max_days=hot_threshold_days)
+        unique_values = len(hot_by_depth)
         if unique_values > 1:
-            hot_by_dir = hot_data.groupby(depth_col, observed=True)['size'].sum().sort_values(ascending=False).head(20)
+            hot_by_dir = hot_by_depth.sort_values(ascending=False).head(20)
             logging.info(f"\nTop 20 Directories at Depth {depth} with Hot Data (By Total Size):")
             for dir_path, size in hot_by_dir.items():
                 logging.info(f"{dir_path}: {sizeof_fmt(size)}")
@@ -378,33 +747,29 @@ def analyze_hot_data(hot_data, max_depth):
 
     # Hot Data by Leaf Directory
     logging.info("\nHot Data by Leaf Directory (Bottom-Level Directories):")
-    hot_by_leaf = hot_data.groupby('leaf_dir', observed=True)['size'].sum().sort_values(ascending=False).head(20)
+    hot_by_leaf = tree.sizes_by_leaf(max_days=hot_threshold_days).sort_values(ascending=False).head(20)
     for leaf_dir, size in hot_by_leaf.items():
         logging.info(f"{leaf_dir}: {sizeof_fmt(size)}")
 
     # Hot Data by Last Two Leaf Directories
     logging.info("\nHot Data by Last Two Leaf Directories:")
-    hot_by_last_two_leaf = hot_data.groupby('last_two_leaf_dirs', observed=True)['size'].sum().sort_values(ascending=False).head(20)
+    hot_by_last_two_leaf = tree.sizes_by_leaf(max_days=hot_threshold_days, levels=2).sort_values(ascending=False).head(20)
     for last_two_leaf, size in hot_by_last_two_leaf.items():
         logging.info(f"{last_two_leaf}: {sizeof_fmt(size)}")
 
 # 9. Analyze Especially Hot Data
-def analyze_es_hot_data(hot_data, max_depth):
+def analyze_es_hot_data(max_depth, tree):
     """
     Analyze especially hot data.
 
     Args:
-        hot_data (pd.DataFrame): The hot data DataFrame.
         max_depth (int): Maximum directory depth.
+        tree (DirectoryTree): Directory tree index of the whole dataset.
 
     Returns:
-        pd.DataFrame: Especially hot data subset.
+        None
     """
-    gap_threshold_days = 365  # Accessed more than a year after creation
-    especially_hot_data = hot_data[hot_data['creation_access_gap'] > gap_threshold_days]
-
-    num_es_hot_files = especially_hot_data.shape[0]
-    total_es_hot_size = especially_hot_data['size'].sum()
+    total_es_hot_size, num_es_hot_files = tree.total(file_class='es_hot')
 
     logging.info(f"\nNumber of Especially Hot Files: {num_es_hot_files}")
     logging.info(f"Total Size of Especially Hot Data: {sizeof_fmt(total_es_hot_size)}")
@@ -412,10 +777,10 @@ def analyze_es_hot_data(hot_data, max_depth):
     # Especially Hot Data by Directory Depth
     logging.info("\nEspecially Hot Data by Directory Depth:")
     for depth in range(1, max_depth + 1):
-        depth_col = f'dir_depth_{depth}'
-        unique_values = especially_hot_data[depth_col].nunique()
+        es_hot_by_depth = tree.sizes_at_depth(depth, file_class='es_hot')
+        unique_values = len(es_hot_by_depth)
         if unique_values > 1:
-            es_hot_by_dir = especially_hot_data.groupby(depth_col, observed=True)['size'].sum().sort_values(ascending=False).head(20)
+            es_hot_by_dir = es_hot_by_depth.sort_values(ascending=False).head(20)
             logging.info(f"\nTop 20 Directories at Depth {depth} with Especially Hot Data (By Total Size):")
             for dir_path, size in es_hot_by_dir.items():
                 logging.info(f"{dir_path}: {sizeof_fmt(size)}")
@@ -424,40 +789,29 @@ def analyze_es_hot_data(hot_data, max_depth):
 
     # Especially Hot Data by Leaf Directory
     logging.info("\nEspecially Hot Data by Leaf Directory (Bottom-Level Directories):")
-    es_hot_by_leaf = especially_hot_data.groupby('leaf_dir', observed=True)['size'].sum().sort_values(ascending=False).head(20)
+    es_hot_by_leaf = tree.sizes_by_leaf(file_class='es_hot').sort_values(ascending=False).head(20)
     for leaf_dir, size in es_hot_by_leaf.items():
         logging.info(f"{leaf_dir}: {sizeof_fmt(size)}")
 
     # Especially Hot Data by Last Two Leaf Directories
     logging.info("\nEspecially Hot Data by Last Two Leaf Directories:")
-    es_hot_by_last_two_leaf = especially_hot_data.groupby('last_two_leaf_dirs', observed=True)['size'].sum().sort_values(ascending=False).head(20)
+    es_hot_by_last_two_leaf = tree.sizes_by_leaf(file_class='es_hot', levels=2).sort_values(ascending=False).head(20)
     for last_two_leaf, size in es_hot_by_last_two_leaf.items():
         logging.info(f"{last_two_leaf}: {sizeof_fmt(size)}")
 
-    return especially_hot_data
-
 # 10. Analyze Especially Cold Data
-def analyze_es_cold_data(cold_data, max_depth):
+def analyze_es_cold_data(max_depth, tree):
     """
     Analyze especially cold data.
 
     Args:
-        cold_data (pd.DataFrame): The cold data DataFrame.
         max_depth (int): Maximum directory depth.
+        tree (DirectoryTree): Directory tree index of the whole dataset.
 
     Returns:
-        pd.DataFrame: Especially cold data subset.
+        None
     """
-    access_gap_threshold_days = 7  # Accessed within 7 days of creation
-    last_access_threshold_days = 90  # Not accessed again in last 90 days
-
-    especially_cold_data = cold_data[
-        (cold_data['creation_access_gap'] <= access_gap_threshold_days) &
-        (cold_data['days_since_access'] > last_access_threshold_days)
-    ]
-
-    num_es_cold_files = especially_cold_data.shape[0]
-    total_es_cold_size = especially_cold_data['size'].sum()
+    total_es_cold_size, num_es_cold_files = tree.total(file_class='es_cold')
 
     logging.info(f"\nNumber of Especially Cold Files: {num_es_cold_files}")
     logging.info(f"Total Size of Especially Cold Data: {sizeof_fmt(total_es_cold_size)}")
@@ -465,10 +819,10 @@ def analyze_es_cold_data(cold_data, max_depth):
     # Especially Cold Data by Directory Depth
     logging.info("\nEspecially Cold Data by Directory Depth:")
     for depth in range(1, max_depth + 1):
-        depth_col = f'dir_depth_{depth}'
-        unique_values = especially_cold_data[depth_col].nunique()
+        es_cold_by_depth = tree.sizes_at_depth(depth, file_class='es_cold')
+        unique_values = len(es_cold_by_depth)
         if unique_values > 1:
-            es_cold_by_dir = especially_cold_data.groupby(depth_col, observed=True)['size'].sum().sort_values(ascending=False).head(20)
+            es_cold_by_dir = es_cold_by_depth.sort_values(ascending=False).head(20)
             logging.info(f"\nTop 20 Directories at Depth {depth} with Especially Cold Data (By Total Size):")
             for dir_path, size in es_cold_by_dir.items():
                 logging.info(f"{dir_path}: {sizeof_fmt(size)}")
@@ -477,112 +831,110 @@ def analyze_es_cold_data(cold_data, max_depth):
 
     # Especially Cold Data by Leaf Directory
     logging.info("\nEspecially Cold Data by Leaf Directory (Bottom-Level Directories):")
-    es_cold_by_leaf = especially_cold_data.groupby('leaf_dir', observed=True)['size'].sum().sort_values(ascending=False).head(20)
+    es_cold_by_leaf = tree.sizes_by_leaf(file_class='es_cold').sort_values(ascending=False).head(20)
     for leaf_dir, size in es_cold_by_leaf.items():
         logging.info(f"{leaf_dir}: {sizeof_fmt(size)}")
 
     # Especially Cold Data by Last Two Leaf Directories
     logging.info("\nEspecially Cold Data by Last Two Leaf Directories:")
-    es_cold_by_last_two_leaf = especially_cold_data.groupby('last_two_leaf_dirs', observed=True)['size'].sum().sort_values(ascending=False).head(20)
+    es_cold_by_last_two_leaf = tree.sizes_by_leaf(file_class='es_cold', levels=2).sort_values(ascending=False).head(20)
     for last_two_leaf, size in es_cold_by_last_two_leaf.items():
         logging.info(f"{last_two_leaf}: {sizeof_fmt(size)}")
 
-    return especially_cold_data
-
 # 11. Analyze File Type Coldness (Feature 1)
-def analyze_file_type_coldness(df, args):
+def analyze_file_type_coldness(args, extension_ages):
     """
     For each of the top 25 file types (by total size), analyze how quickly the data becomes cold.
 
     Args:
-        df (pd.DataFrame): The feature-engineered DataFrame.
         args (argparse.Namespace): Parsed command-line arguments.
+        extension_ages (AgeHistogram): Days since access per extension.
 
     Returns:
         None
     """
     logging.info("\nAnalyzing File Type Coldness:")
-    top_extensions = df.groupby('extension')['size'].sum().sort_values(ascending=False).head(25).index.tolist()
+    size_by_extension = extension_ages.by_group()
+    cold_size_by_extension = extension_ages.by_group(min_age=args.cold_threshold)
+    age_group_sizes = {
+        label: extension_ages.by_group(low, None if np.isinf(high) else high)
+        for label, low, high in zip(AGE_GROUP_LABELS, AGE_GROUP_BINS[:-1], AGE_GROUP_BINS[1:])
+    }
+    top_extensions = size_by_extension.sort_values(ascending=False).head(25).index.tolist()
 
     for ext in top_extensions:
-        ext_data = df[df['extension'] == ext]
-        total_size = ext_data['size'].sum()
+        total_size = size_by_extension[ext]
         # Calculate percentage of data that is cold
-        cold_data = ext_data[ext_data['days_since_access'] > args.cold_threshold]
-        cold_size = cold_data['size'].sum()
+        cold_size = cold_size_by_extension[ext]
         cold_percentage = (cold_size / total_size) * 100 if total_size > 0 else 0
         logging.info(f"Extension: {ext}")
         logging.info(f"  Total Size: {sizeof_fmt(total_size)}")
         logging.info(f"  Cold Data Size: {sizeof_fmt(cold_size)} ({cold_percentage:.2f}% of total)")
-        # Analyze how quickly data becomes cold
-        # Create a histogram of 'days_since_access'
-        bins = [0, 30, 90, 180, 365, 730, np.inf]
-        labels = ['<1m', '1-3m', '3-6m', '6-12m', '1-2y', '>2y']
-        ext_data['access_age_group'] = pd.cut(ext_data['days_since_access'], bins=bins, labels=labels)
-        age_distribution = ext_data.groupby('access_age_group')['size'].sum()
+        # Analyze how quickly data becomes cold (size by access age group)
         logging.info(f"  Data Size by Access Age Group:")
-        for age_group, size in age_distribution.items():
-            logging.info(f"    {age_group}: {sizeof_fmt(size)}")
+        for age_group in AGE_GROUP_LABELS:
+            logging.info(f"    {age_group}: {sizeof_fmt(age_group_sizes[age_group][ext])}")
 
 # 12. Analyze Folder Coldness (Features 4 and 5)
-def analyze_folder_coldness(df, args):
+def analyze_folder_coldness(args, tree, folder_ages, largest_by_folder):
     """
     Analyze how quickly data in various folders becomes cold, including consistent folder structures.
 
     Args:
-        df (pd.DataFrame): The feature-engineered DataFrame.
         args (argparse.Namespace): Parsed command-line arguments.
+        tree (DirectoryTree): Directory tree index of the whole dataset.
+        folder_ages (AgeHistogram): Days since access per (mountpoint, season, event).
+        largest_by_folder (TopK): Largest files per (mountpoint, season, event).
 
     Returns:
         None
     """
     logging.info("\nAnalyzing Folder Coldness:")
 
-    # For top 20 folders by total size
-    top_folders = df.groupby('dir_depth_3')['size'].sum().sort_values(ascending=False).head(20).index.tolist()
+    # For top 20 folders by total size (dir_depth_3 values, answered from the tree index)
+    folder_sizes = tree.sizes_at_depth(3)
+    folder_cold_sizes = tree.sizes_at_depth(3, min_days=args.cold_threshold)
+    folder_age_distribution = tree.age_distribution_at_depth(3, AGE_GROUP_BINS, AGE_GROUP_LABELS)
+    top_folders = folder_sizes.sort_values(ascending=False).head(20).index.tolist()
     for folder in top_folders:
-        folder_data = df[df['dir_depth_3'] == folder]
-        total_size = folder_data['size'].sum()
-        cold_data = folder_data[folder_data['days_since_access'] > args.cold_threshold]
-        cold_size = cold_data['size'].sum()
+        total_size = folder_sizes[folder]
+        cold_size = folder_cold_sizes.get(folder, 0)
         cold_percentage = (cold_size / total_size) * 100 if total_size > 0 else 0
         logging.info(f"Folder: {folder}")
         logging.info(f"  Total Size: {sizeof_fmt(total_size)}")
         logging.info(f"  Cold Data Size: {sizeof_fmt(cold_size)} ({cold_percentage:.2f}% of total)")
         # Analyze how quickly data becomes cold
-        bins = [0, 30, 90, 180, 365, 730, np.inf]
-        labels = ['<1m', '1-3m', '3-6m', '6-12m', '1-2y', '>2y']
-        folder_data['access_age_group'] = pd.cut(folder_data['days_since_access'], bins=bins, labels=labels)
-        age_distribution = folder_data.groupby('access_age_group')['size'].sum()
+        age_distribution = folder_age_distribution.loc[folder]
         logging.info(f"  Data Size by Access Age Group:")
         for age_group, size in age_distribution.items():
             logging.info(f"    {age_group}: {sizeof_fmt(size)}")
 
     # Analyze consistent folder structures
     logging.info("\nAnalyzing Consistent Folder Structures:")
-    consistent_folders = df.groupby(['mountpoint', 'season', 'event'])['size'].sum().sort_values(ascending=False).head(20).reset_index()
-    for _, row in consistent_folders.iterrows():
-        folder_data = df[
-            (df['mountpoint'] == row['mountpoint']) &
-            (df['season'] == row['season']) &
-            (df['event'] == row['event'])
-        ]
-        total_size = folder_data['size'].sum()
-        cold_data = folder_data[folder_data['days_since_access'] > args.cold_threshold]
-        cold_size = cold_data['size'].sum()
+    size_by_folder = folder_ages.by_group()
+    cold_size_by_folder = folder_ages.by_group(min_age=args.cold_threshold)
+    age_group_sizes = {
+        label: folder_ages.by_group(low, None if np.isinf(high) else high)
+        for label, low, high in zip(AGE_GROUP_LABELS, AGE_GROUP_BINS[:-1], AGE_GROUP_BINS[1:])
+    }
+    consistent_folders = size_by_folder.sort_values(ascending=False).head(20).index.tolist()
+    for folder in consistent_folders:
+        mountpoint, season, event = folder
+        total_size = size_by_folder[folder]
+        cold_size = cold_size_by_folder[folder]
         cold_percentage = (cold_size / total_size) * 100 if total_size > 0 else 0
-        folder_path = f"/{row['mountpoint']}/{row['season']}/{row['event']}"
+        folder_path = f"/{mountpoint}/{season}/{event}"
         logging.info(f"Folder: {folder_path}")
         logging.info(f"  Total Size: {sizeof_fmt(total_size)}")
         logging.info(f"  Cold Data Size: {sizeof_fmt(cold_size)} ({cold_percentage:.2f}% of total)")
-        # Analyze how quickly data becomes cold
-        bins = [0, 30, 90, 180, 365, 730, np.inf]
-        labels = ['<1m', '1-3m', '3-6m', '6-12m', '1-2y', '>2y']
-        folder_data['access_age_group'] = pd.cut(folder_data['days_since_access'], bins=bins, labels=labels)
-        age_distribution = folder_data.groupby('access_age_group')['size'].sum()
+        # Analyze how quickly data becomes cold (size by access age group)
         logging.info(f"  Data Size by Access Age Group:")
-        for age_group, size in age_distribution.items():
-            logging.info(f"    {age_group}: {sizeof_fmt(size)}")
+        for age_group in AGE_GROUP_LABELS:
+            logging.info(f"    {age_group}: {sizeof_fmt(age_group_sizes[age_group][folder])}")
+        largest = largest_by_folder.top(folder)
+        logging.info(f"  Top {TOP_FILES_PER_GROUP} Largest Files:")
+        for path, size in zip(largest['path'], largest['size']):
+            logging.info(f"    {path}: {sizeof_fmt(size)}")
 
 # Function to interpret correlation coefficients
 def interpret_correlation(var1, var2, corr_value):
@@ -612,78 +964,82 @@ def interpret_correlation(var1, var2, corr_value):
         return "(Weak or no correlation)"
 
 # 13. Additional Insights (Updated for Features 2 and 3)
-def additional_insights(df, hot_data, cold_data, args):
+def additional_insights(aggregates, args):
     """
     Provide additional insights such as total size, file size statistics, top largest files, and last access distribution.
 
     Args:
-        df (pd.DataFrame): The feature-engineered DataFrame.
-        hot_data (pd.DataFrame): The hot data DataFrame.
-        cold_data (pd.DataFrame): The cold data DataFrame.
+        aggregates (dict): Report aggregates of the whole dataset.
         args (argparse.Namespace): Parsed command-line arguments.
 
     Returns:
         None
     """
     # Report total size of all files
-    total_size = df['size'].sum()
+    total_size = aggregates['extension'].total()
     logging.info(f"\nTotal Size of All Files: {sizeof_fmt(total_size)}")
 
-    # a. File Size Statistics
-    size_stats = df['size'].describe()
-    median_size = df['size'].median()
-    mode_size = df['size'].mode()[0] if not df['size'].mode().empty else np.nan
-    geom_mean_size = stats.gmean(df['size'][df['size'] > 0]) if (df['size'] > 0).any() else np.nan
-    harmonic_mean_size = stats.hmean(df['size'][df['size'] > 0]) if (df['size'] > 0).any() else np.nan
+    # a. File Size Statistics (one-pass accumulator; median, percentiles and mode from its size histogram)
+    size_stats = aggregates['size']
 
     logging.info("\nFile Size Statistics:")
-    logging.info(f"Count: {int(size_stats['count'])}")
-    logging.info(f"Mean: {sizeof_fmt(size_stats['mean'])}")
-    logging.info(f"Median: {sizeof_fmt(median_size)}")
-    logging.info(f"Mode: {sizeof_fmt(mode_size)}")
-    logging.info(f"Standard Deviation: {sizeof_fmt(size_stats['std'])}")
-    logging.info(f"Minimum: {sizeof_fmt(size_stats['min'])}")
-    logging.info(f"25th Percentile: {sizeof_fmt(size_stats['25%'])}")
-    logging.info(f"75th Percentile: {sizeof_fmt(size_stats['75%'])}")
-    logging.info(f"Maximum: {sizeof_fmt(size_stats['max'])}")
+    logging.info(f"Count: {size_stats.count}")
+    logging.info(f"Mean: {sizeof_fmt(size_stats.mean)}")
+    logging.info(f"Median: {sizeof_fmt(size_stats.quantile(0.5))}")
+    logging.info(f"Mode: {sizeof_fmt(size_stats.mode())}")
+    logging.info(f"Standard Deviation: {sizeof_fmt(size_stats.std())}")
+    logging.info(f"Minimum: {sizeof_fmt(size_stats.min)}")
+    logging.info(f"25th Percentile: {sizeof_fmt(size_stats.quantile(0.25))}")
+    logging.info(f"75th Percentile: {sizeof_fmt(size_stats.quantile(0.75))}")
+    logging.info(f"Maximum: {sizeof_fmt(size_stats.max)}")
+    logging.info(f"(Median and percentiles are accurate to within {size_stats.relative_accuracy:.1%}; the mode is the most common size to within a quarter-doubling.)")
+    geom_mean_size = size_stats.geometric_mean()
+    harmonic_mean_size = size_stats.harmonic_mean()
     if not np.isnan(geom_mean_size):
         logging.info(f"Geometric Mean: {sizeof_fmt(geom_mean_size)}")
     if not np.isnan(harmonic_mean_size):
         logging.info(f"Harmonic Mean: {sizeof_fmt(harmonic_mean_size)}")
 
     # b. Top 20 Largest Files (Overall)
-    top_largest_overall = df.nlargest(20, 'size')[['path', 'size']]
+    top_largest_overall = aggregates['largest']['overall'].top()
     logging.info("\nTop 20 Largest Files (Overall):")
-    for _, row in top_largest_overall.iterrows():
-        logging.info(f"{row['path']}: {sizeof_fmt(row['size'])}")
+    for path, size in zip(top_largest_overall['path'], top_largest_overall['size']):
+        logging.info(f"{path}: {sizeof_fmt(size)}")
 
     # c. Top 20 Largest Hot Files
-    top_largest_hot = hot_data.nlargest(20, 'size')[['path', 'size']]
+    top_largest_hot = aggregates['largest']['hot'].top()
     logging.info("\nTop 20 Largest Hot Files:")
-    for _, row in top_largest_hot.iterrows():
-        logging.info(f"{row['path']}: {sizeof_fmt(row['size'])}")
+    for path, size in zip(top_largest_hot['path'], top_largest_hot['size']):
+        logging.info(f"{path}: {sizeof_fmt(size)}")
 
     # d. Top 20 Largest Cold Files
-    top_largest_cold = cold_data.nlargest(20, 'size')[['path', 'size']]
+    top_largest_cold = aggregates['largest']['cold'].top()
     logging.info("\nTop 20 Largest Cold Files:")
-    for _, row in top_largest_cold.iterrows():
-        logging.info(f"{row['path']}: {sizeof_fmt(row['size'])}")
+    for path, size in zip(top_largest_cold['path'], top_largest_cold['size']):
+        logging.info(f"{path}: {sizeof_fmt(size)}")
 
     # e. File Modifications Over Time
-    df['modify_year_month'] = df['modify_time'].dt.to_period('M')
-    modifications_over_time = df['modify_year_month'].value_counts().sort_index()
+    modifications_over_time = aggregates['modifications'].sort_index()
     logging.info("\nFile Modifications Over Time:")
     for period, count in modifications_over_time.items():
         logging.info(f"{period}: {count}")
 
     # f. File Extension Size Contribution (Overall)
-    size_by_extension = df.groupby('extension', observed=True)['size'].sum().sort_values(ascending=False)
+    size_by_extension = aggregates['extension'].by_group().sort_values(ascending=False)
     logging.info("\nTotal Size by File Extension (Overall):")
     for ext, size in size_by_extension.items():
         logging.info(f"{ext}: {sizeof_fmt(size)}")
 
+    # f2. Largest Files of the Largest File Extensions
+    logging.info(f"\nTop {TOP_FILES_PER_GROUP} Largest Files of the {TOP_EXTENSIONS} Largest File Extensions:")
+    for ext in size_by_extension.head(TOP_EXTENSIONS).index:
+        logging.info(f"{ext}:")
+        largest = aggregates['largest']['extension'].top(ext)
+        for path, size in zip(largest['path'], largest['size']):
+            logging.info(f"  {path}: {sizeof_fmt(size)}")
+
     # g. Correlation Matrix with Explanations
-    correlation = df[['size', 'days_since_access']].corr()
+    correlation = aggregates['size_days'].correlation(['size', 'days_since_access'])
     logging.info("\nCorrelation Matrix:")
     for row in correlation.index:
         for col in correlation.columns:
@@ -693,26 +1049,23 @@ def additional_insights(df, hot_data, cold_data, args):
 
     # h. Data Accessed Over Time (Feature 2)
     logging.info("\nData Accessed Over Time:")
-    current_date = pd.to_datetime(args.current_date)
-    df['months_since_access'] = (current_date.year - df['access_time'].dt.year) * 12 + (current_date.month - df['access_time'].dt.month)
-
-    for months_ago in range(1, 25):
-        data_accessed = df[df['months_since_access'] <= months_ago]
-        total_size = data_accessed['size'].sum()
+    month_ages = aggregates['months']
+    for months_ago in ACCESS_MONTHS:
+        total_size = month_ages.total(max_age=months_ago)
         logging.info(f"Data accessed in last {months_ago} month(s): {sizeof_fmt(total_size)}")
 
     # i. Indication of How Quickly Total Data Becomes Cold (Feature 3)
     logging.info("\nIndication of How Quickly Total Data Becomes Cold:")
-    total_size = df['size'].sum()
-    for days in [30, 90, 180, 365, 730]:
-        cold_data = df[df['days_since_access'] > days]
-        cold_size = cold_data['size'].sum()
+    day_ages = aggregates['extension']
+    total_size = day_ages.total()
+    for days in COLD_INDICATION_DAYS:
+        cold_size = day_ages.total(min_age=days)
         cold_percentage = (cold_size / total_size) * 100 if total_size > 0 else 0
         logging.info(f"Data not accessed in last {days} day(s): {sizeof_fmt(cold_size)} ({cold_percentage:.2f}% of total)")
 
 # 14. Main Function
 def main():
-    total_start_time = time.time()
+    total_start = start_timer()
 
     # Parse arguments
     args = parse_arguments()
@@ -724,30 +1077,71 @@ def main():
     logging.info(f"Hot Threshold (days): {args.hot_threshold}")
     logging.info(f"Cold Threshold (days): {args.cold_threshold}")
     logging.info(f"Maximum Directory Depth: {args.max_depth}")
+    logging.info(f"File Size Percentile Accuracy: {args.size_accuracy:.1%}")
+    if args.workers > 1:
+        logging.info(f"Parallel Mode: {args.workers} workers, {args.chunk_rows} rows per chunk")
+    elif args.streaming:
+        logging.info(f"Streaming Mode: {args.chunk_rows} rows per chunk")
+
+    if args.workers > 1:
+        # Load, Clean and Aggregate chunks in a process pool
+        parallel_start = start_timer()
+        aggregates, actual_max_depth, stage_times = parallel_report_aggregates(args)
+        parallel_time = stop_timer(parallel_start)
+    elif args.streaming:
+        # Load, Clean and Aggregate chunk by chunk
+        aggregates, actual_max_depth, stage_times = stream_report_aggregates(args)
+    else:
+        stage_times = {'clean': (0.0, 0.0)}
+        cache = None if args.no_cache else ArrowCache(args.cache_dir, 'analyzer', ANALYZER_VERSION)
+        cache_params = {'current_date': args.current_date, 'max_depth': args.max_depth}
+
+        # Load cleaned data from the cache, or Load Data and Clean and Engineer Features
+        section_start = start_timer()
+        df, cache_metadata = cache.load(args.file, cache_params) if cache else (None, None)
+        if df is not None:
+            actual_max_depth = cache_metadata['actual_max_depth']
+            stage_times['load'] = stop_timer(section_start)
+        else:
+            df = load_data(args.file)
+            stage_times['load'] = stop_timer(section_start)
 
-    # Load Data
-    load_start_time = time.time()
-    df = load_data(args.file)
-    load_end_time = time.time()
-    load_time = load_end_time - load_start_time
+            section_start = start_timer()
+            # The reports are answered from the directory tree and need no per-file directory columns
+            df, actual_max_depth = clean_and_engineer(df, args.current_date, args.max_depth, directory_columns=False)
+            if cache:
+                cache.store(df, args.file, cache_params, {'actual_max_depth': int(actual_max_depth)})
+            stage_times['clean'] = stop_timer(section_start)
 
-    # Clean and Engineer Features
-    df, actual_max_depth = clean_and_engineer(df, args.current_date, args.max_depth)
-    clean_engineer_time = df.processing_time
+        # Aggregate for the reports
+        section_start = start_timer()
+        aggregates = build_report_aggregates(df, args)
+        stage_times['aggregate'] = stop_timer(section_start)
 
     # Analyze Data
-    processing_times = analyze_data(df, args, actual_max_depth)
+    processing_times = analyze_data(aggregates, args, actual_max_depth)
 
-    total_end_time = time.time()
-    total_processing_time = total_end_time - total_start_time
+    total_time = stop_timer(total_start)
 
-    # Log processing times
+    # Log processing times (wall clock and CPU; the CPU time of pool workers is included)
     logging.info("\nProcessing Time Summary:")
-    logging.info(f"Data Loading Time: {load_time:.2f} seconds")
-    logging.info(f"Data Cleaning and Feature Engineering Time: {clean_engineer_time:.2f} seconds")
-    for section, time_taken in processing_times.items():
-        logging.info(f"{section.replace('_', ' ').title()}: {time_taken:.2f} seconds")
-    logging.info(f"Total Processing Time: {total_processing_time:.2f} seconds")
+    stage_names = (('load', 'Data Loading Time'), ('clean', 'Data Cleaning and Feature Engineering Time'), ('aggregate', 'Report Aggregation Time'))
+    if args.workers > 1:
+        logging.info(f"Parallel Aggregation Time: {parallel_time[0]:.2f} seconds (CPU {parallel_time[1]:.2f} seconds in this process)")
+        logging.info(f"Arrow IPC Write Time: {stage_times['ipc'][0]:.2f} seconds (CPU {stage_times['ipc'][1]:.2f} seconds)")
+        for stage, name in stage_names:
+            logging.info(f"{name}: {stage_times[stage][0]:.2f} seconds summed over workers (CPU {stage_times[stage][1]:.2f} seconds)")
+        logging.info(f"Chunk Merging Time: {stage_times['merge'][0]:.2f} seconds (CPU {stage_times['merge'][1]:.2f} seconds)")
+        worker_cpu = sum(stage_times[stage][1] for stage, _ in stage_names)
+        total_time = (total_time[0], total_time[1] + worker_cpu)
+    else:
+        if 'merge' in stage_times:
+            stage_times['aggregate'] = add_times(stage_times['aggregate'], stage_times['merge'])
+        for stage, name in stage_names:
+            logging.info(f"{name}: {stage_times[stage][0]:.2f} seconds (CPU {stage_times[stage][1]:.2f} seconds)")
+    for section, (wall_time, cpu_time) in processing_times.items():
+        logging.info(f"{section.replace('_', ' ').title()}: {wall_time:.2f} seconds (CPU {cpu_time:.2f} seconds)")
+    logging.info(f"Total Processing Time: {total_time[0]:.2f} seconds (CPU {total_time[1]:.2f} seconds)")
 
 if __name__ == "__main__":
     main()
@@ -9,6 +9,12 @@ from datetime import datetime
 import logging
 import numpy as np
 import re
+from arrowcache import ArrowCache
+from pathcodec import encode_frame, frame_paths
+from scanfilter import parse_filters, format_filters, open_dataset, split_filters, read_table, apply_filters
+
+# Part of the cache key of cleaned tables: bump whenever extract_fields() or bucket_age() output changes
+ANALYZER_VERSION = '2.1'
 
 # Helper Functions
 def human_readable_size(size, decimal_places=2):
@@ -50,19 +56,27 @@ def setup_logging(log_file):
 # Argument Parsing
 def parse_arguments():
     parser = argparse.ArgumentParser(description='Analyze file access and data hot/cold-ness.')
-    parser.add_argument('csv_file', help='Path to the input CSV file.')
-    parser.add_argument('--parquet_file', help='Path to the parquet file for caching.', default=None)
+    parser.add_argument('csv_file', help='Path to the input CSV file (or a Parquet file or partitioned dataset directory).')
+    parser.add_argument('--cache_dir', help='Directory of the Arrow cache of cleaned data (default: .analyzer_cache next to the input file).', default=None)
+    parser.add_argument('--no_cache', help='Neither read nor write the cache of cleaned data.', action='store_true')
     parser.add_argument('--log_file', help='Path to the log output file.', default='file_analysis.log')
     parser.add_argument('--current_date', help='Current date for analysis (YYYY-MM-DD). Defaults to today.', default=None)
     parser.add_argument('--mount_point', help='Mount point to ignore in path parsing.', default='/mnt/')
+    parser.add_argument('--filter', help="Only analyze files matching column<op>value, e.g. season=2024 or days_since_last_access>=180 (repeatable; a=x,y matches either). Filters on columns stored in a Parquet input are pushed into the read.", action='append', default=[])
     return parser.parse_args()
 
 # Data Loading
-def load_data(csv_file, parquet_file=None):
+def load_data(csv_file, filters=()):
+    """
+    Returns the loaded frame and the filters still to apply: Parquet inputs are read with the
+    filters on their stored columns pushed down, skipping partitions and row groups.
+    """
     try:
-        if parquet_file and os.path.exists(parquet_file):
-            logging.info(f'Loading data from parquet file: {parquet_file}')
-            df = pd.read_parquet(parquet_file)
+        remaining = list(filters)
+        if csv_file.endswith('.parquet') or os.path.isdir(csv_file):
+            logging.info(f'Loading data from parquet file: {csv_file}')
+            pushed, remaining = split_filters(remaining, open_dataset(csv_file).schema.names)
+            df = read_table(csv_file, pushed).to_pandas()
         else:
             logging.info(f'Loading data from CSV file: {csv_file}')
             df = pd.read_csv(
@@ -70,11 +84,8 @@ def load_data(csv_file, parquet_file=None):
                 parse_dates=['access_time', 'modify_time', 'change_time'],
                 infer_datetime_format=True
             )
-            if parquet_file:
-                logging.info(f'Saving data to parquet file: {parquet_file}')
-                df.to_parquet(parquet_file, index=False)
         logging.info('Data loaded successfully.')
-        return df
+        return df, remaining
     except Exception as e:
         logging.exception(f'Failed to load data: {e}')
         sys.exit(1)
@@ -86,41 +97,63 @@ def extract_fields(df, mount_point):
 
         mount_point = mount_point.rstrip('/') + '/'
 
-        if 'path' not in df.columns:
+        if 'path' not in df.columns and 'directory' not in df.columns:
             logging.error("'path' column is missing from the data.")
             sys.exit(1)
 
-        def parse_path(path):
-            try:
-                p = Path(path)
-                if not str(p).startswith(mount_point):
-                    logging.warning(f'Path does not start with mount point and will be skipped: {path}')
-                    return pd.Series({'season': 'Unknown', 'event': 'Unknown', 'department': 'Unknown'})
-                relative = p.relative_to(mount_point)
-                parts = relative.parts
-                season = parts[0] if len(parts) >= 1 else 'Unknown'
-                event = parts[1] if len(parts) >= 2 else 'Unknown'
-                department = parts[2] if len(parts) >= 3 else 'Unknown'
-                # Categorize 'department' as 'chassis' if it matches 'YYYY-MM'
-                department_pattern = r'^\d{4}-\d{2}$'
-                if re.match(department_pattern, department):
-                    department = 'chassis'
-                return pd.Series({'season': season, 'event': event, 'department': department})
-            except Exception as e:
-                logging.warning(f'Error parsing path {path}: {e}')
-                return pd.Series({'season': 'Unknown', 'event': 'Unknown', 'department': 'Unknown'})
-
-        extracted = df['path'].apply(parse_path)
-        df = pd.concat([df, extracted], axis=1)
-
-        df['file_extension'] = df['path'].str.extract(r'\.([^.\\/:*?"<>|\r\n]+)$', expand=False).str.lower().fillna('unknown')
+        # Paths as interned directories and file names; all other path work is done once
+        # per unique directory, normalized like pathlib.Path would
+        df = encode_frame(df)
+        directories = df['directory'].cat.categories
+        dir_codes = df['directory'].cat.codes.to_numpy()
+        names = df['name'].fillna('').to_numpy(dtype=object)
+
+        field_names = ['season', 'event', 'department']
+        dir_values = [np.full(len(directories), 'Unknown', dtype=object) for _ in field_names]
+        dir_lengths = np.full(len(directories), -1)
+        for index, directory in enumerate(directories):
+            normalized = str(Path(directory)) if directory else ''
+            if not (normalized + '/').startswith(mount_point):
+                continue
+            parts = [part for part in normalized[len(mount_point):].split('/') if part]
+            dir_lengths[index] = len(parts)
+            for level, part in enumerate(parts[:len(field_names)]):
+                dir_values[level][index] = part
+
+        # Rows: components of the directory, the file name right below it, or 'Unknown'
+        row_lengths = np.where(dir_codes >= 0, dir_lengths[dir_codes], -1)
+        outside = row_lengths < 0
+        if outside.any():
+            examples = frame_paths(df.iloc[np.flatnonzero(outside)[:10]]).tolist()
+            logging.warning(f'{outside.sum()} paths do not start with mount point and will be skipped, e.g.: {examples}')
+        for level, col in enumerate(field_names):
+            values = np.where(row_lengths > level, dir_values[level][dir_codes], 'Unknown')
+            values = np.where((row_lengths == level) & (names != ''), names, values)
+            df[col] = pd.Categorical(values)
+
+        # Categorize 'department' as 'chassis' if it matches 'YYYY-MM' (once per unique value)
+        department_pattern = re.compile(r'^\d{4}-\d{2}$')
+        departments = df['department'].cat.categories
+        renamed = np.array(['chassis' if department_pattern.match(department) else department for department in departments], dtype=object)
+        if (renamed != departments.to_numpy(dtype=object)).any():
+            df['department'] = pd.Categorical(renamed[df['department'].cat.codes.to_numpy()])
+
+        # Extensions are interned too; those with characters not allowed in an extension count as unknown
+        invalid_pattern = re.compile(r'[:*?"<>|\r\n]')
+        labels = np.array(
+            ['unknown' if invalid_pattern.search(extension) else extension for extension in df['extension'].cat.categories] + ['unknown'],
+            dtype=object
+        )
+        df['file_extension'] = pd.Categorical(labels[df['extension'].cat.codes.to_numpy()])
 
         # Convert to categorical dtype
         for col in ['season', 'event', 'department', 'file_extension']:
             df[col] = df[col].astype('category')
 
         logging.info('Sample extracted fields:')
-        logging.info(df[['path', 'season', 'event', 'department']].head(10).to_string(index=False))
+        sample = df[['season', 'event', 'department']].head(10)
+        sample.insert(0, 'path', frame_paths(df.head(10)))
+        logging.info(sample.to_string(index=False))
 
         logging.info('Extraction of season, event, and department completed successfully.')
         return df
@@ -134,11 +167,10 @@ def bucket_age(df, current_date):
         logging.info('Calculating age of files and bucketing into monthly intervals.')
 
         df['access_time'] = pd.to_datetime(df['access_time'], errors='coerce')
-        initial_count = len(df)
-        df = df.dropna(subset=['access_time'])
-        dropped_count = initial_count - len(df)
-        if dropped_count > 0:
-            logging.warning(f'Dropped {dropped_count} rows due to invalid access_time.')
+        invalid = df['access_time'].isna().to_numpy()
+        if invalid.any():
+            logging.warning(f'Dropped {invalid.sum()} rows due to invalid access_time.')
+            df = df.take(np.flatnonzero(~invalid))
 
         df['age_days'] = (current_date - df['access_time']).dt.days
         df['age_months'] = df['age_days'] / 30  # Approximate
@@ -208,9 +240,9 @@ def file_extension_analysis(df):
             df['size'] = pd.to_numeric(df['size'], errors='coerce')
             invalid_sizes = df['size'].isna().sum()
             if invalid_sizes > 0:
-                logging.warning(f'{invalid_sizes} rows have invalid size values and will be dropped.')
-                df = df.dropna(subset=['size'])
+                logging.warning(f'{invalid_sizes} rows have invalid size values and will be ignored.')
 
+        # The sums skip missing sizes, so the rows need not be dropped from a copy
         extension_sizes = df.groupby('file_extension')['size'].sum().sort_values(ascending=False)
 
         top_25 = extension_sizes.head(25)
@@ -311,22 +343,44 @@ def main():
 
     logging.info(f'Using current date for analysis: {current_date.date()}')
 
-    # Load data
-    parquet_file = args.parquet_file if args.parquet_file else Path(args.csv_file).with_suffix('.parquet')
-    df = load_data(args.csv_file, parquet_file)
+    try:
+        filters = parse_filters(args.filter)
+    except ValueError as e:
+        logging.error(e)
+        sys.exit(1)
 
-    # Extract fields
-    df = extract_fields(df, args.mount_point)
+    # Load cleaned data from the cache
+    cache = None if args.no_cache else ArrowCache(args.cache_dir, 'analyzerv2', ANALYZER_VERSION)
+    cache_params = {'current_date': str(current_date.date()), 'mount_point': args.mount_point, 'filters': format_filters(filters)}
+    df = cache.load(args.csv_file, cache_params)[0] if cache else None
 
-    # Drop rows with missing essential fields
-    initial_count = len(df)
-    df = df.dropna(subset=['season', 'event', 'department'])
-    dropped_count = initial_count - len(df)
-    if dropped_count > 0:
-        logging.warning(f'Dropped {dropped_count} rows due to missing season/event/department.')
+    if df is None:
+        # Load data
+        df, remaining_filters = load_data(args.csv_file, filters)
 
-    # Bucket age
-    df = bucket_age(df, current_date)
+        # Extract fields
+        df = extract_fields(df, args.mount_point)
+
+        # Filters on derived fields (season, event, department, file_extension) or on CSV columns
+        if remaining_filters:
+            try:
+                df = apply_filters(df, remaining_filters)
+            except ValueError as e:
+                logging.error(e)
+                sys.exit(1)
+            logging.info(f'{len(df)} records match filters {format_filters(remaining_filters)}.')
+
+        # Drop rows with missing essential fields; the frame is only copied when there are any
+        missing = df[['season', 'event', 'department']].isna().any(axis=1).to_numpy()
+        if missing.any():
+            logging.warning(f'Dropped {missing.sum()} rows due to missing season/event/department.')
+            df = df.take(np.flatnonzero(~missing))
+
+        # Bucket age
+        df = bucket_age(df, current_date)
+
+        if cache:
+            cache.store(df, args.csv_file, cache_params)
 
     # Analyze coldness
     coldness_overall, coldness_by_season, coldness_by_event, coldness_by_department = analyze_coldness(df)
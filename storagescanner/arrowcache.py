@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+Cache of the analyzers' cleaned, feature-engineered tables as Arrow IPC files.
+
+Cleaning a scan (parsing dates and paths, interning directories) costs far
+more than the reports run on it, and the same scan is usually reported on
+many times. The cleaned table is written once as an uncompressed Arrow IPC
+(Feather v2) file and memory-mapped on later runs, so loading it neither
+decodes nor decompresses anything: numeric and dictionary columns are used in
+place and string columns stay Arrow-backed.
+
+Entries are keyed by the source file (path, size, modification time and a
+hash of its first and last blocks), the analyzer and its version, and the
+parameters that shape the cleaned table. A changed scan, a new analyzer
+version or different parameters simply miss, and the stale entry of the same
+source (the same absolute path) is removed when the new one is written.
+"""
+import os
+import json
+import hashlib
+import logging
+import pandas as pd
+import pyarrow as pa
+
+# Part of every key; bump when the file layout below changes
+CACHE_FORMAT_VERSION = 1
+# Bytes hashed at the start and at the end of the source file
+SAMPLE_BYTES = 1 << 20
+
+def source_fingerprint(source):
+    """
+    Identity of a source file that changes whenever the file is rewritten, without reading it all.
+    A directory (a partitioned dataset) is identified by the names, sizes and modification times
+    of all files below it.
+    """
+    if os.path.isdir(source):
+        digest = hashlib.blake2b(digest_size=16)
+        for root, dirs, files in sorted(os.walk(source)):
+            for name in sorted(files):
+                stat = os.stat(os.path.join(root, name))
+                digest.update(f"{os.path.relpath(os.path.join(root, name), source)}\0{stat.st_size}\0{stat.st_mtime_ns}\n".encode('utf-8'))
+        return {'path': os.path.abspath(source), 'files_hash': digest.hexdigest()}
+    stat = os.stat(source)
+    digest = hashlib.blake2b(digest_size=16)
+    with open(source, 'rb') as fh:
+        digest.update(fh.read(SAMPLE_BYTES))
+        if stat.st_size > SAMPLE_BYTES:
+            fh.seek(max(SAMPLE_BYTES, stat.st_size - SAMPLE_BYTES))
+            digest.update(fh.read(SAMPLE_BYTES))
+    return {
+        'path': os.path.abspath(source),
+        'size': stat.st_size,
+        'mtime_ns': stat.st_mtime_ns,
+        'sample_hash': digest.hexdigest(),
+    }
+
+class ArrowCache:
+    """
+    Directory of cached tables for one analyzer.
+
+    Args:
+        cache_dir (str or None): Where entries are kept; None uses '.analyzer_cache' next to each source.
+        analyzer (str): Name of the analyzer, part of the key and of the file names.
+        version (str): Analyzer version; bump it when its cleaned table changes.
+    """
+    def __init__(self, cache_dir, analyzer, version):
+        self.cache_dir = cache_dir
+        self.analyzer = analyzer
+        self.version = version
+
+    def entry_prefix(self, source):
+        """
+        File name prefix of all entries of source. It includes a hash of the absolute path, so
+        sources with the same name in different directories can share a cache directory.
+        """
+        source = os.path.abspath(source)
+        cache_dir = self.cache_dir or os.path.join(os.path.dirname(source), '.analyzer_cache')
+        path_hash = hashlib.blake2b(source.encode('utf-8'), digest_size=6).hexdigest()
+        return os.path.join(cache_dir, f"{os.path.basename(source)}.{path_hash}.{self.analyzer}.")
+
+    def entry_path(self, source, params):
+        """
+        Cache file of source cleaned with params (a JSON-serializable dict).
+        """
+        key = {
+            'format': CACHE_FORMAT_VERSION,
+            'analyzer': self.analyzer,
+            'version': self.version,
+            'source': source_fingerprint(source),
+            'params': params,
+        }
+        digest = hashlib.blake2b(json.dumps(key, sort_keys=True, default=str).encode('utf-8'), digest_size=12).hexdigest()
+        return self.entry_prefix(source) + digest + '.arrow'
+
+    def load(self, source, params):
+        """
+        Memory-map the cached table of source, if there is one.
+
+        Returns:
+            (pd.DataFrame, dict) or (None, None): The table and the metadata stored with it.
+        """
+        path = self.entry_path(source, params)
+        if not os.path.exists(path):
+            return None, None
+        try:
+            table = pa.ipc.open_file(pa.memory_map(path)).read_all()
+        except (OSError, pa.ArrowInvalid) as e:
+            logging.warning(f"Ignoring unreadable cache file {path}: {e}")
+            return None, None
+        metadata = json.loads((table.schema.metadata or {}).get(b'analyzer_cache', b'{}'))
+        # Strings stay in the mapped buffers instead of becoming Python objects
+        df = table.to_pandas(types_mapper=lambda dtype: pd.ArrowDtype(dtype) if pa.types.is_string(dtype) or pa.types.is_large_string(dtype) else None)
+        logging.info(f"Loaded {len(df)} cleaned records from cache file {path}.")
+        return df, metadata
+
+    def store(self, df, source, params, metadata=None):
+        """
+        Write df as the cached table of source and remove older entries of the same source.
+        The cache is only an optimization: if it cannot be written (read-only directory, full
+        disk, ...) a warning is logged and the run goes on without it.
+
+        Returns:
+            str or None: Path of the cache file, None when it could not be written.
+        """
+        path = self.entry_path(source, params)
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        table = table.replace_schema_metadata({
+            **(table.schema.metadata or {}),
+            b'analyzer_cache': json.dumps(metadata or {}).encode('utf-8'),
+        })
+        temp_path = path + '.tmp'
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with pa.OSFile(temp_path, 'wb') as sink:
+                with pa.ipc.new_file(sink, table.schema) as writer:
+                    writer.write_table(table)
+            os.replace(temp_path, path)
+        except OSError as e:
+            logging.warning(f"Not caching the cleaned records, cannot write cache file {path}: {e}")
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
+            return None
+        logging.info(f"Wrote {len(df)} cleaned records to cache file {path}.")
+
+        prefix = self.entry_prefix(source)
+        cache_dir = os.path.dirname(prefix)
+        for name in os.listdir(cache_dir):
+            stale = os.path.join(cache_dir, name)
+            if stale.startswith(prefix) and stale != path and stale.endswith('.arrow'):
+                try:
+                    os.remove(stale)
+                except OSError as e:
+                    logging.warning(f"Cannot remove stale cache file {stale}: {e}")
+        return path
@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+"""
+Compare megacollector's scan engines on a generated local tree with injected latency.
+
+Every os.scandir() call and every stat of a file sleeps for --latency_ms first, which
+approximates a CIFS share across the WAN. The patch is applied before any worker is
+started, so forked pool/crawler processes inherit it.
+
+The tree is --dirs directories of --files_per_dir files, or with --synthetic_files a synthfs
+tree in the share layout, whose files are spread very unevenly over its directories.
+
+Example usage:
+    python3 benchmarks/bench_engines.py --dirs 200 --files_per_dir 50 --latency_ms 2 --json /tmp/engines.json
+    python3 benchmarks/bench_engines.py --synthetic_files 20000 --latency_ms 2 --compare /tmp/engines.json
+"""
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+from multiprocessing import Pool, cpu_count
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import megacollector
+from synthfs import SyntheticScan
+from benchresults import result_document, write_results, load_results, print_comparison, TOLERANCE
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description='Benchmark megacollector scan engines against a local tree with injected latency.')
+    parser.add_argument('--dirs', type=int, default=200, help='Number of leaf directories to generate (default: 200)')
+    parser.add_argument('--files_per_dir', type=int, default=50, help='Files per leaf directory (default: 50)')
+    parser.add_argument('--fanout', type=int, default=10, help='Leaf directories per parent directory (default: 10)')
+    parser.add_argument('--latency_ms', type=float, default=2.0, help='Latency injected into every scandir and stat call (default: 2.0)')
+    parser.add_argument('--engines', nargs='+', default=['pool', 'scandir', 'async'], help='Engines to run (default: pool scandir async)')
+    parser.add_argument('--processes', type=int, default=cpu_count(), help='Processes for the pool and scandir engines')
+    parser.add_argument('--concurrency', type=int, default=256, help='Concurrency for the async engine (default: 256)')
+    parser.add_argument('--subtree_concurrency', type=int, default=64, help='Per-subtree concurrency for the async engine (default: 64)')
+    parser.add_argument('--synthetic_files', type=int, default=0, help='Generate a synthfs tree of this many files instead of --dirs x --files_per_dir')
+    parser.add_argument('--root', default=None, help='Existing directory to scan instead of generating one')
+    parser.add_argument('--json', default=None, help='Write the results to this JSON file')
+    parser.add_argument('--compare', default=None, help='Result file of an earlier run to compare with; exits with status 1 on regressions')
+    parser.add_argument('--tolerance', type=float, default=TOLERANCE, help=f'Relative slow-down that counts as a regression with --compare (default: {TOLERANCE})')
+    return parser.parse_args()
+
+def build_tree(root, dirs, files_per_dir, fanout):
+    """
+    Create dirs leaf directories of files_per_dir small files, grouped fanout per parent directory.
+    """
+    for d in range(dirs):
+        leaf = os.path.join(root, f'group_{d // fanout:04d}', f'dir_{d:05d}')
+        os.makedirs(leaf, exist_ok=True)
+        for f in range(files_per_dir):
+            with open(os.path.join(leaf, f'file_{f:05d}.dat'), 'wb') as fh:
+                fh.write(b'x' * (f % 7))
+    return dirs * files_per_dir
+
+class SlowDirEntry:
+    """
+    os.DirEntry proxy whose stat() is delayed; everything else is forwarded.
+    """
+    def __init__(self, entry, delay):
+        self._entry = entry
+        self._delay = delay
+
+    def __getattr__(self, name):
+        return getattr(self._entry, name)
+
+    def stat(self, follow_symlinks=True):
+        time.sleep(self._delay)
+        return self._entry.stat(follow_symlinks=follow_symlinks)
+
+class SlowScandir:
+    """
+    Context manager / iterator wrapping os.scandir with a delay per call.
+    """
+    def __init__(self, scandir, path, delay):
+        time.sleep(delay)
+        self._it = scandir(path)
+        self._delay = delay
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self._it.close()
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        return SlowDirEntry(next(self._it), self._delay)
+
+    def close(self):
+        self._it.close()
+
+def inject_latency(delay):
+    """
+    Patch os.scandir and os.stat (also used by os.walk and megacollector) to sleep for delay seconds.
+    Returns a function that undoes the patch.
+    """
+    real_scandir = os.scandir
+    real_stat = os.stat
+
+    def slow_scandir(path='.'):
+        return SlowScandir(real_scandir, path, delay)
+
+    def slow_stat(path, *args, **kwargs):
+        time.sleep(delay)
+        return real_stat(path, *args, **kwargs)
+
+    os.scandir = slow_scandir
+    os.stat = slow_stat
+
+    def restore():
+        os.scandir = real_scandir
+        os.stat = real_stat
+    return restore
+
+def run_engine(engine, root, args):
+    """
+    Run one engine to completion and return (files, seconds).
+    """
+    files = 0
+    start = time.perf_counter()
+    if engine == 'pool':
+        with Pool(processes=args.processes) as pool:
+            scheduler = megacollector.AdaptiveScheduler(pool, False, max_in_flight=4 * args.processes)
+            for batch in scheduler.run(megacollector.traverse_files([root])):
+                files += len(batch)
+    elif engine == 'scandir':
+        for batch in megacollector.crawl_files([root], args.processes, False):
+            files += len(batch)
+    elif engine == 'async':
+        for batch in megacollector.crawl_files_async([root], args.concurrency, args.subtree_concurrency, False):
+            files += len(batch)
+    else:
+        raise ValueError(f"Unknown engine: {engine}")
+    return files, time.perf_counter() - start
+
+def main():
+    args = parse_arguments()
+    tmp_dir = None
+    root = args.root
+    if root is None:
+        tmp_dir = tempfile.mkdtemp(prefix='megacollector_bench_')
+        root = tmp_dir
+        if args.synthetic_files:
+            scan = SyntheticScan()
+            expected = scan.build_tree(root, args.synthetic_files, max_file_size=0)
+            print(f"Generated {expected} synthetic files under {root}")
+        else:
+            expected = build_tree(root, args.dirs, args.files_per_dir, args.fanout)
+            print(f"Generated {expected} files in {args.dirs} directories under {root}")
+
+    restore = inject_latency(args.latency_ms / 1000.0)
+    results = []
+    try:
+        for engine in args.engines:
+            files, seconds = run_engine(engine, root, args)
+            results.append({
+                'engine': engine,
+                'files': files,
+                'seconds': round(seconds, 3),
+                'files_per_second': round(files / seconds, 1) if seconds > 0 else None,
+            })
+            print(f"{engine:>8}: {files} files in {seconds:.2f}s ({files / seconds:,.0f} files/s)")
+    finally:
+        restore()
+        if tmp_dir is not None:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    parameters = {name: getattr(args, name) for name in (
+        'dirs', 'files_per_dir', 'fanout', 'synthetic_files', 'root', 'latency_ms', 'processes', 'concurrency', 'subtree_concurrency'
+    )}
+    document = result_document('engines', ['engine'], parameters, results)
+    if args.json:
+        write_results(args.json, document)
+    if args.compare and print_comparison(document, load_results(args.compare), args.tolerance):
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+"""
+Time every stage of the storagescanner pipeline on generated scans of several sizes.
+
+For each --rows a scan is generated with synthfs (untimed, and reused from --work_dir when
+it exists), then the stages run on it in order:
+
+    convert    parqConverter.convert(): CSV scan -> enriched Parquet file
+    load       analyzer.load_data()
+    clean      analyzer.clean_and_engineer()
+    aggregate  analyzer.build_report_aggregates()
+    stream     analyzer.stream_report_aggregates(): load, clean and aggregate chunk by chunk,
+               the analyzer's path for scans larger than memory
+    analyze    every section of analyzer.analyze_data() (build_directory_tree, analyze_cold_data,
+               ..., analyze_folder_coldness), each reported as its own stage
+
+load, clean and aggregate hold the whole scan in memory; they run together (also when only
+analyze is asked for) and are skipped above --memory_rows, where the analyze sections use the
+streamed aggregates. The scan stage runs once, on a tree
+of --tree_files sparse files created by synthfs: megacollector's scandir engine writing a
+CSV scan.
+
+Each result has the wall-clock and CPU seconds, rows per second and the process's peak RSS
+so far (a high-water mark: run one --rows per invocation to compare memory across sizes).
+With --json the results are written in benchresults' format, and --compare checks them
+against an earlier run.
+
+The analyzer's report is logged to bench_pipeline.log in the working directory. Timings
+include that logging, as in a real run.
+
+Example usage:
+    python3 benchmarks/bench_pipeline.py --rows 1000000 10000000 --json /tmp/pipeline.json
+    python3 benchmarks/bench_pipeline.py --rows 100000000 --stages stream analyze --work_dir /data/bench --json /tmp/pipeline-100m.json
+    python3 benchmarks/bench_pipeline.py --rows 1000000 --json /tmp/new.json --compare /tmp/pipeline.json
+"""
+import os
+import sys
+import time
+import shutil
+import logging
+import argparse
+import resource
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# The analyzer and megacollector configure logging to files in the working directory when
+# imported; configuring it first keeps the report in one place
+LOG_FILE = 'bench_pipeline.log'
+logging.basicConfig(filename=LOG_FILE, filemode='w', level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+import pandas as pd
+import analyzer
+import megacollector
+import parqConverter
+from aggregates import SIZE_RELATIVE_ACCURACY
+from synthfs import SyntheticScan, NOW
+from benchresults import result_document, write_results, load_results, print_comparison, TOLERANCE
+
+STAGES = ['scan', 'convert', 'load', 'clean', 'aggregate', 'stream', 'analyze']
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description='Benchmark the storagescanner pipeline stages on generated scans.')
+    parser.add_argument('--rows', type=int, nargs='+', default=[1000000], help='Scan sizes to run the stages on (default: 1000000)')
+    parser.add_argument('--stages', nargs='+', choices=STAGES, default=STAGES, help='Stages to run (default: all)')
+    parser.add_argument('--memory_rows', type=int, default=20000000, help='Largest scan the in-memory load/clean/aggregate stages run on (default: 20000000)')
+    parser.add_argument('--tree_files', type=int, default=20000, help='Files of the on-disk tree of the scan stage (default: 20000)')
+    parser.add_argument('--directories', type=int, default=20000, help='Distinct directories in the generated scans (default: 20000)')
+    parser.add_argument('--seed', type=int, default=7, help='Random seed of the generated scans (default: 7)')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='Processes of the scan and convert stages (default: all cores)')
+    parser.add_argument('--chunk_rows', type=int, default=1000000, help='Rows per chunk of the convert and stream stages (default: 1000000)')
+    parser.add_argument('--work_dir', default=None, help='Directory for the generated scans and outputs, which are kept and reused (default: a temporary directory, removed afterwards)')
+    parser.add_argument('--json', default=None, help='Write the results to this JSON file')
+    parser.add_argument('--compare', default=None, help='Result file of an earlier run to compare with; exits with status 1 on regressions')
+    parser.add_argument('--tolerance', type=float, default=TOLERANCE, help=f'Relative slow-down that counts as a regression with --compare (default: {TOLERANCE})')
+    return parser.parse_args()
+
+def analyzer_arguments(args, scan_file):
+    """
+    The analyzer's command-line arguments at their defaults, for its functions.
+    """
+    return argparse.Namespace(
+        file=scan_file, current_date=NOW, hot_threshold=30, cold_threshold=180, max_depth=None,
+        cache_dir=None, no_cache=True, streaming=True, size_accuracy=SIZE_RELATIVE_ACCURACY,
+        chunk_rows=args.chunk_rows, workers=1,
+    )
+
+def max_rss_mb():
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+class StageTimer:
+    """
+    Collect one result per timed stage and print it.
+    """
+    def __init__(self):
+        self.results = []
+
+    def run(self, rows, stage, function, *args):
+        start = time.perf_counter(), time.process_time()
+        value = function(*args)
+        self.add(rows, stage, time.perf_counter() - start[0], time.process_time() - start[1])
+        return value
+
+    def add(self, rows, stage, seconds, cpu_seconds):
+        result = {
+            'rows': rows,
+            'stage': stage,
+            'seconds': round(seconds, 3),
+            'cpu_seconds': round(cpu_seconds, 3),
+            'rows_per_second': round(rows / seconds, 1) if seconds > 0 else None,
+            'max_rss_mb': max_rss_mb(),
+        }
+        self.results.append(result)
+        print(f"{rows:>11} {stage:>28}: {seconds:8.2f}s (CPU {cpu_seconds:8.2f}s) {result['rows_per_second'] or 0:>14,.0f} rows/s  peak RSS {result['max_rss_mb']:,.0f} MB")
+
+def generated_scan(scan, path, rows):
+    """
+    Generate a scan file unless it exists already (from an earlier run with the same --work_dir).
+    """
+    if not os.path.exists(path):
+        start = time.perf_counter()
+        scan.write(path + '.tmp', rows)
+        os.replace(path + '.tmp', path)
+        print(f"Generated {rows} rows in {path} in {time.perf_counter() - start:.1f}s")
+    return path
+
+def scan_tree(root, output_file, processes):
+    """
+    Scan a tree with megacollector's scandir engine into a CSV scan.
+
+    Returns:
+        int: Files scanned.
+    """
+    fields = ['path', 'access_time', 'modify_time', 'change_time', 'size', 'file_type']
+    writer = megacollector.open_metadata_writer(output_file, 'csv', fields, 0)
+    files = 0
+    try:
+        for batch in megacollector.crawl_files([root], processes, False):
+            writer.write_batch(batch)
+            files += len(batch)
+    finally:
+        writer.close()
+    return files
+
+def run_scan_stage(timer, scan, args, work_dir):
+    root = os.path.join(work_dir, f'tree-{args.tree_files}-s{args.seed}')
+    if not os.path.exists(root):
+        start = time.perf_counter()
+        scan.build_tree(root + '.tmp', args.tree_files)
+        os.replace(root + '.tmp', root)
+        print(f"Created {args.tree_files} files below {root} in {time.perf_counter() - start:.1f}s")
+    files = timer.run(args.tree_files, 'scan', scan_tree, root, os.path.join(work_dir, 'tree-scan.csv'), args.workers)
+    if files != args.tree_files:
+        print(f"Warning: scanned {files} files of {args.tree_files}")
+
+def run_stages(timer, scan, rows, args, work_dir):
+    stages = set(args.stages)
+    scan_file = generated_scan(scan, os.path.join(work_dir, f'scan-{rows}-s{args.seed}-d{args.directories}.csv'), rows)
+    analyzer_args = analyzer_arguments(args, scan_file)
+
+    if 'convert' in stages:
+        timer.run(
+            rows, 'convert', parqConverter.convert, scan_file, os.path.join(work_dir, 'converted.parquet'),
+            pd.Timestamp(NOW), args.workers, args.chunk_rows, args.chunk_rows, 'snappy'
+        )
+
+    aggregates = None
+    if stages & {'load', 'clean', 'aggregate', 'analyze'} and rows <= args.memory_rows:
+        df = timer.run(rows, 'load', analyzer.load_data, scan_file)
+        df, max_depth = timer.run(rows, 'clean', analyzer.clean_and_engineer, df, NOW, None)
+        aggregates = timer.run(rows, 'aggregate', analyzer.build_report_aggregates, df, analyzer_args)
+        del df
+    elif stages & {'load', 'clean', 'aggregate'}:
+        print(f"Skipping the in-memory stages for {rows} rows (above --memory_rows {args.memory_rows})")
+
+    if 'stream' in stages or ('analyze' in stages and aggregates is None):
+        streamed, max_depth, _ = timer.run(rows, 'stream', analyzer.stream_report_aggregates, analyzer_args)
+        aggregates = aggregates or streamed
+
+    if 'analyze' in stages:
+        for section, (wall_time, cpu_time) in analyzer.analyze_data(aggregates, analyzer_args, max_depth).items():
+            timer.add(rows, section, wall_time, cpu_time)
+
+def main():
+    args = parse_arguments()
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix='storagescanner_bench_')
+    os.makedirs(work_dir, exist_ok=True)
+    scan = SyntheticScan(args.directories, seed=args.seed)
+    timer = StageTimer()
+    print(f"Generated scans in {work_dir}; the analyzer's report goes to {LOG_FILE}")
+    try:
+        if 'scan' in args.stages:
+            run_scan_stage(timer, scan, args, work_dir)
+        for rows in args.rows:
+            run_stages(timer, scan, rows, args, work_dir)
+    finally:
+        if args.work_dir is None:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    parameters = {name: getattr(args, name) for name in ('rows', 'stages', 'memory_rows', 'tree_files', 'directories', 'seed', 'workers', 'chunk_rows')}
+    document = result_document('pipeline', ['rows', 'stage'], parameters, timer.results)
+    if args.json:
+        write_results(args.json, document)
+    if args.compare and print_comparison(document, load_results(args.compare), args.tolerance):
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
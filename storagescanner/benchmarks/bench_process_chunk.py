@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Measure parqConverter.process_chunk() throughput on a generated scan of synthetic paths.
+
+The scan comes from synthfs (the share layout /mnt/Race2024/<season>/<event>/<department>/...
+over a fixed set of directories) and is generated chunk by chunk, outside the timings. The
+columnar process_chunk() is compared with the row-wise pandas implementation it replaced (split
+paths into per-row lists, expand them into DataFrames), which is run on the first
+--baseline_rows rows only since it is much slower.
+
+Example usage:
+    python3 benchmarks/bench_process_chunk.py --rows 10000000 --chunk_rows 1000000 --json /tmp/process_chunk.json
+    python3 benchmarks/bench_process_chunk.py --rows 10000000 --baseline_rows 0 --compare /tmp/process_chunk.json
+"""
+import os
+import sys
+import time
+import argparse
+import pandas as pd
+import pyarrow as pa
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import parqConverter
+from synthfs import SyntheticScan, NOW
+from benchresults import result_document, write_results, load_results, print_comparison, TOLERANCE
+
+DATE_PATTERN = r'^\d{4}-\d{2}$'
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description='Benchmark parqConverter.process_chunk() against the row-wise pandas implementation.')
+    parser.add_argument('--rows', type=int, default=10000000, help='Rows processed by the columnar implementation (default: 10000000)')
+    parser.add_argument('--baseline_rows', type=int, default=1000000, help='Rows processed by the row-wise baseline; 0 skips it (default: 1000000)')
+    parser.add_argument('--chunk_rows', type=int, default=1000000, help='Rows per chunk (default: 1000000)')
+    parser.add_argument('--directories', type=int, default=20000, help='Distinct directories in the generated paths (default: 20000)')
+    parser.add_argument('--seed', type=int, default=7, help='Random seed of the generated data (default: 7)')
+    parser.add_argument('--json', default=None, help='Write the results to this JSON file')
+    parser.add_argument('--compare', default=None, help='Result file of an earlier run to compare with; exits with status 1 on regressions')
+    parser.add_argument('--tolerance', type=float, default=TOLERANCE, help=f'Relative slow-down that counts as a regression with --compare (default: {TOLERANCE})')
+    return parser.parse_args()
+
+def row_wise_process_chunk(chunk, current_date, date_pattern, max_remaining_levels=3):
+    """
+    The pandas implementation process_chunk() replaced, kept as the baseline.
+    """
+    chunk['days_since_last_access'] = (current_date - chunk['access_time']).dt.days
+    chunk['days_since_last_modify'] = (current_date - chunk['modify_time']).dt.days
+    chunk['days_since_last_change'] = (current_date - chunk['change_time']).dt.days
+    if 'file_type' in chunk.columns:
+        chunk = chunk.drop(columns=['file_type'])
+    chunk['file_extension'] = chunk['path'].str.extract(r'(\.[^./\\]+)$', expand=False).str.lower()
+    chunk['filename_with_extension'] = chunk['path'].str.split(r'[/\\]').str[-1]
+    chunk['filename_without_extension'] = chunk['filename_with_extension'].str.replace(r'\.[^./\\]+$', '', regex=True)
+    path_components = chunk['path'].str.split(r'[/\\]+').apply(lambda x: [i for i in x if i])
+    path_df = pd.DataFrame(path_components.tolist())
+    path_df.columns = [f'level_{i}' for i in range(path_df.shape[1])]
+    for i in range(4):
+        if f'level_{i}' not in path_df.columns:
+            path_df[f'level_{i}'] = pd.NA
+    chunk['mount_point'] = path_df['level_0'].astype(pd.StringDtype())
+    chunk['season'] = path_df['level_1'].astype(pd.StringDtype())
+    chunk['event'] = path_df['level_2'].astype(pd.StringDtype())
+    chunk['department'] = path_df['level_3'].astype(pd.StringDtype())
+    matches = chunk['department'].str.match(date_pattern, na=False)
+    chunk['department'] = chunk['department'].where(~matches, 'chassis')
+    remaining_dirs_expanded = pd.DataFrame(path_components.str[4:-1].tolist(), index=chunk.index)
+    for i in range(max_remaining_levels):
+        column_name = f'remaining_level_{i+1}'
+        if i in remaining_dirs_expanded.columns:
+            chunk[column_name] = remaining_dirs_expanded[i].astype(pd.StringDtype())
+        else:
+            chunk[column_name] = pd.Series([pd.NA] * len(chunk), dtype=pd.StringDtype())
+    return pa.Table.from_pandas(chunk, preserve_index=False)
+
+def run(implementation, total_rows, args, scan):
+    """
+    Generate and process total_rows rows chunk by chunk; only processing is timed.
+    Returns (rows, seconds).
+    """
+    current_date = pd.Timestamp(NOW)
+    seconds = 0.0
+    for chunk in scan.tables(total_rows, args.chunk_rows):
+        begin = time.perf_counter()
+        if implementation == 'columnar':
+            parqConverter.process_chunk(chunk, current_date, DATE_PATTERN)
+        else:
+            row_wise_process_chunk(chunk.to_pandas(), current_date, DATE_PATTERN)
+        seconds += time.perf_counter() - begin
+    return total_rows, seconds
+
+def main():
+    args = parse_arguments()
+    scan = SyntheticScan(args.directories, seed=args.seed)
+    print(f"Generated {len(scan.directories)} directories; processing chunks of {args.chunk_rows} rows")
+
+    results = []
+    for implementation, rows in (('columnar', args.rows), ('row-wise', args.baseline_rows)):
+        if rows <= 0:
+            continue
+        rows, seconds = run(implementation, rows, args, scan)
+        results.append({
+            'implementation': implementation,
+            'rows': rows,
+            'seconds': round(seconds, 3),
+            'rows_per_second': round(rows / seconds, 1) if seconds > 0 else None,
+        })
+        print(f"{implementation:>9}: {rows} rows in {seconds:.2f}s ({rows / seconds:,.0f} rows/s)")
+    if len(results) == 2:
+        print(f"Speed-up: {results[0]['rows_per_second'] / results[1]['rows_per_second']:.1f}x")
+
+    parameters = {name: getattr(args, name) for name in ('rows', 'baseline_rows', 'chunk_rows', 'directories', 'seed')}
+    document = result_document('process_chunk', ['implementation', 'rows'], parameters, results)
+    if args.json:
+        write_results(args.json, document)
+    if args.compare and print_comparison(document, load_results(args.compare), args.tolerance):
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
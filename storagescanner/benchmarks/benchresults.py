@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+Result files of the benchmarks and regression comparison between two runs.
+
+Every benchmark writes the same JSON layout with --json:
+
+    {"benchmark": "pipeline", "created": "2024-11-07T12:00:00", "environment": {...},
+     "parameters": {...}, "keys": ["rows", "stage"],
+     "results": [{"rows": 1000000, "stage": "convert", "seconds": 1.234, ...}, ...]}
+
+Results of two files are matched on their "keys" values and compared on their wall-clock
+seconds. A result is a regression when it is more than --tolerance slower than the baseline
+and the difference is more than MIN_DIFFERENCE_SECONDS, so that stages taking milliseconds
+do not flag noise. Comparing runs from different hosts or library versions is allowed, but
+the differences are printed first.
+
+Example usage:
+    python3 benchmarks/bench_pipeline.py --rows 1000000 --json /tmp/base.json
+    python3 benchmarks/bench_pipeline.py --rows 1000000 --json /tmp/new.json --compare /tmp/base.json
+    python3 benchmarks/benchresults.py /tmp/new.json /tmp/base.json --tolerance 0.1
+"""
+import os
+import sys
+import json
+import platform
+import argparse
+from datetime import datetime
+
+# Relative slow-down that counts as a regression
+TOLERANCE = 0.2
+# Smaller differences are never regressions
+MIN_DIFFERENCE_SECONDS = 0.05
+
+def environment():
+    """
+    Host, CPU count and library versions, which the timings depend on.
+    """
+    versions = {'python': platform.python_version()}
+    for module in ('numpy', 'pandas', 'pyarrow'):
+        try:
+            versions[module] = __import__(module).__version__
+        except ImportError:
+            versions[module] = None
+    return {'host': platform.node(), 'platform': platform.platform(), 'cpu_count': os.cpu_count(), 'versions': versions}
+
+def result_document(benchmark, keys, parameters, results):
+    """
+    The result file contents of a run; keys are the fields identifying a result within the benchmark.
+    """
+    return {
+        'benchmark': benchmark,
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'environment': environment(),
+        'parameters': parameters,
+        'keys': keys,
+        'results': results,
+    }
+
+def write_results(path, document):
+    with open(path, 'w') as fh:
+        json.dump(document, fh, indent=2)
+
+def load_results(path):
+    with open(path) as fh:
+        document = json.load(fh)
+    if 'keys' not in document:
+        raise ValueError(f"{path} is not a benchmark result file (no 'keys')")
+    return document
+
+def compare_results(current, baseline, tolerance=TOLERANCE):
+    """
+    Match the results of two result documents of the same benchmark and classify each.
+
+    Returns:
+        list: One dict per result of either document with 'key' (tuple of the key values),
+            'baseline' and 'current' seconds (None when missing), 'ratio' and 'status', one of
+            'regression', 'improvement', 'same', 'new' and 'missing'.
+    """
+    if current['benchmark'] != baseline['benchmark']:
+        raise ValueError(f"Cannot compare {current['benchmark']} results with {baseline['benchmark']} results")
+    keys = current['keys']
+
+    def by_key(document):
+        return {tuple(result.get(key) for key in keys): result for result in document['results']}
+
+    current_results = by_key(current)
+    baseline_results = by_key(baseline)
+    comparison = []
+    for key in list(baseline_results) + [key for key in current_results if key not in baseline_results]:
+        old = baseline_results.get(key, {}).get('seconds')
+        new = current_results.get(key, {}).get('seconds')
+        ratio = None
+        if old is None or new is None:
+            status = 'new' if old is None else 'missing'
+        else:
+            ratio = new / old if old > 0 else None
+            if abs(new - old) <= MIN_DIFFERENCE_SECONDS or (ratio is not None and abs(ratio - 1) <= tolerance):
+                status = 'same'
+            else:
+                status = 'regression' if new > old else 'improvement'
+        comparison.append({'key': key, 'baseline': old, 'current': new, 'ratio': ratio, 'status': status})
+    return comparison
+
+def environment_differences(current, baseline):
+    differences = []
+    for name in ('host', 'cpu_count'):
+        if current['environment'].get(name) != baseline['environment'].get(name):
+            differences.append(f"{name}: {baseline['environment'].get(name)} -> {current['environment'].get(name)}")
+    for module, version in current['environment'].get('versions', {}).items():
+        old_version = baseline['environment'].get('versions', {}).get(module)
+        if old_version != version:
+            differences.append(f"{module}: {old_version} -> {version}")
+    for name, value in current.get('parameters', {}).items():
+        if baseline.get('parameters', {}).get(name) != value:
+            differences.append(f"--{name}: {baseline.get('parameters', {}).get(name)} -> {value}")
+    return differences
+
+def print_comparison(current, baseline, tolerance=TOLERANCE):
+    """
+    Print the comparison of two result documents.
+
+    Returns:
+        int: Number of regressions.
+    """
+    differences = environment_differences(current, baseline)
+    if differences:
+        print(f"Note: the runs differ in {', '.join(differences)}")
+    comparison = compare_results(current, baseline, tolerance)
+    width = max([len(' / '.join(map(str, item['key']))) for item in comparison] + [10])
+    print(f"{' / '.join(current['keys']):<{width}}  {'baseline':>10}  {'current':>10}  {'ratio':>6}  status")
+
+    def seconds(value):
+        return f"{value:.3f}s" if value is not None else '-'
+
+    for item in comparison:
+        ratio = f"{item['ratio']:.2f}" if item['ratio'] is not None else '-'
+        print(f"{' / '.join(map(str, item['key'])):<{width}}  {seconds(item['baseline']):>10}  {seconds(item['current']):>10}  {ratio:>6}  {item['status']}")
+    regressions = sum(item['status'] == 'regression' for item in comparison)
+    print(f"{regressions} regression(s) beyond {tolerance:.0%}" if regressions else f"No regressions beyond {tolerance:.0%}")
+    return regressions
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description='Compare two benchmark result files; exits with status 1 on regressions.')
+    parser.add_argument('current', help='Result file of the run to check')
+    parser.add_argument('baseline', help='Result file of the run to compare against')
+    parser.add_argument('--tolerance', type=float, default=TOLERANCE, help=f'Relative slow-down that counts as a regression (default: {TOLERANCE})')
+    return parser.parse_args()
+
+def main():
+    args = parse_arguments()
+    try:
+        regressions = print_comparison(load_results(args.current), load_results(args.baseline), args.tolerance)
+    except (OSError, ValueError) as e:
+        sys.exit(f"Error: {e}")
+    sys.exit(1 if regressions else 0)
+
+if __name__ == '__main__':
+    main()
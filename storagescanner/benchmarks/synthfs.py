@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+"""
+Deterministic synthetic filesystem metadata for the benchmarks.
+
+Scans look like megacollector's output for the share layout
+/mnt/Race2024/<season>/<event>/<department>/<subdirectories>/<file>: a fixed set of
+directories with 0 to --depth subdirectories below the department, each named one of
+--fanout names per level; files spread over the directories with a Zipf distribution
+(a few directories hold most files); log-normal sizes (mostly small files, a few huge
+ones); exponential access ages with modification before access. Department names
+include YYYY-MM dates, which parqConverter reports as 'chassis'.
+
+Rows are generated in blocks of BLOCK_ROWS, each from its own random generator seeded
+with (seed, block), so a scan's first N rows are the same whatever its total size and
+chunking: the 1M-row scan is a prefix of the 10M-row one. Generation uses numpy and Arrow
+kernels only, so it stays out of the way of the timings.
+
+The rows can be written as a CSV or Parquet scan (megacollector --format csv/parquet), or
+created as an on-disk tree of sparse files with those sizes and times for scanning.
+
+Example usage:
+    python3 benchmarks/synthfs.py /tmp/scan-10m.parquet --rows 10000000
+    python3 benchmarks/synthfs.py /tmp/scan-1m.csv --rows 1000000 --directories 50000 --depth 6 --fanout 8
+    python3 benchmarks/synthfs.py --tree /tmp/share --rows 20000
+"""
+import os
+import sys
+import time
+import argparse
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+from pyarrow import csv
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from pathcodec import encode_table
+
+MOUNT_POINT = '/mnt/Race2024'
+SEASONS = ['2023', '2024']
+EVENTS = [f'E{i:02d}' for i in range(24)]
+DEPARTMENTS = ['Video', 'Audio', 'Graphics', 'Engineering', 'Admin', '2024-03', '2024-09']
+EXTENSIONS = ['mxf', 'mov', 'MOV', 'jpg', 'png', 'txt', 'wav', 'r3d', 'braw', 'dng', 'xml', 'json', 'mp4', 'exr', 'dpx', 'pdf']
+
+# Rows per independently seeded block (always generated in full)
+BLOCK_ROWS = 1 << 16
+# Ages are relative to this date (analyzer.py's default --current_date)
+NOW = '2024-11-07'
+NS_PER_SECOND = 10**9
+NS_PER_DAY = 86400 * NS_PER_SECOND
+
+# Zipf exponent of the files per directory: lower is more skewed
+FILES_SKEW = 1.3
+# Parameters of the log-normal file size in bytes (median e^12, about 160 KB)
+SIZE_LOG_MEAN = 12.0
+SIZE_LOG_SIGMA = 3.0
+# Mean days since last access, and mean days between modification and that access
+MEAN_ACCESS_DAYS = 200.0
+MEAN_MODIFY_GAP_DAYS = 300.0
+
+SCAN_SCHEMA = pa.schema([
+    ('path', pa.string()),
+    ('access_time', pa.timestamp('ns')),
+    ('modify_time', pa.timestamp('ns')),
+    ('change_time', pa.timestamp('ns')),
+    ('size', pa.int64()),
+    ('file_type', pa.string()),
+])
+
+class SyntheticScan:
+    """
+    A generated directory layout and the distributions of the files in it.
+    """
+    def __init__(self, directories=20000, depth=4, fanout=16, seed=7, now=NOW, skew=FILES_SKEW,
+                 size_log_mean=SIZE_LOG_MEAN, size_log_sigma=SIZE_LOG_SIGMA, mean_access_days=MEAN_ACCESS_DAYS,
+                 mount_point=MOUNT_POINT, seasons=SEASONS, events=EVENTS, departments=DEPARTMENTS):
+        self.seed = seed
+        self.now = pd.Timestamp(now).value
+        self.skew = skew
+        self.size_log_mean = size_log_mean
+        self.size_log_sigma = size_log_sigma
+        self.mean_access_days = mean_access_days
+        self.mount_point = mount_point
+        self.directories = self.generate_directories(directories, depth, fanout, [seasons, events, departments])
+
+    def generate_directories(self, count, depth, fanout, levels):
+        """
+        count distinct directories below the mount point, in random order (which directories get
+        the most files does not depend on their names).
+
+        Returns:
+            pa.Array: Directory paths.
+        """
+        tops = int(np.prod([len(level) for level in levels]))
+        capacity = tops * sum(fanout ** k for k in range(depth + 1))
+        if count > capacity // 2:
+            raise ValueError(f"Cannot generate {count} distinct directories with depth {depth} and fanout {fanout} "
+                             f"(at most {capacity} exist); raise --depth or --fanout")
+        rng = np.random.default_rng([self.seed, 0])
+        directories = {}
+        while len(directories) < count:
+            parts = [self.mount_point] + [level[rng.integers(len(level))] for level in levels]
+            parts += [f'sub{rng.integers(fanout)}' for _ in range(rng.integers(0, depth + 1))]
+            directories.setdefault('/'.join(parts), None)
+        return pa.array(list(directories), pa.string())
+
+    def block(self, index):
+        """
+        Rows index * BLOCK_ROWS up to the next block, with megacollector's scan columns.
+        """
+        rng = np.random.default_rng([self.seed, 1, index])
+        start = index * BLOCK_ROWS
+        rows = BLOCK_ROWS
+        dir_index = (rng.zipf(self.skew, rows) - 1) % len(self.directories)
+        numbers = pc.cast(pa.array(np.arange(start, start + rows)), pa.string())
+        extensions = pa.array(np.array(EXTENSIONS)[rng.integers(0, len(EXTENSIONS), rows)])
+        names = pc.binary_join_element_wise('f', numbers, '.', extensions, '')
+        paths = pc.binary_join_element_wise(self.directories.take(pa.array(dir_index)), names, '/')
+        # Whole seconds, like the CSV output has
+        access = self.now - (rng.exponential(self.mean_access_days, rows) * NS_PER_DAY).astype(np.int64)
+        modify = access - (rng.exponential(MEAN_MODIFY_GAP_DAYS, rows) * NS_PER_DAY).astype(np.int64)
+        access -= access % NS_PER_SECOND
+        modify -= modify % NS_PER_SECOND
+        return pa.table([
+            paths,
+            pa.array(access, pa.timestamp('ns')),
+            pa.array(modify, pa.timestamp('ns')),
+            pa.array(modify, pa.timestamp('ns')),
+            pa.array(rng.lognormal(self.size_log_mean, self.size_log_sigma, rows).astype(np.int64)),
+            pa.repeat(pa.scalar('file'), rows),
+        ], schema=SCAN_SCHEMA)
+
+    def tables(self, rows, chunk_rows=BLOCK_ROWS):
+        """
+        Yield the first rows rows as tables of chunk_rows rows (the last one may be shorter).
+        """
+        pending = []
+        pending_rows = 0
+        for index in range(-(-rows // BLOCK_ROWS)):
+            table = self.block(index).slice(0, rows - index * BLOCK_ROWS)
+            pending.append(table)
+            pending_rows += table.num_rows
+            if pending_rows >= chunk_rows:
+                table = pa.concat_tables(pending)
+                while table.num_rows >= chunk_rows:
+                    yield table.slice(0, chunk_rows)
+                    table = table.slice(chunk_rows)
+                pending = [table] if table.num_rows else []
+                pending_rows = table.num_rows
+        if pending_rows:
+            yield pa.concat_tables(pending)
+
+    def write(self, path, rows, row_group_size=1000000):
+        """
+        Write the first rows rows as a scan: CSV like megacollector's default output, or for a
+        .parquet path like megacollector --format parquet (paths as pathcodec columns).
+
+        Returns:
+            int: Rows written.
+        """
+        written = 0
+        if path.endswith('.parquet'):
+            with pq.ParquetWriter(path, encode_table(self.block(0).slice(0, 0)).schema) as writer:
+                for table in self.tables(rows, row_group_size):
+                    writer.write_table(encode_table(table), row_group_size=row_group_size)
+                    written += table.num_rows
+            return written
+        # Times as 'YYYY-MM-DD HH:MM:SS'
+        schema = pa.schema([field.with_type(pa.timestamp('s')) if pa.types.is_timestamp(field.type) else field for field in SCAN_SCHEMA])
+        with csv.CSVWriter(path, schema) as writer:
+            for table in self.tables(rows):
+                writer.write_table(table.cast(schema))
+                written += table.num_rows
+        return written
+
+    def build_tree(self, root, rows, max_file_size=1 << 30):
+        """
+        Create the first rows files under root (in place of the mount point) as sparse files with
+        their generated sizes (up to max_file_size) and access/modification times.
+
+        Returns:
+            int: Files created.
+        """
+        created = set()
+        files = 0
+        for table in self.tables(rows):
+            columns = table.select(['path', 'access_time', 'modify_time', 'size']).to_pydict()
+            access = pc.cast(table.column('access_time'), pa.int64()).to_pylist()
+            modify = pc.cast(table.column('modify_time'), pa.int64()).to_pylist()
+            for path, access_ns, modify_ns, size in zip(columns['path'], access, modify, columns['size']):
+                file_path = root + path[len(self.mount_point):]
+                directory = os.path.dirname(file_path)
+                if directory not in created:
+                    os.makedirs(directory, exist_ok=True)
+                    created.add(directory)
+                with open(file_path, 'wb') as fh:
+                    fh.truncate(min(size, max_file_size))
+                os.utime(file_path, ns=(access_ns, modify_ns))
+                files += 1
+        return files
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description='Generate a deterministic synthetic scan (CSV or Parquet) or on-disk tree in the Race2024 share layout.')
+    parser.add_argument('output', nargs='?', default=None, help='Scan to write (.csv, or .parquet like megacollector --format parquet)')
+    parser.add_argument('--tree', default=None, help='Also create the files as a tree of sparse files below this directory')
+    parser.add_argument('--rows', type=int, default=1000000, help='Files to generate (default: 1000000)')
+    parser.add_argument('--directories', type=int, default=20000, help='Distinct directories (default: 20000)')
+    parser.add_argument('--depth', type=int, default=4, help='Maximum subdirectory levels below the department (default: 4)')
+    parser.add_argument('--fanout', type=int, default=16, help='Subdirectory names per level (default: 16)')
+    parser.add_argument('--skew', type=float, default=FILES_SKEW, help=f'Zipf exponent of the files per directory, > 1; lower is more skewed (default: {FILES_SKEW})')
+    parser.add_argument('--size_log_sigma', type=float, default=SIZE_LOG_SIGMA, help=f'Sigma of the log-normal file size; higher is more skewed (default: {SIZE_LOG_SIGMA})')
+    parser.add_argument('--seed', type=int, default=7, help='Random seed (default: 7)')
+    parser.add_argument('--row_group_size', type=int, default=1000000, help='Rows per Parquet row group (default: 1000000)')
+    parser.add_argument('--max_file_size', type=int, default=1 << 30, help='Largest sparse file created with --tree (default: 1 GiB)')
+    args = parser.parse_args()
+    if args.output is None and args.tree is None:
+        parser.error('give an output file, --tree or both')
+    return args
+
+def main():
+    args = parse_arguments()
+    scan = SyntheticScan(args.directories, args.depth, args.fanout, args.seed, skew=args.skew, size_log_sigma=args.size_log_sigma)
+    if args.output:
+        start = time.perf_counter()
+        rows = scan.write(args.output, args.rows, args.row_group_size)
+        print(f"Wrote {rows} rows in {len(scan.directories)} directories to {args.output} in {time.perf_counter() - start:.1f}s")
+    if args.tree:
+        start = time.perf_counter()
+        files = scan.build_tree(args.tree, args.rows, args.max_file_size)
+        print(f"Created {files} files below {args.tree} in {time.perf_counter() - start:.1f}s")
+
+if __name__ == '__main__':
+    main()
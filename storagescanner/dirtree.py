@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+"""
+Directory tree index for analyzer.py.
+
+The tree holds every directory of a dataset (and all its ancestors) as a node
+with a parent pointer, plus a per-directory matrix of file counts and sizes by
+class (all files and the analyzer's especially hot/cold subsets) and by
+access-age bucket. The matrices are filled in one pass over the files (or
+merged from per-chunk AgeHistograms) and rolled up bottom-up, after which any "top folders at depth k" question is
+answered from the nodes alone, in time proportional to the number of
+directories instead of the number of files.
+"""
+import numpy as np
+import pandas as pd
+from aggregates import AgeHistogram
+
+class DirectoryTree:
+    """
+    Parent-pointer tree of directories with per-directory (class x age bucket) histograms.
+
+    Age bucket i holds files with edges[i-1] < days_since_access <= edges[i]; the first bucket
+    is everything up to edges[0] and the last everything above edges[-1]. A query's day bounds
+    must be bucket edges.
+
+    Node depth counts path components like the analyzer's dir_depth_N columns: '/mnt/share' is
+    split into ['', 'mnt', 'share'] and has depth 3.
+    """
+    def __init__(self, paths, parent, depth, own_size, own_count, classes, edges):
+        self.paths = paths
+        self.parent = parent
+        self.depth = depth
+        self.own_size = own_size
+        self.own_count = own_count
+        self.classes = classes
+        self.edges = edges
+        self.size, self.count = self.roll_up(own_size, own_count)
+
+    @classmethod
+    def from_frame(cls, df, edges, classes=None):
+        """
+        Build the tree from a frame produced by clean_and_engineer(), whose 'directory'
+        column is a Categorical over the unique directories.
+
+        Args:
+            df (pd.DataFrame): Files with 'directory', 'days_since_access' and 'size'.
+            edges (list): Access-age bucket edges in days.
+            classes (dict): Optional name -> boolean mask of extra file classes besides 'all'.
+
+        Returns:
+            DirectoryTree: The tree with own and rolled-up histograms.
+        """
+        return cls.from_histograms(cls.directory_histograms(df, edges, classes))
+
+    @staticmethod
+    def directory_histograms(df, edges, classes=None):
+        """
+        Per-directory access-age histograms of every class, the mergeable input of from_histograms().
+
+        Returns:
+            dict: Class name ('all' first) -> AgeHistogram grouped by directory path.
+        """
+        directories = df['directory'].cat.categories
+        dir_codes = df['directory'].cat.codes.to_numpy()
+        days = df['days_since_access'].to_numpy()
+        sizes = df['size'].to_numpy()
+        histograms = {'all': AgeHistogram.from_codes(days, sizes, edges, dir_codes, directories)}
+        for name, mask in (classes or {}).items():
+            codes = np.where(np.asarray(mask, dtype=bool), dir_codes, -1)
+            histograms[name] = AgeHistogram.from_codes(days, sizes, edges, codes, directories)
+        return histograms
+
+    @classmethod
+    def from_histograms(cls, histograms):
+        """
+        Build the tree from per-directory histograms, e.g. merged from several chunks.
+
+        Args:
+            histograms (dict): Class name ('all' first) -> AgeHistogram grouped by directory
+                path, all with the same edges.
+
+        Returns:
+            DirectoryTree: The tree with own and rolled-up histograms.
+        """
+        directories = histograms['all'].groups
+
+        # Nodes: the directories plus all of their ancestors
+        node_ids = {}
+        paths = []
+        parent = []
+        depth = []
+        dir_nodes = np.empty(len(directories), dtype=np.int64)
+        for index, directory in enumerate(directories):
+            parts = directory.split('/')
+            node = -1
+            for k in range(1, len(parts) + 1):
+                prefix = '/'.join(parts[:k])
+                child = node_ids.get(prefix)
+                if child is None:
+                    child = node_ids[prefix] = len(paths)
+                    paths.append(prefix)
+                    parent.append(node)
+                    depth.append(k)
+                node = child
+            dir_nodes[index] = node
+
+        class_names = list(histograms)
+        edges = histograms['all'].edges.tolist()
+        shape = (len(paths), len(class_names), len(edges) + 1)
+        own_size = np.zeros(shape)
+        own_count = np.zeros(shape, dtype=np.int64)
+        for class_index, histogram in enumerate(histograms.values()):
+            rows = histogram.groups.get_indexer(directories)
+            found = rows >= 0
+            own_size[dir_nodes[found], class_index] = histogram.size[rows[found]]
+            own_count[dir_nodes[found], class_index] = histogram.count[rows[found]]
+
+        return cls(
+            pd.Index(paths), np.array(parent, dtype=np.int64), np.array(depth, dtype=np.int64),
+            own_size, own_count, class_names, edges
+        )
+
+    def roll_up(self, own_size, own_count):
+        """
+        Add every node's totals into its parent, deepest level first.
+        """
+        size = own_size.copy()
+        count = own_count.copy()
+        for level in range(int(self.depth.max(initial=0)), 1, -1):
+            nodes = np.flatnonzero(self.depth == level)
+            np.add.at(size, self.parent[nodes], size[nodes])
+            np.add.at(count, self.parent[nodes], count[nodes])
+        return size, count
+
+    def bucket_slice(self, min_days=None, max_days=None):
+        """
+        Buckets of files with min_days < days_since_access <= max_days.
+        """
+        start = 0 if min_days is None else self.edges.index(min_days) + 1
+        stop = len(self.edges) + 1 if max_days is None else self.edges.index(max_days) + 1
+        return slice(start, stop)
+
+    def select(self, size, count, file_class='all', min_days=None, max_days=None):
+        buckets = self.bucket_slice(min_days, max_days)
+        class_index = self.classes.index(file_class)
+        return size[:, class_index, buckets].sum(axis=1), count[:, class_index, buckets].sum(axis=1)
+
+    def depth_view(self, depth):
+        """
+        Node ids and (size, count) matrices as grouping by dir_depth_<depth> sees them: directories
+        at that depth with everything below them, and shallower directories with their own files.
+        """
+        at_depth = self.depth == depth
+        shallower = self.depth < depth
+        nodes = np.flatnonzero(at_depth | shallower)
+        rolled = at_depth[nodes]
+        size = np.where(rolled[:, None, None], self.size[nodes], self.own_size[nodes])
+        count = np.where(rolled[:, None, None], self.count[nodes], self.own_count[nodes])
+        return nodes, size, count
+
+    def total(self, file_class='all', min_days=None, max_days=None):
+        """
+        (size, count) of all selected files in the tree.
+        """
+        size, count = self.select(self.own_size, self.own_count, file_class, min_days, max_days)
+        return size.sum(), count.sum()
+
+    def sizes_at_depth(self, depth, file_class='all', min_days=None, max_days=None):
+        """
+        Total size per dir_depth_<depth> value for the selected files.
+
+        Args:
+            depth (int): Directory depth.
+            file_class (str): 'all' or one of the extra classes the tree was built with.
+            min_days (int or None): Only files with days_since_access > min_days.
+            max_days (int or None): Only files with days_since_access <= max_days.
+
+        Returns:
+            pd.Series: Size per directory path, for directories holding at least one selected file.
+        """
+        nodes, size, count = self.depth_view(depth)
+        size, count = self.select(size, count, file_class, min_days, max_days)
+        present = count > 0
+        return pd.Series(size[present], index=self.paths[nodes[present]])
+
+    def age_distribution_at_depth(self, depth, bins, labels, file_class='all'):
+        """
+        Size per access-age group (bins as for pd.cut, right-closed) for every dir_depth_<depth> value.
+
+        Returns:
+            pd.DataFrame: One row per directory path and one column per label.
+        """
+        nodes, size, count = self.depth_view(depth)
+        columns = {}
+        for label, low, high in zip(labels, bins[:-1], bins[1:]):
+            columns[label] = self.select(size, count, file_class, low, None if np.isinf(high) else high)[0]
+        return pd.DataFrame(columns, index=self.paths[nodes])
+
+    def sizes_by_leaf(self, file_class='all', min_days=None, max_days=None, levels=1):
+        """
+        Total size per name of the last levels components of the files' own directory,
+        i.e. grouping by leaf_dir (levels=1) or last_two_leaf_dirs (levels=2).
+
+        Returns:
+            pd.Series: Size per leaf name, for names holding at least one selected file.
+        """
+        size, count = self.select(self.own_size, self.own_count, file_class, min_days, max_days)
+        present = np.flatnonzero(count > 0)
+        names = ['/'.join(path.split('/')[-levels:]) for path in self.paths[present]]
+        return pd.Series(size[present]).groupby(names, sort=False).sum()
@@ -4,15 +4,34 @@ import csv
 import argparse
 import multiprocessing
 from multiprocessing import Pool, cpu_count
-from functools import partial
 from tqdm import tqdm
 import psutil
 import sys
 import time
+import threading
+import queue
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 import logging
 import functools
+import zlib
 from datetime import datetime, timezone
 import errno  # Imported to handle specific error codes
+import traceback
+from collections import namedtuple, Counter
+from itertools import islice
+from scancheckpoint import ScanCheckpoint, CheckpointReader
+from statbatch import StatBatch
+from scanmetrics import ScanMetrics, serve_metrics
+
+# pyarrow is only needed for --format parquet
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.parquet as pq
+    from pathcodec import PATH_SCHEMA, split_paths
+except ImportError:
+    pa = None
 
 # Configure Logging
 logging.basicConfig(
@@ -22,6 +41,18 @@ logging.basicConfig(
     level=logging.INFO
 )
 
+def parse_shard(value):
+    """
+    argparse type for --shard: 'i/N' with 0 <= i < N.
+    """
+    try:
+        index, count = (int(part) for part in value.split('/'))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid shard '{value}', expected i/N (e.g. 0/8)")
+    if count < 1 or not 0 <= index < count:
+        raise argparse.ArgumentTypeError(f"invalid shard '{value}', i must be between 0 and N-1")
+    return index, count
+
 def parse_arguments():
     parser = argparse.ArgumentParser(
         description='Parallel File Metadata Collector for CIFS-mounted Shares',
@@ -33,12 +64,24 @@ def parse_arguments():
     )
     parser.add_argument(
         'output_csv',
-        help='Path to the output CSV file (e.g., /tmp/metadata.csv)'
+        help='Path to the output file (e.g., /tmp/metadata.csv or /tmp/metadata.parquet)'
+    )
+    parser.add_argument(
+        '--format',
+        choices=['csv', 'parquet'],
+        default='csv',
+        help='Output format for the metadata file (default: csv)'
+    )
+    parser.add_argument(
+        '--row_group_size',
+        type=int,
+        default=1000000,
+        help='Rows per Parquet row group when --format parquet is used (default: 1000000)'
     )
     parser.add_argument(
         '--inaccessible_csv',
         default='inaccessible_directories.csv',
-        help='Path to the CSV file for inaccessible directories (default: inaccessible_directories.csv)'
+        help='Path to the CSV file for inaccessible directories and files that failed to stat (default: inaccessible_directories.csv)'
     )
     parser.add_argument(
         '--processes',
@@ -52,12 +95,80 @@ def parse_arguments():
         default=1000,
         help='Number of files per batch (default: 1000)'
     )
+    parser.add_argument(
+        '--chunk_size',
+        type=int,
+        default=None,
+        help='Fixed number of paths per pool task (default: adaptive, sized from measured stat latency)'
+    )
+    parser.add_argument(
+        '--target_task_seconds',
+        type=float,
+        default=0.25,
+        help='Adaptive chunking aims for pool tasks of roughly this duration (default: 0.25)'
+    )
+    parser.add_argument(
+        '--max_in_flight',
+        type=int,
+        default=None,
+        help='Maximum number of pool tasks outstanding at once (default: 4 x processes)'
+    )
     parser.add_argument(
         '--fields',
         nargs='+',
         default=['path', 'access_time', 'modify_time', 'change_time', 'size', 'file_type'],
         help='List of metadata fields to collect'
     )
+    parser.add_argument(
+        '--engine',
+        choices=['pool', 'scandir', 'async'],
+        default='pool',
+        help='Scan engine: "pool" walks the tree in the parent and stats files in a process pool, '
+             '"scandir" lets the workers crawl directories from a shared work queue, '
+             '"async" runs many concurrent scandir/stat calls on a thread pool in one process '
+             'for high-latency network mounts (default: pool)'
+    )
+    parser.add_argument(
+        '--concurrency',
+        type=int,
+        default=256,
+        help='Async engine: maximum number of concurrent scandir/stat operations (default: 256)'
+    )
+    parser.add_argument(
+        '--subtree_concurrency',
+        type=int,
+        default=64,
+        help='Async engine: maximum concurrent operations within one top-level subtree of the mount (default: 64)'
+    )
+    parser.add_argument(
+        '--shard',
+        type=parse_shard,
+        default=None,
+        help='Scan only partition i of N (e.g. 0/8). Directories at --shard_depth are assigned to shards by a stable '
+             'hash of their path; files above that depth belong to shard 0. Combine the outputs with scanmerge.py'
+    )
+    parser.add_argument(
+        '--shard_depth',
+        type=int,
+        default=1,
+        help='Depth below the mount point at which directories are partitioned across shards (default: 1)'
+    )
+    parser.add_argument(
+        '--checkpoint',
+        help='SQLite checkpoint file recording every completed directory (scandir engine only); '
+             'the output is written from it as a merged snapshot when the scan finishes'
+    )
+    parser.add_argument(
+        '--resume',
+        action='store_true',
+        help='Continue the interrupted scan recorded in --checkpoint, skipping completed directories'
+    )
+    parser.add_argument(
+        '--incremental',
+        action='store_true',
+        help='Re-list only directories whose mtime changed since the last scan in --checkpoint and '
+             'reuse the stored results for the rest (file changes that do not touch the directory mtime are not seen)'
+    )
     parser.add_argument(
         '--log_errors',
         action='store_true',
@@ -68,10 +179,33 @@ def parse_arguments():
         action='store_true',
         help='Enable system resource monitoring'
     )
-    return parser.parse_args()
+    parser.add_argument(
+        '--metrics_port',
+        type=int,
+        default=None,
+        help='Serve scan metrics in the Prometheus text format on this port at /metrics (default: off)'
+    )
+    parser.add_argument(
+        '--metrics_address',
+        default='',
+        help='Address the metrics endpoint binds to (default: all interfaces)'
+    )
+    parser.add_argument(
+        '--report',
+        default=None,
+        help='Write a JSON run report (throughput, stat latency, worker utilization, errors) to this file'
+    )
+    args = parser.parse_args()
+    if (args.resume or args.incremental) and not args.checkpoint:
+        parser.error('--resume and --incremental require --checkpoint')
+    if args.resume and args.incremental:
+        parser.error('--resume and --incremental are mutually exclusive')
+    if args.checkpoint and args.engine != 'scandir':
+        parser.error('--checkpoint requires --engine scandir')
+    return args
 
-def retry(ExceptionToCheck, tries=3, delay=2, backoff=2):
-    """Retry decorator with exponential backoff."""
+def retry(ExceptionToCheck, tries=3, delay=2, backoff=2, errnos=None):
+    """Retry decorator with exponential backoff. If errnos is given, only errors with one of those errno values are retried."""
     def deco_retry(f):
         @functools.wraps(f)
         def f_retry(*args, **kwargs):
@@ -80,6 +214,8 @@ def retry(ExceptionToCheck, tries=3, delay=2, backoff=2):
                 try:
                     return f(*args, **kwargs)
                 except ExceptionToCheck as e:
+                    if errnos is not None and getattr(e, 'errno', None) not in errnos:
+                        raise
                     logging.warning(f"{f.__name__} failed with {e}, retrying in {mdelay} seconds...")
                     time.sleep(mdelay)
                     mtries -= 1
@@ -88,89 +224,789 @@ def retry(ExceptionToCheck, tries=3, delay=2, backoff=2):
         return f_retry
     return deco_retry
 
-@retry(Exception, tries=3, delay=2, backoff=2)
-def get_file_metadata(file_path, log_errors):
+# errno values that are worth retrying on SMB/CIFS mounts (server busy, reconnects, stale handles).
+# Anything else (ENOENT, EACCES, ...) is reported straight away.
+TRANSIENT_ERRNOS = frozenset(
+    getattr(errno, name) for name in ('EAGAIN', 'EINTR', 'EIO', 'ESTALE', 'ETIMEDOUT', 'EBUSY') if hasattr(errno, name)
+)
+
+@retry(OSError, tries=3, delay=0.5, backoff=2, errnos=TRANSIENT_ERRNOS)
+def stat_file(file_path):
+    """
+    lstat a single file, retrying only transient errors.
+    """
+    return os.stat(file_path, follow_symlinks=False)
+
+def worker_name():
+    """
+    Name of the process or, inside a thread pool, the thread doing the work (for per-worker metrics).
+    """
+    thread = threading.current_thread()
+    if thread is threading.main_thread():
+        return multiprocessing.current_process().name
+    return thread.name
+
+def stat_paths(paths, log_errors):
+    """
+    Batch stat API: stat a list of file paths and return a StatBatch of column arrays
+    (raw epoch nanosecond times, sizes, inode numbers and an errno per file).
+    """
+    batch = StatBatch()
+    started = time.perf_counter()
+    for file_path in paths:
+        start = time.perf_counter()
+        try:
+            stat_info = stat_file(file_path)
+            batch.observe_latency(time.perf_counter() - start)
+            batch.append_stat(file_path, stat_info)
+        except OSError as e:
+            batch.observe_latency(time.perf_counter() - start)
+            if log_errors:
+                logging.error(f"Error accessing {file_path}: {e}")
+            batch.append_error(file_path, e)
+    batch.add_busy(worker_name(), time.perf_counter() - started)
+    return batch
+
+def timed_stat_paths(paths, log_errors):
+    """
+    stat_paths() plus the wall time it took, so the parent can size the next chunks.
+    """
+    start = time.perf_counter()
+    batch = stat_paths(paths, log_errors)
+    return batch, time.perf_counter() - start
+
+class AdaptiveScheduler:
+    """
+    Feeds chunks of paths to a Pool with apply_async.
+
+    Chunk sizes follow the measured per-path stat latency so every task takes about
+    target_task_seconds: large chunks on local disks where IPC overhead dominates,
+    small ones on slow SMB mounts so work is spread evenly. At most max_in_flight
+    tasks are outstanding; when that limit is reached, the parent stops pulling
+    paths from the tree walk, so its memory stays flat however far the writer falls behind.
+    """
+    def __init__(self, pool, log_errors, max_in_flight, chunk_size=None, target_task_seconds=0.25,
+                 min_chunk_size=16, max_chunk_size=10000, on_status=None, status_interval=1.0):
+        self.pool = pool
+        self.log_errors = log_errors
+        self.max_in_flight = max_in_flight
+        self.adaptive = chunk_size is None
+        self.chunk_size = chunk_size or 100
+        self.target_task_seconds = target_task_seconds
+        self.min_chunk_size = min_chunk_size
+        self.max_chunk_size = max_chunk_size
+        self.on_status = on_status
+        self.status_interval = status_interval
+        self.path_latency = None
+        self.in_flight = 0
+        self.completed = queue.Queue()
+        self.last_status = 0.0
+        self.last_log = 0.0
+
+    def observe(self, paths, elapsed):
+        """
+        Update the per-path latency estimate (EWMA) and derive the next chunk size from it.
+        """
+        if not paths:
+            return
+        latency = elapsed / paths
+        self.path_latency = latency if self.path_latency is None else 0.8 * self.path_latency + 0.2 * latency
+        if not self.adaptive:
+            return
+        wanted = int(self.target_task_seconds / max(self.path_latency, 1e-9))
+        self.chunk_size = max(self.min_chunk_size, min(self.max_chunk_size, wanted))
+
+    def status(self):
+        return {
+            'chunk': self.chunk_size,
+            'in_flight': self.in_flight,
+            'ready': self.completed.qsize(),
+            'stat_ms': round(self.path_latency * 1000, 3) if self.path_latency is not None else None,
+        }
+
+    def report_status(self):
+        now = time.time()
+        if now - self.last_status < self.status_interval:
+            return
+        self.last_status = now
+        status = self.status()
+        if self.on_status is not None:
+            self.on_status(status)
+        if now - self.last_log >= 30:
+            self.last_log = now
+            logging.info(f"Scheduler: chunk size {status['chunk']}, {status['in_flight']} tasks in flight, "
+                         f"{status['ready']} results waiting, {status['stat_ms']} ms per stat")
+
+    def run(self, paths):
+        """
+        Generator that yields StatBatches for all paths in completion order.
+        """
+        paths = iter(paths)
+        exhausted = False
+        while True:
+            while not exhausted and self.in_flight < self.max_in_flight:
+                chunk = list(islice(paths, self.chunk_size))
+                if not chunk:
+                    exhausted = True
+                    break
+                self.pool.apply_async(
+                    timed_stat_paths, (chunk, self.log_errors),
+                    callback=self.completed.put, error_callback=self.completed.put
+                )
+                self.in_flight += 1
+            if self.in_flight == 0:
+                return
+            result = self.completed.get()
+            self.in_flight -= 1
+            if isinstance(result, BaseException):
+                raise result
+            batch, elapsed = result
+            self.observe(len(batch), elapsed)
+            self.report_status()
+            yield batch
+
+def traverse_files(roots, follow_symlinks=False, onerror=None, ondirectory=None):
+    """
+    Generator that yields file paths from the specified directories.
+    ondirectory is called with the number of subdirectories of every directory listed.
     """
-    Retrieve metadata for a single file.
-    Returns a dictionary with requested fields in Excel-compatible date format.
+    for top in roots:
+        for root, dirs, files in os.walk(top, followlinks=follow_symlinks, onerror=onerror):
+            if ondirectory is not None:
+                ondirectory(len(dirs))
+            for file in files:
+                yield os.path.join(root, file)
+
+def scan_directory(dir_path, log_errors):
+    """
+    List a single directory with os.scandir and stat its files from the DirEntry objects.
+    Returns (StatBatch of files, subdirectory paths, OSError or None).
+    Symlinked directories are neither followed nor reported as files, matching os.walk.
     """
-    metadata = {}
+    files = StatBatch()
+    subdirs = []
+    started = time.perf_counter()
     try:
-        stat_info = os.stat(file_path, follow_symlinks=False)
-        metadata['path'] = file_path
-        
-        # Convert epoch times to 'YYYY-MM-DD HH:MM:SS' format in local timezone
-        # If you prefer UTC, replace datetime.fromtimestamp with datetime.utcfromtimestamp
-        metadata['access_time'] = datetime.fromtimestamp(stat_info.st_atime).strftime('%Y-%m-%d %H:%M:%S')
-        metadata['modify_time'] = datetime.fromtimestamp(stat_info.st_mtime).strftime('%Y-%m-%d %H:%M:%S')
-        metadata['change_time'] = datetime.fromtimestamp(stat_info.st_ctime).strftime('%Y-%m-%d %H:%M:%S')
-        
-        metadata['size'] = stat_info.st_size
-        # Since we are iterating over files, 'file_type' will always be 'file'
-        metadata['file_type'] = 'file'
-    except Exception as e:
-        metadata['path'] = file_path
-        metadata['access_time'] = ''
-        metadata['modify_time'] = ''
-        metadata['change_time'] = ''
-        metadata['size'] = ''
-        metadata['file_type'] = ''
-        metadata['error'] = str(e)
-        if log_errors:
-            logging.error(f"Error accessing {file_path}: {e}")
-    return metadata
+        with os.scandir(dir_path) as it:
+            for entry in it:
+                try:
+                    is_dir = entry.is_dir()
+                except OSError:
+                    is_dir = False
+                if is_dir:
+                    if not entry.is_symlink():
+                        subdirs.append(entry.path)
+                    continue
+                start = time.perf_counter()
+                try:
+                    try:
+                        stat_info = entry.stat(follow_symlinks=False)
+                    except OSError as e:
+                        if e.errno not in TRANSIENT_ERRNOS:
+                            raise
+                        stat_info = stat_file(entry.path)
+                    files.observe_latency(time.perf_counter() - start)
+                    files.append_stat(entry.path, stat_info)
+                except OSError as e:
+                    files.observe_latency(time.perf_counter() - start)
+                    if log_errors:
+                        logging.error(f"Error accessing {entry.path}: {e}")
+                    files.append_error(entry.path, e)
+    except OSError as e:
+        return files, subdirs, e
+    finally:
+        files.add_busy(worker_name(), time.perf_counter() - started)
+    return files, subdirs, None
+
+# Result of one directory handled by a crawler process. reused is True when the directory
+# was unchanged since the checkpoint and its stored listing was used instead of scandir.
+DirectoryResult = namedtuple('DirectoryResult', ['path', 'mtime_ns', 'files', 'subdirs', 'error', 'reused', 'file_count'])
+
+# Messages of crawler processes besides DirectoryResults: an exception no directory error
+# accounts for (the scan is stopped, since the directory's subtree would be missing), and the
+# last message of every worker
+CrawlerFailure = namedtuple('CrawlerFailure', ['path', 'traceback'])
+CrawlerExit = namedtuple('CrawlerExit', ['worker'])
+
+# Seconds between checks for crawler processes that died without their exit message
+CRAWLER_CHECK_SECONDS = 5
+
+def crawl_worker(dir_queue, result_queue, log_errors, checkpoint_path=None):
+    """
+    Work-queue crawler process.
+    Pulls directories from dir_queue, pushes their subdirectories back onto it and
+    sends a DirectoryResult to result_queue. A None item stops the worker.
+    With a checkpoint, directories whose mtime matches their last listing are not listed again.
+    Unexpected exceptions are sent as a CrawlerFailure, and a CrawlerExit is always sent last.
+    """
+    try:
+        checkpoint = CheckpointReader(checkpoint_path) if checkpoint_path else None
+        while True:
+            dir_path = dir_queue.get()
+            if dir_path is None:
+                dir_queue.task_done()
+                break
+            try:
+                mtime_ns = None
+                previous = None
+                if checkpoint is not None:
+                    # Taken before listing so changes made during the listing show up next time
+                    try:
+                        mtime_ns = os.stat(dir_path).st_mtime_ns
+                    except OSError:
+                        pass
+                    previous = checkpoint.previous_listing(dir_path)
+                if previous is not None and mtime_ns is not None and previous[0] == mtime_ns:
+                    result = DirectoryResult(dir_path, mtime_ns, StatBatch(), previous[2], None, True, previous[1])
+                else:
+                    files, subdirs, error = scan_directory(dir_path, log_errors)
+                    if error is not None:
+                        mtime_ns = None
+                    result = DirectoryResult(dir_path, mtime_ns, files, subdirs, error, False, len(files))
+                # Subdirectories are queued before task_done() so join() cannot return early
+                for subdir in result.subdirs:
+                    dir_queue.put(subdir)
+                result_queue.put(result)
+            except Exception:
+                result_queue.put(CrawlerFailure(dir_path, traceback.format_exc()))
+            finally:
+                dir_queue.task_done()
+    except Exception:
+        result_queue.put(CrawlerFailure(None, traceback.format_exc()))
+    finally:
+        # Goes through the same queue as the results so it arrives after them
+        result_queue.put(CrawlerExit(multiprocessing.current_process().name))
+
+def crawl_directories(roots, processes, log_errors, checkpoint_path=None):
+    """
+    Generator that yields a DirectoryResult per directory using a pool of crawler processes
+    that share a directory work queue, so listing and stat both scale with processes.
+    Raises RuntimeError when a crawler fails or dies (e.g. killed for lack of memory).
+    """
+    dir_queue = multiprocessing.JoinableQueue()
+    result_queue = multiprocessing.Queue()
+    workers = [
+        multiprocessing.Process(target=crawl_worker, args=(dir_queue, result_queue, log_errors, checkpoint_path), daemon=True)
+        for _ in range(processes)
+    ]
+    for worker in workers:
+        worker.start()
+    for root in roots:
+        dir_queue.put(root)
+
+    def stop_workers_when_drained():
+        dir_queue.join()
+        for _ in workers:
+            dir_queue.put(None)
+
+    threading.Thread(target=stop_workers_when_drained, daemon=True).start()
 
-def traverse_files(mount_point, follow_symlinks=False, onerror=None):
+    finished_workers = set()
+    lost_workers = []
+    try:
+        while len(finished_workers) < len(workers):
+            try:
+                result = result_queue.get(timeout=CRAWLER_CHECK_SECONDS)
+            except queue.Empty:
+                # A worker that died without its exit message never sends one; it is only
+                # given up on when nothing arrived for another interval after it was seen dead
+                lost = [worker for worker in workers if worker.name not in finished_workers and not worker.is_alive()]
+                if lost and lost == lost_workers:
+                    exits = ', '.join(f"{worker.name} (exit code {worker.exitcode})" for worker in lost)
+                    raise RuntimeError(f"Crawler process(es) died before finishing: {exits}")
+                lost_workers = lost
+                continue
+            if isinstance(result, CrawlerExit):
+                finished_workers.add(result.worker)
+                continue
+            if isinstance(result, CrawlerFailure):
+                raise RuntimeError(f"Crawler failed on directory {result.path}:\n{result.traceback}")
+            yield result
+    finally:
+        for worker in workers:
+            if worker.is_alive():
+                worker.terminate()
+            worker.join()
+
+def crawl_files(roots, processes, log_errors, onerror=None, ondirectory=None):
+    """
+    Generator that yields a StatBatch of files per directory from crawl_directories().
+    ondirectory is called with the number of subdirectories of every directory listed.
+    """
+    for result in crawl_directories(roots, processes, log_errors):
+        if result.error is not None and onerror is not None:
+            onerror(result.error)
+        if ondirectory is not None:
+            ondirectory(len(result.subdirs))
+        if len(result.files):
+            yield result.files
+
+def list_directory(dir_path):
+    """
+    List a single directory with os.scandir without stat'ing its files.
+    Returns (file paths, subdirectory paths, OSError or None), classified like scan_directory().
+    """
+    files = []
+    subdirs = []
+    try:
+        with os.scandir(dir_path) as it:
+            for entry in it:
+                try:
+                    is_dir = entry.is_dir()
+                except OSError:
+                    is_dir = False
+                if is_dir:
+                    if not entry.is_symlink():
+                        subdirs.append(entry.path)
+                else:
+                    files.append(entry.path)
+    except OSError as e:
+        return files, subdirs, e
+    return files, subdirs, None
+
+# Files per stat_paths() call in the async engine; chunks of one directory are stat'ed concurrently
+ASYNC_STAT_CHUNK_SIZE = 64
+
+async def crawl_async(roots, results, stop_event, concurrency, subtree_concurrency, log_errors):
+    """
+    Crawl the tree on one asyncio event loop. Blocking scandir/stat calls run on a thread pool
+    of concurrency threads, and concurrency worker coroutines pull directories from a queue.
+    Each top-level subtree of a root is limited to subtree_concurrency directories in progress,
+    so one huge or slow subtree cannot take every slot.
+    (StatBatch, OSError or None, subdirectory count) tuples are put on the thread-safe results queue.
+    """
+    loop = asyncio.get_running_loop()
+    executor = ThreadPoolExecutor(max_workers=concurrency)
+    dir_queue = asyncio.Queue()
+    subtree_limits = {}
+
+    def timed_list_directory(dir_path):
+        # Runs on the executor; the listing time counts as busy time of that thread
+        start = time.perf_counter()
+        listing = list_directory(dir_path)
+        return listing, worker_name(), time.perf_counter() - start
+
+    async def publish(item):
+        # The consumer runs in another thread; never block the event loop on a full queue
+        while not stop_event.is_set():
+            try:
+                results.put_nowait(item)
+                return
+            except queue.Full:
+                await asyncio.sleep(0.01)
+
+    async def worker():
+        while True:
+            dir_path, subtree = await dir_queue.get()
+            try:
+                if stop_event.is_set():
+                    continue
+                limit = subtree_limits.setdefault(subtree, asyncio.Semaphore(subtree_concurrency))
+                async with limit:
+                    (files, subdirs, error), worker, elapsed = await loop.run_in_executor(executor, timed_list_directory, dir_path)
+                    for subdir in subdirs:
+                        # Directories directly below a root start their own subtree
+                        dir_queue.put_nowait((subdir, subtree or subdir))
+                    batches = await asyncio.gather(*(
+                        loop.run_in_executor(executor, stat_paths, files[i:i + ASYNC_STAT_CHUNK_SIZE], log_errors)
+                        for i in range(0, len(files), ASYNC_STAT_CHUNK_SIZE)
+                    ))
+                batch = StatBatch()
+                batch.add_busy(worker, elapsed)
+                for part in batches:
+                    batch.extend(part)
+                await publish((batch, error, len(subdirs)))
+            finally:
+                dir_queue.task_done()
+
+    for root in roots:
+        dir_queue.put_nowait((root, None))
+    workers = [asyncio.create_task(worker()) for _ in range(concurrency)]
+    try:
+        await dir_queue.join()
+    finally:
+        for task in workers:
+            task.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+        executor.shutdown(wait=False, cancel_futures=True)
+
+def crawl_files_async(roots, concurrency, subtree_concurrency, log_errors, onerror=None, ondirectory=None):
+    """
+    Generator that yields a StatBatch of files per directory from crawl_async(),
+    which runs its event loop in a background thread.
+    ondirectory is called with the number of subdirectories of every directory listed.
+    """
+    results = queue.Queue(maxsize=1024)
+    stop_event = threading.Event()
+    done = object()
+
+    def run_loop():
+        try:
+            asyncio.run(crawl_async(roots, results, stop_event, concurrency, subtree_concurrency, log_errors))
+        except BaseException as e:
+            results.put(e)
+        finally:
+            results.put(done)
+
+    thread = threading.Thread(target=run_loop, daemon=True)
+    thread.start()
+    try:
+        while True:
+            item = results.get()
+            if item is done:
+                break
+            if isinstance(item, BaseException):
+                raise item
+            batch, error, subdir_count = item
+            if error is not None and onerror is not None:
+                onerror(error)
+            if ondirectory is not None:
+                ondirectory(subdir_count)
+            if len(batch):
+                yield batch
+    finally:
+        stop_event.set()
+
+# Directories a scanner invocation crawls recursively, plus the files it owns directly in
+# directories above the shard depth ({directory: [file paths]}) and the errors met while planning.
+ShardPlan = namedtuple('ShardPlan', ['roots', 'shallow_files', 'errors'])
+
+def shard_of(path, mount_point, shard_count):
+    """
+    Deterministic shard index of a directory, from a CRC32 of its path relative to the mount point.
+    """
+    relative = os.path.relpath(path, mount_point).replace(os.sep, '/')
+    return zlib.crc32(relative.encode('utf-8', 'surrogateescape')) % shard_count
+
+def plan_shard(mount_point, shard, depth):
+    """
+    List the tree down to depth and keep the directories at that depth that hash to this shard.
+    Files found above that depth, and listing errors there, belong to shard 0 only, so every
+    file and error is reported by exactly one shard.
+    """
+    if shard is None:
+        return ShardPlan([mount_point], {}, [])
+    index, count = shard
+    shallow_files = {}
+    errors = []
+    level = [mount_point]
+    for _ in range(depth):
+        next_level = []
+        for dir_path in level:
+            files, subdirs, error = list_directory(dir_path)
+            if error is not None:
+                errors.append(error)
+            if files:
+                shallow_files[dir_path] = files
+            next_level.extend(subdirs)
+        level = next_level
+    roots = sorted(path for path in level if shard_of(path, mount_point, count) == index)
+    if index != 0:
+        shallow_files, errors = {}, []
+    logging.info(f"Shard {index}/{count}: {len(roots)} of {len(level)} directories at depth {depth}, "
+                 f"{sum(len(files) for files in shallow_files.values())} files above that depth.")
+    return ShardPlan(roots, shallow_files, errors)
+
+def run_checkpointed_scan(args, checkpoint, metadata_writer, pbar, plan, error_sink, metrics):
+    """
+    Crawl with the scandir engine while recording every completed directory in the checkpoint,
+    then write the merged snapshot from the checkpoint to the metadata output.
+    File stat errors are kept in the checkpoint and reported from the snapshot, so files in
+    reused directories that still fail are reported too.
+    """
+    mode = 'resume' if args.resume else 'incremental' if args.incremental else 'fresh'
+    scan_name = args.mount_point if args.shard is None else f"{args.mount_point} shard {args.shard[0]}/{args.shard[1]}"
+    roots = checkpoint.start(scan_name, mode, plan.roots)
+    if mode != 'resume':
+        # Files above the shard depth are re-stat'ed on every run; they are recorded per directory
+        checkpoint.queue_directories(None, list(plan.shallow_files))
+        for dir_path, files in plan.shallow_files.items():
+            stat_batch = stat_paths(files, args.log_errors)
+            metrics.observe_batch(stat_batch)
+            checkpoint.record_directory(dir_path, None, stat_batch, [], False)
+    reused_dirs = 0
+    results = crawl_directories(roots, args.processes, args.log_errors, checkpoint_path=args.checkpoint)
+    try:
+        for result in results:
+            if result.error is not None:
+                error_sink.record_os_error(result.error)
+            metrics.observe_directory(len(result.subdirs))
+            metrics.observe_batch(result.files)
+            if result.reused:
+                # Not stat'ed again, so counted apart from the stat calls
+                metrics.observe_reused(*checkpoint.stored_totals(result.path))
+            checkpoint.record_directory(result.path, result.mtime_ns, result.files, result.subdirs, result.reused)
+            reused_dirs += result.reused
+            pbar.update(result.file_count)
+    finally:
+        # Stops the crawler processes and keeps everything recorded so far for --resume
+        results.close()
+        checkpoint.commit()
+    checkpoint.finish()
+    logging.info(f"Checkpointed scan finished, {reused_dirs} unchanged directories reused.")
+
+    for metadata_batch in checkpoint.iter_files(args.batch_size):
+        metadata_writer.write_batch(error_sink.record_batch(metadata_batch))
+
+TIME_FIELDS = ('access_time', 'modify_time', 'change_time')
+NS_PER_SECOND = 1000000000
+NS_PER_HOUR = 3600 * NS_PER_SECOND
+
+@functools.lru_cache(maxsize=65536)
+def format_epoch_seconds(seconds):
+    """
+    Convert epoch seconds to Excel-compatible 'YYYY-MM-DD HH:MM:SS' in the local timezone.
+    Cached because files written together share timestamps.
+    """
+    # If you prefer UTC, replace datetime.fromtimestamp with datetime.utcfromtimestamp
+    return datetime.fromtimestamp(seconds).strftime('%Y-%m-%d %H:%M:%S')
+
+def write_metadata_to_csv(csv_writer, batch, fields):
+    """
+    Write a StatBatch to the CSV file without quoting fields.
+    Rows that failed to stat keep their path and leave the other fields empty.
+    """
+    columns = []
+    for field in fields:
+        if field in TIME_FIELDS:
+            columns.append([format_epoch_seconds(value // NS_PER_SECOND) for value in getattr(batch, field)])
+        elif field in ('path', 'size', 'inode'):
+            columns.append(getattr(batch, field))
+        elif field == 'file_type':
+            # Since we are iterating over files, 'file_type' will always be 'file'
+            columns.append(['file'] * len(batch))
+        else:
+            columns.append([''] * len(batch))
+    if batch.error:
+        columns = [list(column) for column in columns]
+        for index in batch.error:
+            for column, field in zip(columns, fields):
+                if field != 'path':
+                    column[index] = ''
+    csv_writer.writerows(zip(*columns))
+
+def to_local_timestamps(epoch_ns):
+    """
+    Convert an int64 Arrow array of epoch nanoseconds to a naive timestamp[ns] array holding
+    local wall-clock time, i.e. the same values the CSV output writes as strings.
+    The UTC offset is looked up once per distinct hour rather than once per file.
+    """
+    hours = pc.divide(epoch_ns, NS_PER_HOUR)
+    unique_hours = pc.unique(hours)
+    offsets = pa.array(
+        [0 if hour is None else time.localtime(hour * 3600).tm_gmtoff * NS_PER_SECOND for hour in unique_hours.to_pylist()],
+        type=pa.int64()
+    )
+    local = pc.add(epoch_ns, pc.take(offsets, pc.index_in(hours, value_set=unique_hours)))
+    return local.cast(pa.timestamp('ns'))
+
+class CsvMetadataWriter:
+    """
+    Write metadata batches as CSV rows with a header line.
+    """
+    def __init__(self, path, fields):
+        self.fields = fields
+        self.file = open(path, 'w', newline='', encoding='utf-8')
+        # Initialize CSV Writer for Metadata without quoting fields unnecessarily
+        self.writer = csv.writer(self.file, quoting=csv.QUOTE_MINIMAL)
+        self.writer.writerow(fields)  # Write CSV Header
+
+    def write_batch(self, batch):
+        write_metadata_to_csv(self.writer, batch, self.fields)
+
+    def close(self):
+        self.file.close()
+
+class ParquetMetadataWriter:
+    """
+    Buffer StatBatches and stream them through a ParquetWriter as Arrow record batches.
+    The integer columns are handed to Arrow as buffers without per-value conversion.
+    Sizes are native int64 and times are timestamp[ns] columns, which is the schema
+    parqConverter.process_chunk() gets from pd.read_csv(parse_dates=[...]) on the CSV output.
+    The path is written dictionary-encoded as pathcodec's directory, name and extension columns.
+    """
+    def __init__(self, path, fields, row_group_size):
+        self.fields = fields
+        self.row_group_size = row_group_size
+        schema_fields = []
+        for field in fields:
+            schema_fields.extend(PATH_SCHEMA if field == 'path' else [pa.field(field, self.arrow_type(field))])
+        self.schema = pa.schema(schema_fields)
+        self.writer = pq.ParquetWriter(path, self.schema)
+        self.pending = StatBatch()
+
+    @staticmethod
+    def arrow_type(field):
+        if field in TIME_FIELDS:
+            return pa.timestamp('ns')
+        if field == 'size':
+            return pa.int64()
+        if field == 'inode':
+            return pa.uint64()
+        return pa.string()
+
+    def write_batch(self, batch):
+        self.pending.extend(batch)
+        if len(self.pending) >= self.row_group_size:
+            self.flush()
+
+    def arrow_column(self, field, failed):
+        batch = self.pending
+        if field == 'path':
+            return split_paths(pa.array(batch.path, type=pa.string()))
+        if field in StatBatch.NUMERIC_COLUMNS:
+            values = pa.Array.from_buffers(
+                pa.uint64() if field == 'inode' else pa.int64(), len(batch), [None, pa.py_buffer(getattr(batch, field))]
+            )
+            if field in TIME_FIELDS:
+                values = to_local_timestamps(values)
+        elif field == 'file_type':
+            values = pa.repeat(pa.scalar('file'), len(batch))
+        else:
+            return pa.nulls(len(batch), type=pa.string())
+        # Rows that failed to stat become nulls
+        return pc.if_else(failed, pa.scalar(None, type=values.type), values)
+
+    def flush(self):
+        if not len(self.pending):
+            return
+        errnos = pa.Array.from_buffers(pa.int32(), len(self.pending), [None, pa.py_buffer(self.pending.errno)])
+        failed = pc.not_equal(errnos, 0)
+        arrays = []
+        for field in self.fields:
+            column = self.arrow_column(field, failed)
+            arrays.extend(column if field == 'path' else [column])
+        record_batch = pa.RecordBatch.from_arrays(arrays, schema=self.schema)
+        self.writer.write_table(pa.Table.from_batches([record_batch]), row_group_size=self.row_group_size)
+        self.pending = StatBatch()
+
+    def close(self):
+        if self.writer is not None:
+            self.flush()
+            self.writer.close()
+            self.writer = None
+
+def open_metadata_writer(path, output_format, fields, row_group_size):
     """
-    Generator that yields file paths from the specified directory.
+    Open the metadata output sink for the requested format.
     """
-    for root, dirs, files in os.walk(mount_point, followlinks=follow_symlinks, onerror=onerror):
-        for file in files:
-            yield os.path.join(root, file)
+    if output_format == 'parquet':
+        if pa is None:
+            raise RuntimeError("pyarrow is required for --format parquet (pip3 install pyarrow)")
+        return ParquetMetadataWriter(path, fields, row_group_size)
+    return CsvMetadataWriter(path, fields)
 
-def write_metadata_to_csv(csv_writer, metadata_batch, fields):
+def errno_name(code):
     """
-    Write a batch of metadata dictionaries to the CSV file without quoting fields.
+    Symbolic name of an errno value ('EACCES'), 'unknown' for failures without one.
     """
-    for metadata in metadata_batch:
-        row = [metadata.get(field, '') for field in fields]
-        csv_writer.writerow(row)
+    if code < 0:
+        return 'unknown'
+    return errno.errorcode.get(code, str(code))
 
-def write_inaccessible_dirs_to_csv(csv_writer, inaccessible_dirs):
+class ErrorSink:
     """
-    Write the list of inaccessible directories to the CSV file.
+    Stream scan errors to the inaccessible CSV while the scan runs.
+    At most buffer_rows rows are held in memory; the buffer is written and flushed to disk
+    when it fills up or flush_interval seconds have passed, so a crash loses at most that much.
+    kind is 'directory' for directories that could not be listed and 'file' for files that
+    could not be stat'ed. Errors are counted per (kind, errno) for the summary table.
     """
-    for entry in inaccessible_dirs:
-        csv_writer.writerow([entry['path'], entry['error']])
+    HEADER = ['path', 'error', 'errno', 'kind']
+
+    def __init__(self, path, buffer_rows=1000, flush_interval=5.0, metrics=None):
+        self.file = open(path, 'w', newline='', encoding='utf-8')
+        self.writer = csv.writer(self.file, quoting=csv.QUOTE_MINIMAL)
+        self.writer.writerow(self.HEADER)  # Write CSV Header
+        self.buffer_rows = buffer_rows
+        self.flush_interval = flush_interval
+        self.buffer = []
+        self.counts = Counter()
+        self.metrics = metrics
+        self.last_flush = time.time()
+
+    def record(self, path, message, code, kind):
+        self.buffer.append((path, message, errno_name(code), kind))
+        self.counts[(kind, code)] += 1
+        if self.metrics is not None:
+            self.metrics.observe_error(kind, errno_name(code))
+        if len(self.buffer) >= self.buffer_rows or time.time() - self.last_flush >= self.flush_interval:
+            self.flush()
+
+    def record_os_error(self, os_error):
+        """
+        onerror callback for directories the engines could not list.
+        """
+        if os_error.errno == errno.EACCES:
+            self.record(os_error.filename, 'Permission Denied', os_error.errno, 'directory')
+            logging.warning(f"Permission denied accessing directory: {os_error.filename}")
+        else:
+            self.record(os_error.filename, str(os_error), os_error.errno or -1, 'directory')
+            logging.warning(f"Error accessing directory {os_error.filename}: {os_error}")
+
+    def record_batch(self, batch):
+        """
+        Record the files of a StatBatch that failed to stat and return the batch without them.
+        """
+        for index, message in batch.error.items():
+            self.record(batch.path[index], message, batch.errno[index], 'file')
+        return batch.without_errors()
+
+    def flush(self):
+        self.writer.writerows(self.buffer)
+        self.buffer = []
+        self.file.flush()
+        self.last_flush = time.time()
+
+    def summary(self):
+        """
+        Table of error counts by kind and errno, most frequent first.
+        """
+        if not self.counts:
+            return "No inaccessible directories or files."
+        lines = [f"{'kind':<10} {'errno':<12} {'count':>10}  description"]
+        for (kind, code), count in self.counts.most_common():
+            description = os.strerror(code) if code > 0 else ''
+            lines.append(f"{kind:<10} {errno_name(code):<12} {count:>10}  {description}")
+        lines.append(f"{'total':<10} {'':<12} {sum(self.counts.values()):>10}")
+        return '\n'.join(lines)
 
-def monitor_system(stop_event):
+    def close(self):
+        if not self.file.closed:
+            self.flush()
+            self.file.close()
+
+def monitor_system(stop_event, metrics=None):
     """
-    Optional: Monitor system resources and log if necessary.
+    Optional: Monitor system resources, log them and publish them as scan metrics.
+    Runs as a thread of the parent so the values reach the metrics endpoint.
     """
     while not stop_event.is_set():
         cpu = psutil.cpu_percent(interval=1)
         mem = psutil.virtual_memory().percent
+        if metrics is not None:
+            metrics.set_gauge('system_cpu_percent', cpu)
+            metrics.set_gauge('system_memory_percent', mem)
         logging.info(f"CPU Usage: {cpu}%, Memory Usage: {mem}%")
-        time.sleep(10)  # Log every 10 seconds
+        stop_event.wait(10)  # Log every 10 seconds
 
 def main():
     args = parse_arguments()
 
-    # Prepare CSV File for Metadata
+    # Prepare Output File for Metadata
     try:
         # Check if output file exists to prevent accidental overwrites
         if os.path.exists(args.output_csv):
             response = input(f"The file {args.output_csv} already exists. Overwrite? (y/n): ")
             if response.lower() != 'y':
                 sys.exit("Operation cancelled by user.")
-        metadata_csv_file = open(args.output_csv, 'w', newline='', encoding='utf-8')
+        metadata_writer = open_metadata_writer(args.output_csv, args.format, args.fields, args.row_group_size)
     except Exception as e:
-        logging.error(f"Failed to open CSV file {args.output_csv}: {e}")
-        sys.exit(f"Error: Failed to open CSV file {args.output_csv}: {e}")
+        logging.error(f"Failed to open output file {args.output_csv}: {e}")
+        sys.exit(f"Error: Failed to open output file {args.output_csv}: {e}")
 
-    # Initialize CSV Writer for Metadata without quoting fields unnecessarily
-    metadata_csv_writer = csv.writer(metadata_csv_file, quoting=csv.QUOTE_MINIMAL)
-    metadata_csv_writer.writerow(args.fields)  # Write CSV Header
+    # Scan Telemetry for the Metrics Endpoint and the Run Report
+    metrics = ScanMetrics(args.engine, args.concurrency if args.engine == 'async' else args.processes)
 
     # Prepare CSV File for Inaccessible Directories
     try:
@@ -179,96 +1015,156 @@ def main():
             response = input(f"The file {args.inaccessible_csv} already exists. Overwrite? (y/n): ")
             if response.lower() != 'y':
                 sys.exit("Operation cancelled by user.")
-        inaccessible_csv_file = open(args.inaccessible_csv, 'w', newline='', encoding='utf-8')
+        # Inaccessible directories and files that failed to stat are streamed here during the scan
+        error_sink = ErrorSink(args.inaccessible_csv, metrics=metrics)
     except Exception as e:
         logging.error(f"Failed to open CSV file {args.inaccessible_csv}: {e}")
-        metadata_csv_file.close()
+        metadata_writer.close()
         sys.exit(f"Error: Failed to open CSV file {args.inaccessible_csv}: {e}")
+    onerror_callback = error_sink.record_os_error
 
-    # Initialize CSV Writer for Inaccessible Directories
-    inaccessible_csv_writer = csv.writer(inaccessible_csv_file, quoting=csv.QUOTE_MINIMAL)
-    inaccessible_csv_writer.writerow(['path', 'error'])  # Write CSV Header
-
-    # Initialize List to Collect Inaccessible Directories
-    inaccessible_dirs = []
+    # Partition the Mount Point when Scanning one Shard of N
+    plan = plan_shard(args.mount_point, args.shard, args.shard_depth)
+    for os_error in plan.errors:
+        onerror_callback(os_error)
+    metrics.add_roots(len(plan.roots))
+    metrics_server = None
+    if args.metrics_port is not None:
+        try:
+            metrics_server = serve_metrics(metrics, args.metrics_port, args.metrics_address)
+        except OSError as e:
+            logging.error(f"Failed to start the metrics endpoint on port {args.metrics_port}: {e}")
+            sys.exit(f"Error: Failed to start the metrics endpoint on port {args.metrics_port}: {e}")
 
-    # Define onerror Callback to Collect Inaccessible Directories
-    def onerror_callback(os_error):
-        if os_error.errno == errno.EACCES:
-            inaccessible_dirs.append({'path': os_error.filename, 'error': 'Permission Denied'})
-            logging.warning(f"Permission denied accessing directory: {os_error.filename}")
-        else:
-            inaccessible_dirs.append({'path': os_error.filename, 'error': str(os_error)})
-            logging.warning(f"Error accessing directory {os_error.filename}: {os_error}")
-
-    # Prepare Multiprocessing Pool
-    pool = Pool(processes=args.processes)
+    # Prepare Multiprocessing Pool (the scandir and async engines manage their own workers)
+    pool = Pool(processes=args.processes) if args.engine == 'pool' else None
 
     # Initialize Progress Bar
     pbar = tqdm(desc="Collecting Metadata", unit="files")
 
     # Optional: Start System Resource Monitoring
-    stop_event = multiprocessing.Event()
+    stop_event = threading.Event()
     if args.monitor:
-        monitor = multiprocessing.Process(target=monitor_system, args=(stop_event,))
+        monitor = threading.Thread(target=monitor_system, args=(stop_event, metrics), daemon=True)
         monitor.start()
 
-    # Prepare partial function with fixed arguments
-    partial_get_file_metadata = partial(get_file_metadata, log_errors=args.log_errors)
+    # Optional: Checkpoint Store for Resumable / Incremental Scans
+    checkpoint = None
+    if args.checkpoint:
+        try:
+            checkpoint = ScanCheckpoint(args.checkpoint)
+        except Exception as e:
+            logging.error(f"Failed to open checkpoint {args.checkpoint}: {e}")
+            sys.exit(f"Error: Failed to open checkpoint {args.checkpoint}: {e}")
 
     # Batch Processing
-    metadata_batch = []
+    metadata_batch = StatBatch()
     batch_size = args.batch_size
+    if checkpoint is not None:
+        metadata_iter = None
+    elif args.engine == 'scandir':
+        metadata_iter = crawl_files(
+            plan.roots, args.processes, args.log_errors, onerror=onerror_callback, ondirectory=metrics.observe_directory
+        )
+    elif args.engine == 'async':
+        metadata_iter = crawl_files_async(
+            plan.roots, args.concurrency, args.subtree_concurrency, args.log_errors,
+            onerror=onerror_callback, ondirectory=metrics.observe_directory
+        )
+    else:
+        # Chunks of paths are stat'ed in the pool with adaptive sizing and a bounded number of tasks in flight
+        def on_scheduler_status(status):
+            pbar.set_postfix(status, refresh=False)
+            metrics.set_gauge('queue_tasks_in_flight', status['in_flight'])
+            metrics.set_gauge('queue_results_waiting', status['ready'])
+
+        scheduler = AdaptiveScheduler(
+            pool, args.log_errors,
+            max_in_flight=args.max_in_flight or 4 * args.processes,
+            chunk_size=args.chunk_size,
+            target_task_seconds=args.target_task_seconds,
+            on_status=on_scheduler_status
+        )
+        metadata_iter = scheduler.run(
+            traverse_files(plan.roots, onerror=onerror_callback, ondirectory=metrics.observe_directory)
+        )
     try:
-        # Using imap_unordered for better performance
-        for metadata in pool.imap_unordered(partial_get_file_metadata, traverse_files(args.mount_point, onerror=onerror_callback), chunksize=100):
-            metadata_batch.append(metadata)
-            pbar.update(1)
+        if checkpoint is not None:
+            run_checkpointed_scan(args, checkpoint, metadata_writer, pbar, plan, error_sink, metrics)
+        else:
+            for dir_path, files in plan.shallow_files.items():
+                stat_batch = stat_paths(files, args.log_errors)
+                metrics.observe_batch(stat_batch)
+                metadata_batch.extend(error_sink.record_batch(stat_batch))
+                pbar.update(len(stat_batch))
+            for stat_batch in metadata_iter:
+                metrics.observe_batch(stat_batch)
+                metadata_batch.extend(error_sink.record_batch(stat_batch))
+                pbar.update(len(stat_batch))
 
-            if len(metadata_batch) >= batch_size:
-                write_metadata_to_csv(metadata_csv_writer, metadata_batch, args.fields)
-                metadata_batch = []
+                if len(metadata_batch) >= batch_size:
+                    metadata_writer.write_batch(metadata_batch)
+                    metadata_batch = StatBatch()
 
-        # Write remaining metadata
-        if metadata_batch:
-            write_metadata_to_csv(metadata_csv_writer, metadata_batch, args.fields)
+            # Write remaining metadata
+            if metadata_batch:
+                metadata_writer.write_batch(metadata_batch)
 
     except KeyboardInterrupt:
         logging.warning("Metadata collection interrupted by user.")
-        pool.terminate()
-        pool.join()
-        metadata_csv_file.close()
-        inaccessible_csv_file.close()
+        if pool is not None:
+            pool.terminate()
+            pool.join()
+        metadata_writer.close()
+        error_sink.close()
+        if checkpoint is not None:
+            checkpoint.close()
+            sys.exit(f"Metadata collection interrupted by user. Continue with --checkpoint {args.checkpoint} --resume")
         sys.exit("Metadata collection interrupted by user.")
     except Exception as e:
         logging.error(f"An error occurred during metadata collection: {e}")
-        pool.terminate()
-        pool.join()
-        metadata_csv_file.close()
-        inaccessible_csv_file.close()
+        if pool is not None:
+            pool.terminate()
+            pool.join()
+        metadata_writer.close()
+        error_sink.close()
         sys.exit(f"Error: {e}")
     finally:
-        pool.close()
-        pool.join()
-        metadata_csv_file.close()
+        if pool is not None:
+            pool.close()
+            pool.join()
+        elif metadata_iter is not None:
+            metadata_iter.close()
+        metadata_writer.close()
         pbar.close()
         if args.monitor:
             stop_event.set()
             monitor.join()
+        metrics.finish()
+        if args.report:
+            try:
+                metrics.write_report(args.report, {'mount_point': args.mount_point, 'output': args.output_csv, 'shard': args.shard})
+            except Exception as e:
+                logging.error(f"Failed to write run report {args.report}: {e}")
+        if metrics_server is not None:
+            metrics_server.shutdown()
 
-    # Write Inaccessible Directories to CSV
+    if checkpoint is not None:
+        checkpoint.close()
+
+    # Flush the Remaining Errors and Summarize them by errno
     try:
-        write_inaccessible_dirs_to_csv(inaccessible_csv_writer, inaccessible_dirs)
+        error_sink.close()
     except Exception as e:
         logging.error(f"Failed to write to inaccessible directories CSV: {e}")
-        inaccessible_csv_file.close()
         sys.exit(f"Error: Failed to write to inaccessible directories CSV: {e}")
-    finally:
-        inaccessible_csv_file.close()
+    summary = error_sink.summary()
+    logging.info(f"Scan errors:\n{summary}")
 
     logging.info("Metadata collection completed successfully.")
     print("Metadata collection completed successfully.")
-    print(f"Inaccessible directories have been logged to {args.inaccessible_csv}")
+    print(summary)
+    print(f"Inaccessible directories and files have been logged to {args.inaccessible_csv}")
 
 if __name__ == '__main__':
     main()
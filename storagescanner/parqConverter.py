@@ -1,115 +1,358 @@
-import pandas as pd
-import sys
+import os
+import time
+import queue
+import argparse
+import threading
+from collections import deque
+from itertools import chain
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
+import pandas as pd
+import numpy as np
 import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
 import pyarrow.parquet as pq
+from pyarrow import csv
+from pathcodec import encode_table, remap_dictionary
+from scanfilter import PARTITION_COLUMNS, PARTITIONING
 
-def process_chunk(chunk, current_date, date_pattern, max_remaining_levels=3):
-    # Calculate days since last access, modify, and change
-    chunk['days_since_last_access'] = (current_date - chunk['access_time']).dt.days
-    chunk['days_since_last_modify'] = (current_date - chunk['modify_time']).dt.days
-    chunk['days_since_last_change'] = (current_date - chunk['change_time']).dt.days
+TIME_COLUMNS = ['access_time', 'modify_time', 'change_time']
+# Chunks per worker that may be read ahead or converting, so every worker always has the next one
+CHUNKS_PER_WORKER = 2
+NS_PER_DAY = 86400 * 10**9
+# Rows a partitioned output buffers per open partition before writing a row group
+PARTITION_MIN_ROWS_PER_GROUP = 64 * 1024
+# season x event x department directories a partitioned output may create
+MAX_PARTITIONS = 100000
 
-    # Remove the file_type column if it exists
-    if 'file_type' in chunk.columns:
-        chunk = chunk.drop(columns=['file_type'])
+def days_since(times, current_date):
+    """
+    Whole days from every time to current_date, rounded down like Timedelta.days.
+    """
+    elapsed = pc.subtract(pa.scalar(current_date.value, pa.int64()), times.cast(pa.timestamp('ns')).cast(pa.int64()))
+    days = pc.divide(elapsed, NS_PER_DAY)
+    # Integer division truncates towards zero; future times round down to the previous day
+    inexact_negative = pc.and_(pc.less(elapsed, 0), pc.not_equal(pc.multiply(days, NS_PER_DAY), elapsed))
+    return pc.if_else(inexact_negative, pc.subtract(days, 1), days)
 
-    # Extract file extension from path
-    chunk['file_extension'] = chunk['path'].str.extract(r'(\.[^./\\]+)$', expand=False).str.lower()
+def process_chunk(table, current_date, date_pattern, max_remaining_levels=3):
+    """
+    Enrich one chunk of a scan with Arrow compute kernels. Path components are split once per
+    unique directory (the dictionary of the encoded directory column) and every per-file column
+    is a dictionary array whose codes are gathered through the directory codes.
 
-    # Extract filename with and without extension
-    chunk['filename_with_extension'] = chunk['path'].str.split(r'[/\\]').str[-1]
-    chunk['filename_without_extension'] = chunk['filename_with_extension'].str.replace(r'\.[^./\\]+$', '', regex=True)
+    Args:
+        table (pa.Table): Scan rows with 'path' (or pathcodec's encoded columns) and the times.
+        current_date (pd.Timestamp): Date the days since access, modify and change count to.
+        date_pattern (str): Departments matching this regular expression become 'chassis'.
+        max_remaining_levels (int): Directories below the department kept as columns.
 
-    # Split the path into components and remove empty strings
-    path_components = chunk['path'].str.split(r'[/\\]+').apply(lambda x: [i for i in x if i])
+    Returns:
+        pa.Table: The enriched chunk.
+    """
+    # Remove the file_type column if it exists
+    if 'file_type' in table.column_names:
+        table = table.drop_columns(['file_type'])
+
+    # Paths as interned directories, file names and extensions (see pathcodec)
+    table = encode_table(table)
+
+    # Calculate days since last access, modify, and change
+    for column, source in (('days_since_last_access', 'access_time'), ('days_since_last_modify', 'modify_time'), ('days_since_last_change', 'change_time')):
+        table = table.append_column(column, days_since(table.column(source), current_date))
 
-    # Convert the list of components into a DataFrame
-    path_df = pd.DataFrame(path_components.tolist())
+    directory = table.column('directory').combine_chunks()
+    names = table.column('name').combine_chunks()
 
-    # Assign column names for clarity
-    path_df.columns = [f'level_{i}' for i in range(path_df.shape[1])]
+    # Path components of every unique directory, empty ones (leading '/', '//') left out
+    parts = pc.split_pattern(directory.dictionary, '/')
+    components = pc.list_flatten(parts)
+    nonempty = pc.not_equal(components, '')
+    parents = pc.list_parent_indices(parts).filter(nonempty).to_numpy()
+    components = components.filter(nonempty)
+    dir_lengths = np.bincount(parents, minlength=len(directory.dictionary))
+    dir_offsets = np.cumsum(dir_lengths) - dir_lengths
 
-    # Ensure path_df has at least 4 columns (mount_point, season, event, department)
-    for i in range(4):
-        level = f'level_{i}'
-        if level not in path_df.columns:
-            path_df[level] = pd.NA
+    def component(index):
+        # index-th component of every unique directory (null when it is shallower)
+        return components.take(pa.array(dir_offsets + index, mask=dir_lengths <= index))
 
-    # Extract mount_point, season, event, and department based on directory structure
-    chunk['mount_point'] = path_df['level_0'].astype(pd.StringDtype())
-    chunk['season'] = path_df['level_1'].astype(pd.StringDtype())
-    chunk['event'] = path_df['level_2'].astype(pd.StringDtype())
-    chunk['department'] = path_df['level_3'].astype(pd.StringDtype())
+    # Rows: files without a directory have no components
+    dir_codes = pc.fill_null(directory.indices, len(directory.dictionary)).to_numpy()
+    row_lengths = np.append(dir_lengths, 0)[dir_codes]
+    has_name = pc.fill_null(pc.not_equal(names, ''), False).to_numpy(zero_copy_only=False)
 
-    # Identify departments that are dates and replace them with 'chassis'
-    matches = chunk['department'].str.match(date_pattern, na=False)
-    chunk['department'] = chunk['department'].where(~matches, 'chassis')
+    # Extract file extension and filename with and without extension
+    extension = table.column('extension').combine_chunks()
+    table = table.append_column('file_extension', remap_dictionary(extension, pc.binary_join_element_wise('.', extension.dictionary, '')))
+    table = table.append_column('filename_with_extension', names)
+    table = table.append_column('filename_without_extension', pc.replace_substring_regex(names, r'\.[^./\\]+$', ''))
 
-    # Extract remaining directories excluding the filename
-    # remaining_dirs is a list of directories after mount_point, season, event, department, and before the filename
-    remaining_dirs = path_components.str[4:-1]
+    # Extract mount_point, season, event, and department based on directory structure;
+    # a file right below a level takes that level's place
+    levels = {}
+    for index, column in enumerate(['mount_point', 'season', 'event', 'department']):
+        levels[column] = remap_dictionary(directory, component(index))
+        is_file_name = (row_lengths == index) & has_name
+        if is_file_name.any():
+            levels[column] = pc.if_else(pa.array(is_file_name), names, levels[column].dictionary_decode()).dictionary_encode()
 
-    # Expand remaining_dirs into separate columns
-    remaining_dirs_expanded = pd.DataFrame(remaining_dirs.tolist(), index=chunk.index)
+    # Identify departments that are dates and replace them with 'chassis' (once per unique value)
+    departments = levels['department'].dictionary
+    levels['department'] = remap_dictionary(
+        levels['department'], pc.if_else(pc.match_substring_regex(departments, date_pattern), 'chassis', departments)
+    )
+    for column, values in levels.items():
+        table = table.append_column(column, values)
 
-    # Assign remaining_level_1, remaining_level_2, remaining_level_3 with StringDtype
+    # Extract remaining directories excluding the filename: the directories after mount_point,
+    # season, event and department (for paths ending in '/' the last directory is left out)
     for i in range(max_remaining_levels):
-        column_name = f'remaining_level_{i+1}'
-        if i in remaining_dirs_expanded.columns:
-            chunk[column_name] = remaining_dirs_expanded[i].astype(pd.StringDtype())
-        else:
-            chunk[column_name] = pd.Series([pd.NA] * len(chunk), dtype=pd.StringDtype())
+        values = remap_dictionary(directory, component(4 + i))
+        is_last = pa.array(~has_name & (row_lengths == 5 + i))
+        codes = pc.if_else(is_last, pa.scalar(None, pa.int32()), values.indices)
+        table = table.append_column(f'remaining_level_{i+1}', pa.DictionaryArray.from_arrays(codes, values.dictionary))
 
-    return chunk
+    return table
 
-def main():
-    if len(sys.argv) != 3:
-        print("Usage: python parqConverter.py input.csv output.parquet")
-        sys.exit(1)
+def read_tables(input_file, chunk_rows):
+    """
+    Yield the input as Arrow tables of chunk_rows rows (the last one may be shorter).
+    """
+    # megacollector --format parquet output already has native int64 sizes and
+    # timestamp columns, so it is read row group by row group without date parsing
+    if input_file.endswith('.parquet'):
+        for batch in pq.ParquetFile(input_file).iter_batches(batch_size=chunk_rows):
+            yield pa.Table.from_batches([batch])
+        return
 
-    input_file = sys.argv[1]
-    output_file = sys.argv[2]
+    # The streaming CSV reader parses blocks on Arrow's own threads; the times are parsed
+    # straight into timestamp[ns] columns, like pd.read_csv(parse_dates=[...]) did
+    column_types = {column: pa.timestamp('ns') for column in TIME_COLUMNS}
+    column_types.update({'path': pa.string(), 'size': pa.int64(), 'file_type': pa.string()})
+    reader = csv.open_csv(input_file, convert_options=csv.ConvertOptions(column_types=column_types))
+    pending = []
+    pending_rows = 0
+    for batch in reader:
+        pending.append(batch)
+        pending_rows += batch.num_rows
+        if pending_rows >= chunk_rows:
+            table = pa.Table.from_batches(pending)
+            while table.num_rows >= chunk_rows:
+                yield table.slice(0, chunk_rows)
+                table = table.slice(chunk_rows)
+            pending = table.to_batches()
+            pending_rows = table.num_rows
+    if pending_rows:
+        yield pa.Table.from_batches(pending)
 
-    # Define the chunk size (e.g., 1 million rows per chunk)
-    chunksize = 10 ** 6
+def sort_for_partitions(table):
+    """
+    Give the partition columns plain string values (the directory names) and sort the chunk by
+    them and then by days_since_last_access, so every partition receives one contiguous run
+    and its row groups cover narrow access-age ranges for min/max pruning.
+    """
+    for column in PARTITION_COLUMNS:
+        table = table.set_column(table.column_names.index(column), column, table.column(column).cast(pa.string()))
+    return table.sort_by([(column, 'ascending') for column in PARTITION_COLUMNS + ['days_since_last_access']])
 
-    # Current date for calculating days since last access, modify, and change
-    current_date = pd.to_datetime(datetime.now())
+def convert_table(table, current_date, date_pattern, partition=False):
+    """
+    Pool worker: process_chunk() on one Arrow table, sorted for a partitioned output.
+    """
+    table = process_chunk(table, current_date, date_pattern)
+    return sort_for_partitions(table) if partition else table
+
+def convert_tables(tables, executor, max_in_flight, current_date, date_pattern, partition=False):
+    """
+    Yield the converted tables in input order, with at most max_in_flight chunks submitted
+    to the process pool at a time (converted in this thread without a pool).
+    """
+    if executor is None:
+        for table in tables:
+            yield convert_table(table, current_date, date_pattern, partition)
+        return
+    in_flight = deque()
+    for table in tables:
+        in_flight.append(executor.submit(convert_table, table, current_date, date_pattern, partition))
+        if len(in_flight) >= max_in_flight:
+            yield in_flight.popleft().result()
+    while in_flight:
+        yield in_flight.popleft().result()
+
+def background(iterable, maxsize):
+    """
+    Run an iterable in a daemon thread and yield its items through a bounded queue,
+    so the stage producing them keeps working while the consumer is busy.
+    Exceptions are re-raised in the consumer.
+    """
+    items = queue.Queue(maxsize=maxsize)
+    done = object()
+
+    def produce():
+        try:
+            for item in iterable:
+                items.put(item)
+        except BaseException as e:
+            items.put(e)
+        finally:
+            items.put(done)
+
+    threading.Thread(target=produce, daemon=True).start()
+    while True:
+        item = items.get()
+        if item is done:
+            return
+        if isinstance(item, BaseException):
+            raise item
+        yield item
 
+class RowGroupWriter:
+    """
+    Stream tables into a Parquet file in row groups of exactly row_group_size rows
+    (except the last), however the tables are chunked.
+    """
+    def __init__(self, path, row_group_size, compression, compression_level=None):
+        self.path = path
+        self.row_group_size = row_group_size
+        self.compression = compression
+        self.compression_level = compression_level
+        self.writer = None
+        self.pending = []
+        self.pending_rows = 0
+        self.rows = 0
+
+    def write(self, table):
+        self.pending.append(table)
+        self.pending_rows += table.num_rows
+        if self.pending_rows >= self.row_group_size:
+            self.flush(final=False)
+
+    def flush(self, final):
+        if not self.pending_rows:
+            return
+        table = pa.concat_tables(self.pending)
+        if self.writer is None:
+            self.writer = pq.ParquetWriter(
+                self.path, table.schema, compression=self.compression, compression_level=self.compression_level
+            )
+        complete = table.num_rows if final else table.num_rows - table.num_rows % self.row_group_size
+        self.writer.write_table(table.slice(0, complete), row_group_size=self.row_group_size)
+        self.rows += complete
+        rest = table.slice(complete)
+        self.pending = [rest] if rest.num_rows else []
+        self.pending_rows = rest.num_rows
+
+    def close(self):
+        self.flush(final=True)
+        if self.writer is not None:
+            self.writer.close()
+
+def write_partitioned(tables, output_dir, row_group_size, compression, compression_level=None, progress=None):
+    """
+    Write tables as a hive-partitioned dataset: output_dir/season=<s>/event=<e>/department=<d>/part-N.parquet,
+    with null keys in __HIVE_DEFAULT_PARTITION__ directories. The partition columns are
+    stored in the directory names only; scanfilter reads them back.
+
+    Returns:
+        int: Rows written.
+    """
+    tables = iter(tables)
+    first = next(tables, None)
+    if first is None:
+        return 0
+    rows = 0
+
+    def batches():
+        nonlocal rows
+        for i, table in enumerate(chain([first], tables), start=1):
+            yield from table.to_batches()
+            rows += table.num_rows
+            if progress:
+                progress(i, table.num_rows, rows)
+
+    ds.write_dataset(
+        batches(), output_dir, schema=first.schema, format='parquet', partitioning=PARTITIONING,
+        basename_template='part-{i}.parquet',
+        file_options=ds.ParquetFileFormat().make_write_options(compression=compression, compression_level=compression_level),
+        min_rows_per_group=min(row_group_size, PARTITION_MIN_ROWS_PER_GROUP), max_rows_per_group=row_group_size,
+        max_partitions=MAX_PARTITIONS, existing_data_behavior='delete_matching',
+    )
+    return rows
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(
+        description='Convert a megacollector scan (CSV or Parquet) into an enriched Parquet file, '
+                    'reading, converting and writing chunks in a pipeline.'
+    )
+    parser.add_argument('input_file', help='Scan to convert (.csv or .parquet)')
+    parser.add_argument('output_file', help='Parquet file to write (a dataset directory with --partition)')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='Processes converting chunks (default: all cores; 1 converts in the main process)')
+    parser.add_argument('--chunk_rows', type=int, default=1000000, help='Rows per converted chunk (default: 1000000)')
+    parser.add_argument('--row_group_size', type=int, default=1000000, help='Rows per Parquet row group (default: 1000000)')
+    parser.add_argument('--compression', default='snappy', choices=['snappy', 'zstd', 'gzip', 'brotli', 'lz4', 'none'], help='Parquet compression codec (default: snappy)')
+    parser.add_argument('--compression_level', type=int, default=None, help='Codec-specific compression level (zstd, gzip, brotli)')
+    parser.add_argument('--partition', action='store_true', help='Write a hive-partitioned dataset directory (season=/event=/department=) with sorted row groups, so analyzers reading it with --filter skip the partitions they do not need')
+    return parser.parse_args()
+
+def convert(input_file, output_file, current_date, workers, chunk_rows, row_group_size, compression,
+            compression_level=None, partition=False, progress=None):
+    """
+    Convert a scan into an enriched Parquet file (a partitioned dataset directory with partition):
+    reader -> process pool -> ordered writer, every stage with a bounded number of chunks waiting,
+    so memory stays at a few chunks per worker.
+
+    Args:
+        progress (callable): Called as progress(chunk_index, chunk_rows, rows_so_far) per written chunk.
+
+    Returns:
+        int: Rows written.
+    """
     # Define the date pattern for department (YYYY-MM)
     date_pattern = r'^\d{4}-\d{2}$'
 
-    # Initialize Parquet writer
-    parquet_writer = None
+    max_in_flight = CHUNKS_PER_WORKER * workers
+    executor = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+    writer = None if partition else RowGroupWriter(output_file, row_group_size, compression, compression_level)
+    try:
+        chunks = background(read_tables(input_file, chunk_rows), max_in_flight)
+        tables = background(convert_tables(chunks, executor, max_in_flight, current_date, date_pattern, partition), 2)
+        if partition:
+            rows = write_partitioned(tables, output_file, row_group_size, compression, compression_level, progress)
+        else:
+            for i, table in enumerate(tables, start=1):
+                writer.write(table)
+                if progress:
+                    progress(i, table.num_rows, writer.rows + writer.pending_rows)
+    finally:
+        if writer is not None:
+            writer.close()
+            rows = writer.rows
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+    return rows
 
-    print("Processing CSV in chunks...")
-    for i, chunk in enumerate(pd.read_csv(
-        input_file,
-        parse_dates=['access_time', 'modify_time', 'change_time'],
-        low_memory=False,
-        chunksize=chunksize
-    ), start=1):
-        print(f"Processing chunk {i} with {len(chunk)} rows...")
+def main():
+    args = parse_arguments()
 
-        # Process the current chunk
-        processed_chunk = process_chunk(chunk, current_date, date_pattern)
+    # Current date for calculating days since last access, modify, and change
+    current_date = pd.to_datetime(datetime.now())
 
-        # Convert the processed chunk to an Arrow table
-        table = pa.Table.from_pandas(processed_chunk, preserve_index=False)
+    start = time.perf_counter()
+    print(f"Processing input in chunks of {args.chunk_rows} rows with {args.workers} workers...")
 
-        # Initialize ParquetWriter if it's the first chunk
-        if parquet_writer is None:
-            parquet_writer = pq.ParquetWriter(output_file, table.schema)
-        
-        # Write the table to the Parquet file
-        parquet_writer.write_table(table)
+    def progress(i, chunk_rows, rows):
+        print(f"Converted chunk {i} with {chunk_rows} rows ({rows / (time.perf_counter() - start):,.0f} rows/s)...")
 
-    # Close the Parquet writer
-    if parquet_writer is not None:
-        parquet_writer.close()
+    rows = convert(
+        args.input_file, args.output_file, current_date, args.workers, args.chunk_rows, args.row_group_size,
+        args.compression, args.compression_level, args.partition, progress
+    )
 
-    print("Processing complete. Parquet file created.")
+    elapsed = time.perf_counter() - start
+    output = 'Partitioned dataset' if args.partition else 'Parquet file'
+    print(f"Processing complete. {output} created with {rows} rows in {elapsed:.1f} seconds ({rows / elapsed:,.0f} rows/s).")
 
 if __name__ == '__main__':
     main()
@@ -1,4 +1,14 @@
+import sys
+import argparse
+import logging
 import pandas as pd
+from scanfilter import parse_filters, read_table
+
+parser = argparse.ArgumentParser(description='Show the schema and a random sample of a Parquet file or partitioned dataset.')
+parser.add_argument('parquet_file', nargs='?', default='race2024.parquet', help='Parquet file or partitioned dataset directory (default: race2024.parquet)')
+parser.add_argument('--filter', action='append', default=[], help='Only read files matching column<op>value, e.g. season=2024 (repeatable; a=x,y matches either).')
+args = parser.parse_args()
+logging.basicConfig(level=logging.INFO, format='%(message)s')
 
 # Set display options to prevent truncation
 pd.set_option('display.max_columns', None)      # Display all columns
@@ -7,11 +17,14 @@ pd.set_option('display.max_colwidth', 50)       # Do not truncate column content
 pd.set_option('display.width', None)            # Auto-detect the display width
 
 # Read the Parquet file
-df = pd.read_parquet('race2024.parquet')
+try:
+    df = read_table(args.parquet_file, parse_filters(args.filter)).to_pandas()
+except ValueError as e:
+    sys.exit(f"Error: {e}")
 
 # Display basic information
 print(df.info())
 
 # Sample 100 random rows and display them
-random_sample = df.sample(n=100, random_state=1)  # Use random_state for reproducibility
+random_sample = df.sample(n=min(100, len(df)), random_state=1)  # Use random_state for reproducibility
 print(random_sample)
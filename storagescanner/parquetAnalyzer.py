@@ -1,10 +1,35 @@
-import pandas as pd
 import os
+import sys
+import argparse
+import logging
+import numpy as np
+import pandas as pd
+from scanfilter import parse_filters, read_table
 
 # Configuration
 PARQUET_FILE_PATH = 'allseasons.parquet'  # Replace with your actual Parquet file path
 HOT_THRESHOLD = 30    # Days since last access to be considered "Hot"
 COLD_THRESHOLD = 180  # Days since last access to be considered "Cold"
+OUTPUT_DIR = 'output_pivot_tables'
+
+# Access statuses in report order
+ACCESS_STATUSES = ['Hot', 'Warm', 'Cold']
+# Group keys of the one size aggregation every summary and pivot table is derived from
+GROUP_KEYS = ['season', 'department', 'file_extension', 'access_status']
+# Columns read when the full data is not dumped
+ANALYSIS_COLUMNS = ['season', 'department', 'file_extension', 'days_since_last_access', 'size']
+
+SIZE_UNITS = np.array(['', 'K', 'M', 'G', 'T', 'P', 'E', 'Z', 'Y'])
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description='Hot/warm/cold summary and pivot tables of a parqConverter output.')
+    parser.add_argument('parquet_file', nargs='?', default=PARQUET_FILE_PATH, help=f'Parquet file or partitioned dataset directory (default: {PARQUET_FILE_PATH})')
+    parser.add_argument('--filter', action='append', default=[], help='Only read files matching column<op>value, e.g. season=2024 (repeatable; a=x,y matches either). Partitions and row groups that cannot match are skipped.')
+    parser.add_argument('--hot_threshold', type=int, default=HOT_THRESHOLD, help=f'Days since last access up to which data is hot (default: {HOT_THRESHOLD})')
+    parser.add_argument('--cold_threshold', type=int, default=COLD_THRESHOLD, help=f'Days since last access from which data is cold (default: {COLD_THRESHOLD})')
+    parser.add_argument('--output_dir', default=OUTPUT_DIR, help=f'Directory of the exported tables (default: {OUTPUT_DIR})')
+    parser.add_argument('--dump_data', action='store_true', help='Also write every row with its access_status to processed_data_with_status.parquet (reads all columns)')
+    return parser.parse_args()
 
 # Function to convert bytes to human-readable format
 def bytes_to_human_readable(num, suffix='B'):
@@ -24,158 +49,194 @@ def bytes_to_human_readable(num, suffix='B'):
         num /= 1024.0
     return f"{num:.1f}Y{suffix}"
 
-# Read the Parquet file
-print("Reading the Parquet file...")
-df = pd.read_parquet(PARQUET_FILE_PATH)
+def human_readable_table(table, suffix='B'):
+    """
+    bytes_to_human_readable() of every cell of a numeric DataFrame, in array operations.
 
-# Display basic information
-print("\nDataFrame Info:")
-print(df.info())
+    Parameters:
+    - table (pd.DataFrame): Byte values.
 
-print("\nSample Data:")
-print(df.head())
+    Returns:
+    - pd.DataFrame: Strings with the same index and columns.
+    """
+    values = table.to_numpy(dtype=np.float64)
+    # Number of times a value is divided by 1024 until it is below 1024 (at most 8, for 'Y')
+    exponents = np.zeros(values.shape, dtype=np.int64)
+    magnitude = np.abs(values)
+    for _ in range(len(SIZE_UNITS) - 1):
+        larger = magnitude >= 1024.0
+        if not larger.any():
+            break
+        exponents += larger
+        magnitude = np.where(larger, magnitude / 1024.0, magnitude)
+    scaled = values / np.power(1024.0, exponents)
+    formats = np.where(exponents < len(SIZE_UNITS) - 1, '%3.1f', '%.1f')
+    strings = np.char.add(np.char.add(np.char.mod(formats, scaled), SIZE_UNITS[exponents]), suffix)
+    return pd.DataFrame(strings, index=table.index, columns=table.columns)
 
-# Define Hot, Warm, and Cold Status
 def categorize_hot_cold(days, hot_threshold=HOT_THRESHOLD, cold_threshold=COLD_THRESHOLD):
-    if days <= hot_threshold:
-        return 'Hot'
-    elif days >= cold_threshold:
-        return 'Cold'
-    else:
-        return 'Warm'
-
-print("\nCategorizing data into Hot, Warm, and Cold based on days_since_last_access...")
-df['access_status'] = df['days_since_last_access'].apply(categorize_hot_cold)
-
-# Handle negative days_since_last_access if any
-negative_days = df[df['days_since_last_access'] < 0]
-if not negative_days.empty:
-    print(f"\nFound {len(negative_days)} entries with negative days_since_last_access. Setting them to 0.")
-    df.loc[df['days_since_last_access'] < 0, 'days_since_last_access'] = 0
-    df['access_status'] = df['days_since_last_access'].apply(categorize_hot_cold)
-
-# Summary Statistics based on Total Size
-print("\nGenerating summary statistics based on total size...")
-
-summary = df.groupby('access_status').agg(
-    total_size_bytes=pd.NamedAgg(column='size', aggfunc='sum'),
-    average_size_bytes=pd.NamedAgg(column='size', aggfunc='mean'),
-    median_size_bytes=pd.NamedAgg(column='size', aggfunc='median'),
-    max_size_bytes=pd.NamedAgg(column='size', aggfunc='max'),
-    min_size_bytes=pd.NamedAgg(column='size', aggfunc='min')
-).reset_index()
-
-# Convert sizes to human-readable format
-summary['total_size'] = summary['total_size_bytes'].apply(bytes_to_human_readable)
-summary['average_size'] = summary['average_size_bytes'].apply(bytes_to_human_readable)
-summary['median_size'] = summary['median_size_bytes'].apply(bytes_to_human_readable)
-summary['max_size'] = summary['max_size_bytes'].apply(bytes_to_human_readable)
-summary['min_size'] = summary['min_size_bytes'].apply(bytes_to_human_readable)
-
-# Drop the original byte columns
-summary = summary.drop(columns=['total_size_bytes', 'average_size_bytes', 'median_size_bytes', 'max_size_bytes', 'min_size_bytes'])
-
-print("\nSummary Statistics by Access Status (Based on Total Size):")
-print(summary)
-
-# Pivot Tables based on Total Size
-
-# 1. Total Size by File Extension and Department
-print("\nCreating Pivot Table: Total Size by File Extension and Department...")
-pivot_extension_department = df.pivot_table(
-    index='file_extension',
-    columns='department',
-    values='size',
-    aggfunc='sum'
-).fillna(0)
-
-# Convert to human-readable format
-pivot_extension_department_hr = pivot_extension_department.applymap(bytes_to_human_readable)
-
-# Sort by overall total size
-pivot_extension_department['overall_total_size'] = pivot_extension_department.sum(axis=1)
-pivot_extension_department_sorted = pivot_extension_department.sort_values(by='overall_total_size', ascending=False).drop(columns='overall_total_size')
-pivot_extension_department_hr_sorted = pivot_extension_department_sorted.applymap(bytes_to_human_readable)
-
-print("\nPivot Table: Total Size by File Extension and Department")
-print(pivot_extension_department_hr_sorted)
-
-# 2. Total Size of Hot, Warm, Cold Files by Season
-print("\nCreating Pivot Table: Total Size of Hot, Warm, Cold Files by Season...")
-pivot_season_status = df.pivot_table(
-    index='season',
-    columns='access_status',
-    values='size',
-    aggfunc='sum'
-).fillna(0)
-
-# Convert to human-readable format
-pivot_season_status_hr = pivot_season_status.applymap(bytes_to_human_readable)
-
-print("\nPivot Table: Total Size of Hot, Warm, Cold Files by Season")
-print(pivot_season_status_hr)
-
-# 3. Total Size of Files by File Extension and Access Status
-print("\nCreating Pivot Table: Total File Size by File Extension and Access Status...")
-pivot_size_extension_status = df.pivot_table(
-    index='file_extension',
-    columns='access_status',
-    values='size',
-    aggfunc='sum'
-).fillna(0)
-
-# Convert to human-readable format
-pivot_size_extension_status_hr = pivot_size_extension_status.applymap(bytes_to_human_readable)
-
-# Sort by 'Hot' size descending
-if 'Hot' in pivot_size_extension_status_hr.columns:
-    pivot_size_extension_status_hr_sorted = pivot_size_extension_status_hr.sort_values(by='Hot', ascending=False)
-else:
-    pivot_size_extension_status_hr_sorted = pivot_size_extension_status_hr
-
-print("\nPivot Table: Total File Size by File Extension and Access Status")
-print(pivot_size_extension_status_hr_sorted)
-
-# 4. Total Size of Files by Department and Access Status
-print("\nCreating Pivot Table: Total Size of Files by Department and Access Status...")
-pivot_department_status = df.pivot_table(
-    index='department',
-    columns='access_status',
-    values='size',
-    aggfunc='sum'
-).fillna(0)
-
-# Convert to human-readable format
-pivot_department_status_hr = pivot_department_status.applymap(bytes_to_human_readable)
-
-# Sort by 'Hot' size descending
-if 'Hot' in pivot_department_status_hr.columns:
-    pivot_department_status_hr_sorted = pivot_department_status_hr.sort_values(by='Hot', ascending=False)
-else:
-    pivot_department_status_hr_sorted = pivot_department_status_hr
-
-print("\nPivot Table: Total Size of Files by Department and Access Status")
-print(pivot_department_status_hr_sorted)
-
-# Export Pivot Tables to CSV with Human-Readable Sizes
-print("\nExporting pivot tables to CSV files with human-readable sizes...")
-
-# Ensure the output directory exists
-output_dir = 'output_pivot_tables'
-os.makedirs(output_dir, exist_ok=True)
-
-# Save pivot tables
-pivot_extension_department_hr_sorted.to_csv(os.path.join(output_dir, 'pivot_extension_department_hr.csv'))
-pivot_season_status_hr.to_csv(os.path.join(output_dir, 'pivot_season_status_hr.csv'))
-pivot_size_extension_status_hr_sorted.to_csv(os.path.join(output_dir, 'pivot_size_extension_status_hr.csv'))
-pivot_department_status_hr_sorted.to_csv(os.path.join(output_dir, 'pivot_department_status_hr.csv'))
-summary.to_csv(os.path.join(output_dir, 'summary_statistics_hr.csv'), index=False)
-
-print(f"Pivot tables exported to the '{output_dir}' directory.")
-
-# Optional: Save the updated DataFrame with access_status and human-readable size
-print("\nSaving processed data with access_status and human-readable size...")
-df['size_hr'] = df['size'].apply(bytes_to_human_readable)
-processed_output_path = os.path.join(output_dir, 'processed_data_with_status_hr.csv')
-df.to_csv(processed_output_path, index=False)
-print(f"Processed data saved to '{processed_output_path}'.")
+    """
+    Access status of every file: 'Hot' up to hot_threshold days since last access, 'Cold' from
+    cold_threshold days, 'Warm' otherwise (including unknown ages).
+
+    Parameters:
+    - days (pd.Series): Days since last access.
+
+    Returns:
+    - pd.Categorical: Statuses in ACCESS_STATUSES order.
+    """
+    days = days.to_numpy(dtype=np.float64)
+    codes = np.select([days <= hot_threshold, days >= cold_threshold], [0, 2], default=1)
+    return pd.Categorical.from_codes(codes, categories=ACCESS_STATUSES)
+
+def group_sizes(df):
+    """
+    Total size, file count, smallest and largest file per GROUP_KEYS combination that occurs,
+    missing keys included as their own group.
+
+    Returns:
+    - pd.DataFrame: One row per group with GROUP_KEYS and total_size_bytes, file_count,
+      min_size_bytes and max_size_bytes columns.
+    """
+    return df.groupby(GROUP_KEYS, observed=True, dropna=False)['size'].agg(
+        total_size_bytes='sum', file_count='count', min_size_bytes='min', max_size_bytes='max'
+    ).reset_index()
+
+def pivot_sizes(groups, index, columns):
+    """
+    Total size per (index, columns) pair from group_sizes(), like df.pivot_table(index=index,
+    columns=columns, values='size', aggfunc='sum').fillna(0) but without another pass over the files.
+    """
+    keyed = groups.dropna(subset=[index, columns])
+    table = keyed.groupby([index, columns], observed=True)['total_size_bytes'].sum().unstack(fill_value=0)
+    table.columns = pd.Index(list(table.columns), name=columns)
+    if columns == 'access_status':
+        # Alphabetical, as when the statuses were plain strings
+        table = table.sort_index(axis=1)
+    return table.rename_axis(index=index).astype(np.float64)
+
+def summarize(groups, df):
+    """
+    Total, average, median, largest and smallest file size per access status.
+    """
+    by_status = groups.groupby('access_status', observed=True).agg(
+        total_size_bytes=('total_size_bytes', 'sum'),
+        file_count=('file_count', 'sum'),
+        max_size_bytes=('max_size_bytes', 'max'),
+        min_size_bytes=('min_size_bytes', 'min'),
+    )
+    # Alphabetical, as when the statuses were plain strings
+    by_status = by_status.sort_index(key=lambda statuses: statuses.astype(str))
+    by_status['average_size_bytes'] = by_status['total_size_bytes'] / by_status['file_count']
+    # The median is the one statistic that cannot be combined from the groups
+    by_status['median_size_bytes'] = df.groupby('access_status', observed=True)['size'].median()
+    summary = human_readable_table(by_status[['total_size_bytes', 'average_size_bytes', 'median_size_bytes', 'max_size_bytes', 'min_size_bytes']])
+    summary.columns = ['total_size', 'average_size', 'median_size', 'max_size', 'min_size']
+    return summary.reset_index()
+
+def sort_by_hot(table):
+    """
+    Rows in decreasing order of their hot size (as numbers, not as formatted strings).
+    """
+    if 'Hot' not in table.columns:
+        return table
+    return table.sort_values(by='Hot', ascending=False, kind='stable')
+
+def main():
+    args = parse_arguments()
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+
+    # Read the Parquet file
+    print("Reading the Parquet file...")
+    try:
+        df = read_table(args.parquet_file, parse_filters(args.filter), columns=None if args.dump_data else ANALYSIS_COLUMNS).to_pandas()
+    except ValueError as e:
+        sys.exit(f"Error: {e}")
+
+    # Display basic information
+    print("\nDataFrame Info:")
+    df.info()
+
+    print("\nSample Data:")
+    print(df.head())
+
+    # Handle negative days_since_last_access if any
+    negative_days = df['days_since_last_access'] < 0
+    if negative_days.any():
+        print(f"\nFound {negative_days.sum()} entries with negative days_since_last_access. Setting them to 0.")
+        df['days_since_last_access'] = df['days_since_last_access'].clip(lower=0)
+
+    print("\nCategorizing data into Hot, Warm, and Cold based on days_since_last_access...")
+    df['access_status'] = categorize_hot_cold(df['days_since_last_access'], args.hot_threshold, args.cold_threshold)
+
+    # One pass over the files; the summary and all pivot tables are derived from the groups
+    print("\nAggregating sizes by season, department, file extension and access status...")
+    groups = group_sizes(df)
+
+    # Summary Statistics based on Total Size
+    print("\nGenerating summary statistics based on total size...")
+    summary = summarize(groups, df)
+
+    print("\nSummary Statistics by Access Status (Based on Total Size):")
+    print(summary)
+
+    # 1. Total Size by File Extension and Department, sorted by overall total size
+    print("\nCreating Pivot Table: Total Size by File Extension and Department...")
+    pivot_extension_department = pivot_sizes(groups, 'file_extension', 'department')
+    pivot_extension_department = pivot_extension_department.loc[
+        pivot_extension_department.sum(axis=1).sort_values(ascending=False, kind='stable').index
+    ]
+    pivot_extension_department_hr_sorted = human_readable_table(pivot_extension_department)
+
+    print("\nPivot Table: Total Size by File Extension and Department")
+    print(pivot_extension_department_hr_sorted)
+
+    # 2. Total Size of Hot, Warm, Cold Files by Season
+    print("\nCreating Pivot Table: Total Size of Hot, Warm, Cold Files by Season...")
+    pivot_season_status_hr = human_readable_table(pivot_sizes(groups, 'season', 'access_status'))
+
+    print("\nPivot Table: Total Size of Hot, Warm, Cold Files by Season")
+    print(pivot_season_status_hr)
+
+    # 3. Total Size of Files by File Extension and Access Status, sorted by 'Hot' size descending
+    print("\nCreating Pivot Table: Total File Size by File Extension and Access Status...")
+    pivot_size_extension_status_hr_sorted = human_readable_table(sort_by_hot(pivot_sizes(groups, 'file_extension', 'access_status')))
+
+    print("\nPivot Table: Total File Size by File Extension and Access Status")
+    print(pivot_size_extension_status_hr_sorted)
+
+    # 4. Total Size of Files by Department and Access Status, sorted by 'Hot' size descending
+    print("\nCreating Pivot Table: Total Size of Files by Department and Access Status...")
+    pivot_department_status_hr_sorted = human_readable_table(sort_by_hot(pivot_sizes(groups, 'department', 'access_status')))
+
+    print("\nPivot Table: Total Size of Files by Department and Access Status")
+    print(pivot_department_status_hr_sorted)
+
+    # Export Pivot Tables to CSV with Human-Readable Sizes
+    print("\nExporting pivot tables to CSV files with human-readable sizes...")
+
+    # Ensure the output directory exists
+    os.makedirs(args.output_dir, exist_ok=True)
+
+    # Save pivot tables
+    pivot_extension_department_hr_sorted.to_csv(os.path.join(args.output_dir, 'pivot_extension_department_hr.csv'))
+    pivot_season_status_hr.to_csv(os.path.join(args.output_dir, 'pivot_season_status_hr.csv'))
+    pivot_size_extension_status_hr_sorted.to_csv(os.path.join(args.output_dir, 'pivot_size_extension_status_hr.csv'))
+    pivot_department_status_hr_sorted.to_csv(os.path.join(args.output_dir, 'pivot_department_status_hr.csv'))
+    summary.to_csv(os.path.join(args.output_dir, 'summary_statistics_hr.csv'), index=False)
+
+    # The groups hold every pivot in byte values, for further analysis without rereading the data
+    groups_path = os.path.join(args.output_dir, 'size_by_group.parquet')
+    groups.to_parquet(groups_path, index=False)
+
+    print(f"Pivot tables exported to the '{args.output_dir}' directory; sizes per group in bytes in '{groups_path}'.")
+
+    # Optional: Save the data with access_status
+    if args.dump_data:
+        print("\nSaving processed data with access_status...")
+        processed_output_path = os.path.join(args.output_dir, 'processed_data_with_status.parquet')
+        df.to_parquet(processed_output_path, index=False)
+        print(f"Processed data saved to '{processed_output_path}'.")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+Dictionary encoding of file paths, shared by megacollector and the analyzers.
+
+A scan repeats the same directories (/mnt/Race2024/<season>/<event>/<department>/...)
+for millions of files. Instead of one path string per file, every file is stored as
+
+    directory  dictionary-encoded directory (an int32 code into the table of unique directories)
+    name       the file name
+    extension  dictionary-encoded lower-case extension without the dot (null when there is none)
+
+megacollector writes these columns in place of 'path' in its Parquet output, where
+they stay dictionary pages, and they arrive in pandas as Categoricals whose categories
+are the directory table. Everything derived from a directory (its depth, its first
+components, a leaf name) is then computed once per unique directory and gathered
+through the codes. A plain 'path' column (CSV scans, older Parquet files) is encoded
+with the same Arrow kernels on load.
+
+Only pyarrow is required, so the scanner can use this module as well.
+"""
+import pyarrow as pa
+import pyarrow.compute as pc
+
+PATH_COLUMNS = ['directory', 'name', 'extension']
+
+PATH_SCHEMA = pa.schema([
+    ('directory', pa.dictionary(pa.int32(), pa.string())),
+    ('name', pa.string()),
+    ('extension', pa.dictionary(pa.int32(), pa.string())),
+])
+
+def split_paths(paths):
+    """
+    Encode an array of paths in a few vectorized passes.
+
+    Args:
+        paths (pa.Array or pa.ChunkedArray): Path strings; '\\' is read as a separator like '/'.
+            Null paths give null names.
+
+    Returns:
+        list: Arrays for PATH_COLUMNS. Paths without any separator have a null directory;
+            '/file' has the directory ''.
+    """
+    if isinstance(paths, pa.ChunkedArray):
+        paths = paths.combine_chunks()
+    paths = paths.cast(pa.string())
+    if pc.any(pc.match_substring(paths, '\\')).as_py():
+        paths = pc.replace_substring(paths, '\\', '/')
+
+    names = pc.struct_field(pc.extract_regex(paths, r'(?P<name>[^/]*)$'), [0])
+    names = pc.if_else(pc.is_valid(paths), names, pa.scalar(None, pa.string()))
+    has_directory = pc.match_substring(paths, '/')
+    directories = pc.if_else(has_directory, pc.replace_substring_regex(paths, r'/[^/]*$', ''), pa.scalar(None, pa.string()))
+
+    # Extensions are lower-cased on the dictionary, which is small
+    extensions = pc.struct_field(pc.extract_regex(names, r'\.(?P<extension>[^.]+)$'), [0]).dictionary_encode()
+    extensions = remap_dictionary(extensions, pc.utf8_lower(extensions.dictionary))
+    return [directories.dictionary_encode(), names, extensions]
+
+def remap_dictionary(array, values):
+    """
+    Replace every dictionary entry of a DictionaryArray by values[entry] (values may repeat or
+    be null) without touching the rows: only the small dictionary is re-encoded and the row
+    codes are gathered through it.
+
+    Returns:
+        pa.DictionaryArray: int32 codes into the unique non-null values.
+    """
+    encoded = values.dictionary_encode()
+    return pa.DictionaryArray.from_arrays(pc.take(encoded.indices, array.indices).cast(pa.int32()), encoded.dictionary)
+
+def encode_table(table):
+    """
+    Replace a table's 'path' column by PATH_COLUMNS at the same position; directory/extension
+    columns read as plain strings are dictionary-encoded.
+    """
+    if 'path' not in table.column_names:
+        for field in PATH_SCHEMA:
+            column = table.column(field.name)
+            if pa.types.is_dictionary(field.type) and not pa.types.is_dictionary(column.type):
+                table = table.set_column(table.column_names.index(field.name), field, column.cast(pa.string()).dictionary_encode())
+        return table
+    position = table.column_names.index('path')
+    arrays = split_paths(table.column('path'))
+    table = table.remove_column(position)
+    for offset, (field, array) in enumerate(zip(PATH_SCHEMA, arrays)):
+        table = table.add_column(position + offset, field, array)
+    return table
+
+def encode_frame(df):
+    """
+    Give a DataFrame the encoded path columns: a 'path' column is replaced by PATH_COLUMNS,
+    and directory/extension columns read as plain strings become Categoricals.
+
+    Returns:
+        pd.DataFrame: The frame with Categorical 'directory' and 'extension' and a 'name' column.
+    """
+    if 'path' in df.columns:
+        position = df.columns.get_loc('path')
+        arrays = split_paths(pa.array(df['path'], from_pandas=True))
+        df = df.drop(columns='path')
+        for offset, (column, array) in enumerate(zip(PATH_COLUMNS, arrays)):
+            df.insert(position + offset, column, array.to_pandas().set_axis(df.index))
+        return df
+    for column in ('directory', 'extension'):
+        if df[column].dtype != 'category':
+            df[column] = df[column].astype('category')
+    return df
+
+def frame_paths(df):
+    """
+    Full paths of a (small) frame with encoded path columns, e.g. the rows of a report.
+
+    Returns:
+        pd.Series: Path per row, with the frame's index.
+    """
+    if 'path' in df.columns:
+        return df['path']
+    directory = df['directory'].astype(object)
+    name = df['name'].astype(object)
+    return (directory + '/' + name).where(directory.notna(), name)
+
+def scan_columns(columns, available):
+    """
+    Columns to read from a file with the given available columns: 'path' stands for
+    PATH_COLUMNS when the file is encoded.
+    """
+    if 'path' in available or not set(PATH_COLUMNS) <= set(available):
+        return list(columns)
+    expanded = []
+    for column in columns:
+        expanded.extend(PATH_COLUMNS if column == 'path' else [column])
+    return expanded
@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+"""
+SQLite checkpoint index for megacollector's scandir engine.
+
+Every directory the crawler finishes is recorded together with its mtime, its
+file count and its file metadata. An interrupted scan can then be resumed from
+the pending directories, and a later scan can re-list only the directories
+whose mtime changed and reuse the stored files for everything else.
+"""
+import os
+import time
+import sqlite3
+import logging
+from statbatch import StatBatch
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS scans (
+    scan_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    root TEXT NOT NULL,
+    started REAL NOT NULL,
+    finished REAL
+);
+CREATE TABLE IF NOT EXISTS dirs (
+    path TEXT PRIMARY KEY,
+    parent TEXT,
+    scan_id INTEGER NOT NULL,
+    complete INTEGER NOT NULL DEFAULT 0,
+    mtime_ns INTEGER,
+    file_count INTEGER
+);
+CREATE INDEX IF NOT EXISTS dirs_parent ON dirs(parent);
+CREATE INDEX IF NOT EXISTS dirs_pending ON dirs(scan_id, complete);
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    dir TEXT NOT NULL,
+    access_time INTEGER,
+    modify_time INTEGER,
+    change_time INTEGER,
+    size INTEGER,
+    inode INTEGER,
+    errno INTEGER,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS files_dir ON files(dir);
+"""
+
+FILE_COLUMNS = ('path', 'access_time', 'modify_time', 'change_time', 'size', 'inode', 'errno', 'error')
+
+class ScanCheckpoint:
+    """
+    Read/write checkpoint store owned by the megacollector parent process.
+    Directory results are committed in batches so a crash loses at most the last batch,
+    and those directories are simply still pending on --resume.
+    """
+    def __init__(self, path, commit_interval=5.0):
+        self.path = path
+        self.commit_interval = commit_interval
+        self.conn = sqlite3.connect(path)
+        # WAL lets the crawler processes read previous listings while the parent writes
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.executescript(SCHEMA)
+        self.scan_id = None
+        self.last_commit = time.time()
+
+    def latest_scan(self):
+        return self.conn.execute(
+            'SELECT scan_id, root, finished FROM scans ORDER BY scan_id DESC LIMIT 1'
+        ).fetchone()
+
+    def start(self, root, mode, roots=None):
+        """
+        Start or continue a scan and return the directories to queue.
+        root names the scan (the mount point, plus the shard when sharding) and roots are
+        the directories it crawls (default: [root]).
+        mode is 'fresh' (discard the store), 'resume' (continue the last unfinished scan)
+        or 'incremental' (new scan that may reuse listings from the last finished scan).
+        """
+        roots = [root] if roots is None else roots
+        latest = self.latest_scan()
+        if mode == 'resume':
+            if latest is None or latest[2] is not None:
+                raise RuntimeError(f"No unfinished scan to resume in {self.path}")
+            if latest[1] != root:
+                raise RuntimeError(f"Checkpoint {self.path} belongs to a scan of {latest[1]}, not {root}")
+            self.scan_id = latest[0]
+            pending = [row[0] for row in self.conn.execute(
+                'SELECT path FROM dirs WHERE scan_id = ? AND complete = 0', (self.scan_id,)
+            )]
+            logging.info(f"Resuming scan {self.scan_id} of {root} with {len(pending)} pending directories.")
+            return pending
+
+        if mode == 'incremental':
+            if latest is None:
+                raise RuntimeError(f"No previous scan in {self.path} to compare against")
+            if latest[2] is None:
+                raise RuntimeError(f"The last scan in {self.path} did not finish; run with --resume first")
+            if latest[1] != root:
+                raise RuntimeError(f"Checkpoint {self.path} belongs to a scan of {latest[1]}, not {root}")
+        else:
+            self.conn.executescript('DELETE FROM files; DELETE FROM dirs; DELETE FROM scans;')
+
+        cursor = self.conn.execute('INSERT INTO scans (root, started) VALUES (?, ?)', (root, time.time()))
+        self.scan_id = cursor.lastrowid
+        self.queue_directories(None, roots)
+        self.conn.commit()
+        logging.info(f"Started {mode} scan {self.scan_id} of {root}.")
+        return roots
+
+    def queue_directories(self, parent, paths):
+        # Keep mtime_ns/file_count from the previous scan so the crawler can compare against them
+        self.conn.executemany(
+            'INSERT INTO dirs (path, parent, scan_id, complete) VALUES (?, ?, ?, 0) '
+            'ON CONFLICT(path) DO UPDATE SET parent = excluded.parent, scan_id = excluded.scan_id, complete = 0 '
+            'WHERE dirs.scan_id != excluded.scan_id',
+            [(path, parent, self.scan_id) for path in paths]
+        )
+
+    def record_directory(self, dir_path, mtime_ns, files, subdirs, reused):
+        """
+        Mark a directory complete for the current scan, store its StatBatch of files and queue its subdirectories.
+        Reused directories keep their stored files and file count.
+        """
+        self.queue_directories(dir_path, subdirs)
+        if reused:
+            self.conn.execute(
+                'UPDATE dirs SET complete = 1, scan_id = ? WHERE path = ?',
+                (self.scan_id, dir_path)
+            )
+        else:
+            self.conn.execute('DELETE FROM files WHERE dir = ?', (dir_path,))
+            self.conn.executemany(
+                f"INSERT OR REPLACE INTO files (dir, {', '.join(FILE_COLUMNS)}) VALUES (?{', ?' * len(FILE_COLUMNS)})",
+                ((dir_path,) + row for row in files.rows())
+            )
+            self.conn.execute(
+                'UPDATE dirs SET complete = 1, scan_id = ?, mtime_ns = ?, file_count = ? WHERE path = ?',
+                (self.scan_id, mtime_ns, len(files), dir_path)
+            )
+        if time.time() - self.last_commit >= self.commit_interval:
+            self.commit()
+
+    def stored_totals(self, dir_path):
+        """
+        (files stat'ed successfully, their bytes) stored for dir_path, for reporting reused directories.
+        """
+        return self.conn.execute(
+            'SELECT COUNT(*), COALESCE(SUM(size), 0) FROM files WHERE dir = ? AND errno = 0', (dir_path,)
+        ).fetchone()
+
+    def commit(self):
+        self.conn.commit()
+        self.last_commit = time.time()
+
+    def finish(self):
+        """
+        Drop directories (and their files) that were not seen by the current scan and mark it finished.
+        """
+        self.conn.execute('DELETE FROM dirs WHERE scan_id != ?', (self.scan_id,))
+        self.conn.execute('DELETE FROM files WHERE dir NOT IN (SELECT path FROM dirs)')
+        self.conn.execute('UPDATE scans SET finished = ? WHERE scan_id = ?', (time.time(), self.scan_id))
+        self.commit()
+
+    def iter_files(self, batch_size):
+        """
+        Yield the merged snapshot as StatBatches.
+        """
+        cursor = self.conn.execute(f"SELECT {', '.join(FILE_COLUMNS)} FROM files")
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            batch = StatBatch()
+            for row in rows:
+                batch.append_row(*row)
+            yield batch
+
+    def close(self):
+        self.commit()
+        self.conn.close()
+
+class CheckpointReader:
+    """
+    Read-only view of the checkpoint used by crawler processes to skip unchanged directories.
+    """
+    def __init__(self, path):
+        self.conn = sqlite3.connect(f'file:{os.path.abspath(path)}?mode=ro', uri=True)
+
+    def previous_listing(self, dir_path):
+        """
+        Return (mtime_ns, file_count, subdirectories) from the last completed listing of dir_path, or None.
+        """
+        row = self.conn.execute(
+            'SELECT mtime_ns, file_count FROM dirs WHERE path = ? AND mtime_ns IS NOT NULL', (dir_path,)
+        ).fetchone()
+        if row is None:
+            return None
+        subdirs = [r[0] for r in self.conn.execute('SELECT path FROM dirs WHERE parent = ?', (dir_path,))]
+        return row[0], row[1], subdirs
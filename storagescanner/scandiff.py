@@ -0,0 +1,303 @@
+#!/usr/bin/env python3
+"""
+Compare two megacollector scans of the same share and report what changed in between.
+
+Both scans (CSV or Parquet, including pathcodec-encoded Parquet and partitioned Parquet
+dataset directories) are hash-partitioned
+on path into temporary Parquet files, like scanmerge does, using the same hash for both,
+so a path lands in the same partition number in either scan. Each pair of partitions is
+then joined on path on its own and the per-partition totals are summed, so memory is
+bounded by one partition pair however large the scans are.
+
+For every path the diff reports whether it was added, deleted, grew or shrank, was
+accessed again (access time moved forward) and how its temperature changed: a file is
+hot when it was accessed at most --hot_threshold days before its scan's date and cold
+when more than --cold_threshold days before it, the same thresholds as analyzer.py.
+Totals are broken down by the directory at --depth, and every changed file can be
+written out with --changes.
+
+Example usage: scandiff.py /scans/2024-10.parquet /scans/2024-11.parquet --old_date 2024-10-01 --new_date 2024-11-01 --report diff.json
+"""
+import os
+import sys
+import json
+import shutil
+import logging
+import argparse
+import tempfile
+from datetime import datetime
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+from pathcodec import encode_table
+from scanmerge import read_metadata_chunks
+
+logging.basicConfig(
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    level=logging.INFO
+)
+
+# Columns kept from each scan
+DIFF_SCHEMA = pa.schema([
+    ('path', pa.string()),
+    ('size', pa.int64()),
+    ('access_time', pa.timestamp('ns')),
+    ('modify_time', pa.timestamp('ns')),
+])
+
+# Per-file change flags, in report order
+CHANGES = ['added', 'deleted', 'grown', 'shrunk', 'modified', 'accessed', 'hot_to_cold', 'became_cold', 'cold_to_hot']
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description='Compare two scans: added, deleted, grown and re-accessed files and data that turned cold.')
+    parser.add_argument('old', help='Earlier scan (.parquet or .csv, or a Parquet dataset directory such as parqConverter --partition writes)')
+    parser.add_argument('new', help='Later scan (.parquet or .csv, or a Parquet dataset directory such as parqConverter --partition writes)')
+    parser.add_argument('--old_date', default=None, help='Date of the earlier scan (YYYY-MM-DD; default: modification time of the file)')
+    parser.add_argument('--new_date', default=None, help='Date of the later scan (YYYY-MM-DD; default: modification time of the file)')
+    parser.add_argument('--hot_threshold', type=int, default=30, help='Days since access up to which a file is hot (default: 30)')
+    parser.add_argument('--cold_threshold', type=int, default=180, help='Days since access beyond which a file is cold (default: 180)')
+    parser.add_argument('--depth', type=int, default=4, help='Directory depth of the per-directory breakdown, counted like dir_depth_N in analyzer.py (default: 4)')
+    parser.add_argument('--top', type=int, default=20, help='Directories listed in the log, by absolute net size change (default: 20)')
+    parser.add_argument('--report', default=None, help='Write the totals and the full per-directory breakdown to this JSON file')
+    parser.add_argument('--changes', default=None, help='Write every changed file with its flags and both sizes (.parquet or .csv)')
+    parser.add_argument('--partitions', type=int, default=64, help='Hash partitions of the join (default: 64)')
+    parser.add_argument('--chunksize', type=int, default=1000000, help='Rows read per chunk (default: 1000000)')
+    parser.add_argument('--tmp_dir', default=None, help='Directory for the temporary partitions (default: system temp)')
+    return parser.parse_args()
+
+def scan_date(path, date):
+    """
+    Reference date of a scan: the given YYYY-MM-DD, or the scan file's modification time.
+    """
+    if date:
+        return pd.to_datetime(date)
+    return pd.Timestamp(datetime.fromtimestamp(os.path.getmtime(path)))
+
+def partition_scan(path, tmp_dir, prefix, partitions, chunksize):
+    """
+    Hash-partition the DIFF_SCHEMA columns of a scan on path into temporary Parquet files.
+    Returns (partition number -> file, rows read).
+    """
+    writers = {}
+    rows = 0
+    try:
+        for chunk in read_metadata_chunks(path, chunksize):
+            missing = [field.name for field in DIFF_SCHEMA if field.name not in chunk.columns]
+            if missing:
+                raise ValueError(f"{path} has no column(s) {missing}")
+            chunk = chunk[DIFF_SCHEMA.names]
+            rows += len(chunk)
+            buckets = pd.util.hash_pandas_object(chunk['path'], index=False).to_numpy() % partitions
+            for bucket, part in chunk.groupby(buckets):
+                if bucket not in writers:
+                    writers[bucket] = pq.ParquetWriter(os.path.join(tmp_dir, f'{prefix}-{bucket:05d}.parquet'), DIFF_SCHEMA)
+                writers[bucket].write_table(pa.Table.from_pandas(part, schema=DIFF_SCHEMA, preserve_index=False))
+    finally:
+        for writer in writers.values():
+            writer.close()
+    return {bucket: os.path.join(tmp_dir, f'{prefix}-{bucket:05d}.parquet') for bucket in writers}, rows
+
+def read_partition(partition_file):
+    """
+    One partition of a scan, one row per path (the last one, as scanmerge keeps).
+    """
+    if partition_file is None:
+        return pd.DataFrame({field.name: pd.Series(dtype=field.type.to_pandas_dtype()) for field in DIFF_SCHEMA})
+    df = pd.read_parquet(partition_file)
+    return df.drop_duplicates(subset='path', keep='last')
+
+def directory_prefix(paths, depth):
+    """
+    Directory of every path cut to its first depth components ('/mnt/share' has depth 3),
+    files in shallower directories keeping their own directory.
+    """
+    paths = pa.array(paths, type=pa.string())
+    directories = pc.replace_substring_regex(paths, r'/[^/]*$', '')
+    prefixes = pc.struct_field(pc.extract_regex(directories, rf'^(?P<prefix>[^/]*(?:/[^/]*){{0,{depth - 1}}})'), [0])
+    return prefixes.to_pandas()
+
+def diff_partition(old, new, old_date, new_date, hot_days, cold_days):
+    """
+    Join one partition of both scans on path and flag the changes of every path.
+
+    Returns:
+        (pd.DataFrame, dict): Paths with at least one change ('path', 'old_size', 'new_size' and
+            one boolean column per CHANGES entry), and the file counts and bytes of both scans.
+    """
+    merged = old.merge(new, on='path', how='outer', suffixes=('_old', '_new'), indicator=True)
+    in_old = merged['_merge'] != 'right_only'
+    in_new = merged['_merge'] != 'left_only'
+    both = (in_old & in_new).to_numpy()
+
+    old_size = merged['size_old'].to_numpy(dtype=np.float64)
+    new_size = merged['size_new'].to_numpy(dtype=np.float64)
+    # NaT ages compare False everywhere, so files without an access time have no temperature
+    old_age = (old_date - merged['access_time_old']).dt.days.to_numpy(dtype=np.float64)
+    new_age = (new_date - merged['access_time_new']).dt.days.to_numpy(dtype=np.float64)
+    old_cold = old_age > cold_days
+    new_cold = new_age > cold_days
+
+    flags = {
+        'added': ~in_old.to_numpy(),
+        'deleted': ~in_new.to_numpy(),
+        'grown': both & (new_size > old_size),
+        'shrunk': both & (new_size < old_size),
+        'modified': both & (merged['modify_time_new'] != merged['modify_time_old']).to_numpy()
+            & merged['modify_time_old'].notna().to_numpy() & merged['modify_time_new'].notna().to_numpy(),
+        'accessed': both & (merged['access_time_new'] > merged['access_time_old']).to_numpy(),
+        'hot_to_cold': both & (old_age <= hot_days) & new_cold,
+        'became_cold': both & (old_age <= cold_days) & new_cold,
+        'cold_to_hot': both & old_cold & (new_age <= hot_days),
+    }
+    changed = np.logical_or.reduce(list(flags.values()))
+    changes = pd.DataFrame({
+        'path': merged['path'].to_numpy()[changed],
+        'old_size': merged['size_old'].astype('Int64').array[changed],
+        'new_size': merged['size_new'].astype('Int64').array[changed],
+        **{name: flag[changed] for name, flag in flags.items()},
+    })
+    return changes, {'old_files': int(in_old.sum()), 'old_bytes': np.nansum(old_size), 'new_files': int(in_new.sum()), 'new_bytes': np.nansum(new_size)}
+
+def summary_columns():
+    return [f'{name}_{unit}' for name in CHANGES for unit in ('files', 'bytes')] + ['net_bytes']
+
+def summarize(changes, depth):
+    """
+    File counts and bytes of every change per directory prefix. Bytes are the new size, except
+    for deleted files (old size) and grown/shrunk files (the size difference).
+
+    Returns:
+        pd.DataFrame: One row per directory prefix, columns '<change>_files' and '<change>_bytes'.
+    """
+    old_size = changes['old_size'].fillna(0).astype(np.float64)
+    new_size = changes['new_size'].fillna(0).astype(np.float64)
+    columns = {}
+    for name in CHANGES:
+        flag = changes[name]
+        if name == 'deleted':
+            size = old_size
+        elif name in ('grown', 'shrunk'):
+            size = new_size - old_size
+        else:
+            size = new_size
+        columns[f'{name}_files'] = flag.astype(np.int64)
+        columns[f'{name}_bytes'] = size.where(flag, 0)
+    columns['net_bytes'] = new_size - old_size
+    return pd.DataFrame(columns).groupby(directory_prefix(changes['path'], depth).to_numpy(), dropna=False).sum()
+
+def diff_scans(args, old_date, new_date, tmp_dir):
+    """
+    Partition both scans, diff every partition pair and merge the per-directory totals.
+
+    Returns:
+        (pd.DataFrame, dict): Per-directory breakdown (see summarize()) and scan totals.
+    """
+    old_files, old_rows = partition_scan(args.old, tmp_dir, 'old', args.partitions, args.chunksize)
+    logging.info(f"Partitioned {old_rows} rows of {args.old}")
+    new_files, new_rows = partition_scan(args.new, tmp_dir, 'new', args.partitions, args.chunksize)
+    logging.info(f"Partitioned {new_rows} rows of {args.new}")
+
+    breakdown = pd.DataFrame(columns=summary_columns(), dtype=np.float64)
+    totals = {'old_files': 0, 'old_bytes': 0.0, 'new_files': 0, 'new_bytes': 0.0, 'changed_files': 0}
+    writer = None
+    first_csv_chunk = True
+    try:
+        for bucket in sorted(set(old_files) | set(new_files)):
+            old = read_partition(old_files.get(bucket))
+            new = read_partition(new_files.get(bucket))
+            changes, partition_totals = diff_partition(
+                old, new, old_date, new_date, args.hot_threshold, args.cold_threshold
+            )
+            for key, value in partition_totals.items():
+                totals[key] += value
+            if changes.empty:
+                continue
+            totals['changed_files'] += len(changes)
+            breakdown = breakdown.add(summarize(changes, args.depth), fill_value=0)
+            if args.changes and args.changes.endswith('.parquet'):
+                table = encode_table(pa.Table.from_pandas(changes, preserve_index=False))
+                if writer is None:
+                    writer = pq.ParquetWriter(args.changes, table.schema)
+                writer.write_table(table)
+            elif args.changes:
+                changes.to_csv(args.changes, mode='w' if first_csv_chunk else 'a', header=first_csv_chunk, index=False)
+                first_csv_chunk = False
+    finally:
+        if writer is not None:
+            writer.close()
+    return breakdown, totals
+
+def human_readable_size(size):
+    for unit in ['B', 'KB', 'MB', 'GB', 'TB', 'PB']:
+        if abs(size) < 1024:
+            return f"{size:.2f} {unit}"
+        size /= 1024
+    return f"{size:.2f} EB"
+
+def log_report(breakdown, totals, args):
+    overall = breakdown.sum()
+    logging.info(f"Old scan: {totals['old_files']:,} files, {human_readable_size(totals['old_bytes'])}")
+    logging.info(f"New scan: {totals['new_files']:,} files, {human_readable_size(totals['new_bytes'])}")
+    logging.info(f"Net change: {totals['new_files'] - totals['old_files']:+,} files, {human_readable_size(totals['new_bytes'] - totals['old_bytes'])}")
+    descriptions = {
+        'added': 'Added',
+        'deleted': 'Deleted',
+        'grown': 'Grown (bytes added)',
+        'shrunk': 'Shrunk (bytes removed)',
+        'modified': 'Modified',
+        'accessed': 'Accessed again',
+        'hot_to_cold': f'Hot (<= {args.hot_threshold} days) -> cold (> {args.cold_threshold} days)',
+        'became_cold': f'Newly cold (> {args.cold_threshold} days)',
+        'cold_to_hot': 'Cold -> hot',
+    }
+    for name in CHANGES:
+        logging.info(f"{descriptions[name]}: {int(overall[f'{name}_files']):,} files, {human_readable_size(overall[f'{name}_bytes'])}")
+
+    top = breakdown.reindex(breakdown['net_bytes'].abs().sort_values(ascending=False).index).head(args.top)
+    logging.info(f"Directories (depth {args.depth}) with the largest net size change:")
+    for directory, row in top.iterrows():
+        logging.info(
+            f"  {directory}: {human_readable_size(row['net_bytes'])} net, +{int(row['added_files']):,} / -{int(row['deleted_files']):,} files, "
+            f"{human_readable_size(row['became_cold_bytes'])} newly cold"
+        )
+
+def main():
+    args = parse_arguments()
+    if args.depth < 1:
+        sys.exit("Error: --depth must be at least 1.")
+    old_date = scan_date(args.old, args.old_date)
+    new_date = scan_date(args.new, args.new_date)
+    logging.info(f"Comparing {args.old} ({old_date.date()}) with {args.new} ({new_date.date()})")
+
+    tmp_dir = tempfile.mkdtemp(prefix='scandiff_', dir=args.tmp_dir)
+    try:
+        breakdown, totals = diff_scans(args, old_date, new_date, tmp_dir)
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+    log_report(breakdown, totals, args)
+
+    if args.report:
+        report = {
+            'old': args.old,
+            'new': args.new,
+            'old_date': str(old_date.date()),
+            'new_date': str(new_date.date()),
+            'hot_threshold': args.hot_threshold,
+            'cold_threshold': args.cold_threshold,
+            'totals': totals,
+            'changes': {column: float(value) for column, value in breakdown.sum().items()},
+            'directories': {
+                str(directory): {column: float(value) for column, value in row.items()}
+                for directory, row in breakdown.sort_values('net_bytes', ascending=False).iterrows()
+            },
+        }
+        with open(args.report, 'w') as fh:
+            json.dump(report, fh, indent=2)
+        logging.info(f"Report written to {args.report}")
+    if args.changes and totals['changed_files']:
+        logging.info(f"{totals['changed_files']:,} changed files written to {args.changes}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+--filter arguments of the analyzers and their push-down into Parquet reads.
+
+A filter is 'column<op>value' with op one of = (or ==), !=, <, <=, > and >=; a
+comma-separated value list with = or != means "one of" / "none of", e.g.
+
+    --filter season=2024 --filter department=Video,Audio --filter days_since_last_access>=180
+
+Filters on columns stored in a Parquet file or dataset become one Arrow dataset
+expression. The dataset scanner uses it to skip the files of partitions that do
+not match (parqConverter --partition writes a hive-style season=/event=/department=
+directory tree) and the row groups whose min/max statistics exclude every row,
+then filters the remaining rows exactly. Values are strings on the command line
+and are cast to the column's type, so size>1000000 compares numbers and
+access_time<2024-01-01 compares timestamps.
+"""
+import os
+import re
+import logging
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+
+# Directory levels of a partitioned dataset written by parqConverter --partition
+PARTITION_COLUMNS = ['season', 'event', 'department']
+
+FILTER_PATTERN = re.compile(r'^\s*(\w+)\s*(==|=|!=|<=|>=|<|>)\s*(.*?)\s*$')
+
+# Partition directories hold strings: without an explicit schema, season=2024 would be read as an integer
+PARTITIONING = ds.partitioning(pa.schema([(column, pa.string()) for column in PARTITION_COLUMNS]), flavor='hive')
+
+def parse_filter(text):
+    """
+    Parse one --filter argument.
+
+    Returns:
+        tuple: (column, operator, values) with operator one of '==', '!=', '<', '<=', '>', '>='
+            and values a list of strings (several only for '==' and '!=').
+    """
+    match = FILTER_PATTERN.match(text)
+    if not match:
+        raise ValueError(f"Invalid filter '{text}'; expected column<op>value with op one of =, !=, <, <=, >, >=")
+    column, operator, value = match.groups()
+    operator = '==' if operator == '=' else operator
+    values = [v.strip() for v in value.split(',')] if operator in ('==', '!=') else [value]
+    return column, operator, values
+
+def parse_filters(texts):
+    return [parse_filter(text) for text in texts or []]
+
+def format_filters(filters):
+    """
+    Filters as the command line spelled them, e.g. for logging and cache keys.
+    """
+    return [f"{column}{operator}{','.join(values)}" for column, operator, values in filters]
+
+def open_dataset(path):
+    """
+    A Parquet file, or a directory of Parquet files (hive-partitioned or not), as an Arrow dataset.
+    """
+    if os.path.isdir(path):
+        return ds.dataset(path, format='parquet', partitioning=PARTITIONING)
+    return ds.dataset(path, format='parquet')
+
+def value_type(field_type):
+    return field_type.value_type if pa.types.is_dictionary(field_type) else field_type
+
+def filter_expression(filters, schema):
+    """
+    AND of the filters as a dataset expression over schema, or None without filters.
+    """
+    expression = None
+    for column, operator, values in filters:
+        if column not in schema.names:
+            raise ValueError(f"Cannot filter on '{column}': no such column (available: {', '.join(schema.names)})")
+        cast_to = value_type(schema.field(column).type)
+        try:
+            values = pa.array(values).cast(cast_to)
+        except (pa.ArrowInvalid, pa.ArrowNotImplementedError) as e:
+            raise ValueError(f"Cannot compare column '{column}' of type {cast_to} with {values}: {e}")
+        field = ds.field(column)
+        if operator in ('==', '!='):
+            term = field.isin(values) if len(values) > 1 else field == values[0]
+            term = ~term if operator == '!=' else term
+        else:
+            value = values[0]
+            term = {'<': field < value, '<=': field <= value, '>': field > value, '>=': field >= value}[operator]
+        expression = term if expression is None else expression & term
+    return expression
+
+def split_filters(filters, columns):
+    """
+    Separate the filters on columns (which can be pushed into the read) from the others.
+
+    Returns:
+        (list, list): Pushed and remaining filters.
+    """
+    pushed = [f for f in filters if f[0] in columns]
+    return pushed, [f for f in filters if f[0] not in columns]
+
+def read_table(path, filters=None, columns=None):
+    """
+    Read a Parquet file or dataset directory, reading only the files and row groups the
+    filters can match and only the given columns.
+
+    Returns:
+        pa.Table: The matching rows.
+    """
+    dataset = open_dataset(path)
+    expression = filter_expression(filters or [], dataset.schema)
+    if expression is not None:
+        fragments = list(dataset.get_fragments())
+        matching = list(dataset.get_fragments(filter=expression))
+        row_groups = sum(fragment.num_row_groups for fragment in fragments)
+        matching_row_groups = sum(len(fragment.split_by_row_group(filter=expression, schema=dataset.schema)) for fragment in matching)
+        logging.info(
+            f"Filters {format_filters(filters)}: reading {len(matching)} of {len(fragments)} files, "
+            f"{matching_row_groups} of {row_groups} row groups."
+        )
+    return dataset.to_table(columns=columns, filter=expression)
+
+def apply_filters(df, filters):
+    """
+    Apply filters to a DataFrame, e.g. on columns derived after loading.
+
+    Returns:
+        pd.DataFrame: The matching rows.
+    """
+    if not filters:
+        return df
+    mask = np.ones(len(df), dtype=bool)
+    for column, operator, values in filters:
+        if column not in df.columns:
+            raise ValueError(f"Cannot filter on '{column}': no such column (available: {', '.join(df.columns)})")
+        series = df[column]
+        if isinstance(series.dtype, pd.CategoricalDtype):
+            series = series.astype(series.cat.categories.dtype)
+        if pd.api.types.is_datetime64_any_dtype(series):
+            values = list(pd.to_datetime(values))
+        elif pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series):
+            values = list(pd.to_numeric(values))
+        if operator in ('==', '!='):
+            matches = series.isin(values)
+            matches = ~matches if operator == '!=' else matches
+        else:
+            matches = {'<': series.lt, '<=': series.le, '>': series.gt, '>=': series.ge}[operator](values[0])
+        mask &= matches.fillna(False).to_numpy(dtype=bool)
+    # take() returns a new frame rather than a view, so callers can add columns to it
+    return df.take(np.flatnonzero(mask))
@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+"""
+Merge the outputs of sharded megacollector runs (--shard i/N) into one dataset.
+
+Metadata files (CSV or Parquet, in any mix) are hash-partitioned on path into
+temporary Parquet files and every partition is deduplicated on its own, so
+memory is bounded by one partition rather than by the whole share. When a path
+appears more than once (e.g. a shard pod was retried), the row from the input
+listed last wins. The shards' error CSVs (inaccessible directories and files that
+failed to stat) are concatenated the same way. Partitioning and deduplication work on
+the full path; a Parquet output is written with the dictionary-encoded path columns of
+pathcodec, like megacollector's own Parquet output.
+
+Example usage: scanmerge.py /tmp/metadata.parquet /tmp/shard-*.parquet --inaccessible /tmp/inaccessible-*.csv --inaccessible_out /tmp/inaccessible.csv
+"""
+import os
+import sys
+import shutil
+import logging
+import argparse
+import tempfile
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from pathcodec import PATH_COLUMNS, encode_table, frame_paths
+from scanfilter import open_dataset
+
+logging.basicConfig(
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    level=logging.INFO
+)
+
+TIME_FIELDS = ('access_time', 'modify_time', 'change_time')
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description='Merge sharded megacollector outputs into one deduplicated dataset.')
+    parser.add_argument('output', help='Merged metadata file (.parquet or .csv)')
+    parser.add_argument('inputs', nargs='+', help='Shard metadata files (.parquet or .csv)')
+    parser.add_argument('--inaccessible', nargs='*', default=[], help='Shard inaccessible-directory CSV files')
+    parser.add_argument('--inaccessible_out', default='inaccessible_directories.csv', help='Merged inaccessible-directory CSV (default: inaccessible_directories.csv)')
+    parser.add_argument('--partitions', type=int, default=64, help='Hash partitions used for deduplication (default: 64)')
+    parser.add_argument('--chunksize', type=int, default=1000000, help='Rows read per chunk (default: 1000000)')
+    parser.add_argument('--row_group_size', type=int, default=1000000, help='Rows per row group of a Parquet output (default: 1000000)')
+    parser.add_argument('--tmp_dir', default=None, help='Directory for the temporary partitions (default: system temp)')
+    return parser.parse_args()
+
+def read_metadata_chunks(path, chunksize):
+    """
+    Yield DataFrame chunks of a megacollector output with parsed timestamp columns
+    and a plain 'path' column. A directory is read as a Parquet dataset, e.g. the output
+    of parqConverter --partition.
+    """
+    if os.path.isdir(path) or path.endswith('.parquet'):
+        if os.path.isdir(path):
+            batches = open_dataset(path).to_batches(batch_size=chunksize)
+        else:
+            batches = pq.ParquetFile(path).iter_batches(batch_size=chunksize)
+        for batch in batches:
+            chunk = batch.to_pandas()
+            if 'path' not in chunk.columns:
+                chunk.insert(chunk.columns.get_loc('directory'), 'path', frame_paths(chunk).astype('string'))
+                chunk = chunk.drop(columns=PATH_COLUMNS)
+            yield chunk
+        return
+    columns = pd.read_csv(path, nrows=0).columns
+    yield from pd.read_csv(
+        path,
+        parse_dates=[column for column in TIME_FIELDS if column in columns],
+        dtype={'path': 'string', 'file_type': 'string'},
+        chunksize=chunksize
+    )
+
+def arrow_schema(columns):
+    """
+    Arrow schema of megacollector's output columns (the same types as --format parquet writes).
+    """
+    fields = []
+    for column in columns:
+        if column in TIME_FIELDS:
+            fields.append((column, pa.timestamp('ns')))
+        elif column in ('size', '_seq'):
+            fields.append((column, pa.int64()))
+        elif column == 'inode':
+            fields.append((column, pa.uint64()))
+        else:
+            fields.append((column, pa.string()))
+    return pa.schema(fields)
+
+def partition_inputs(inputs, tmp_dir, partitions, chunksize):
+    """
+    Hash-partition all input rows on path into temporary Parquet files.
+    Returns (partition file paths, columns, rows read).
+    """
+    writers = {}
+    columns = None
+    schema = None
+    rows = 0
+    try:
+        for input_path in inputs:
+            logging.info(f"Partitioning {input_path}")
+            for chunk in read_metadata_chunks(input_path, chunksize):
+                if columns is None:
+                    columns = list(chunk.columns)
+                    schema = arrow_schema(columns + ['_seq'])
+                elif list(chunk.columns) != columns:
+                    raise ValueError(f"{input_path} has columns {list(chunk.columns)}, expected {columns}")
+                # Global row order decides which duplicate is kept
+                chunk['_seq'] = range(rows, rows + len(chunk))
+                rows += len(chunk)
+                buckets = pd.util.hash_pandas_object(chunk['path'], index=False).to_numpy() % partitions
+                for bucket, part in chunk.groupby(buckets):
+                    if bucket not in writers:
+                        writers[bucket] = pq.ParquetWriter(os.path.join(tmp_dir, f'part-{bucket:05d}.parquet'), schema)
+                    writers[bucket].write_table(pa.Table.from_pandas(part, schema=schema, preserve_index=False))
+    finally:
+        for writer in writers.values():
+            writer.close()
+    return [os.path.join(tmp_dir, f'part-{bucket:05d}.parquet') for bucket in sorted(writers)], columns, rows
+
+def write_merged(partition_files, columns, output, row_group_size):
+    """
+    Deduplicate every partition on path (last input wins) and write it to the output.
+    Returns the number of rows written.
+    """
+    written = 0
+    writer = None
+    first_csv_chunk = True
+    try:
+        for partition_file in partition_files:
+            df = pd.read_parquet(partition_file)
+            df = df.sort_values('_seq').drop_duplicates(subset='path', keep='last').drop(columns='_seq')
+            written += len(df)
+            if output.endswith('.parquet'):
+                table = encode_table(pa.Table.from_pandas(df, schema=arrow_schema(columns), preserve_index=False))
+                if writer is None:
+                    writer = pq.ParquetWriter(output, table.schema)
+                writer.write_table(table, row_group_size=row_group_size)
+            else:
+                for column in TIME_FIELDS:
+                    if column in df.columns:
+                        df[column] = df[column].dt.strftime('%Y-%m-%d %H:%M:%S')
+                df.to_csv(output, mode='w' if first_csv_chunk else 'a', header=first_csv_chunk, index=False)
+                first_csv_chunk = False
+    finally:
+        if writer is not None:
+            writer.close()
+    return written
+
+def merge_inaccessible(inputs, output):
+    """
+    Concatenate the shards' error CSVs, keeping one row per path.
+    """
+    frames = [pd.read_csv(path, dtype='string') for path in inputs]
+    merged = pd.concat(frames, ignore_index=True).drop_duplicates(subset='path', keep='last')
+    merged.to_csv(output, index=False)
+    return len(merged)
+
+def main():
+    args = parse_arguments()
+    tmp_dir = tempfile.mkdtemp(prefix='scanmerge_', dir=args.tmp_dir)
+    try:
+        partition_files, columns, rows = partition_inputs(args.inputs, tmp_dir, args.partitions, args.chunksize)
+        if columns is None:
+            sys.exit("Error: the inputs contain no rows.")
+        written = write_merged(partition_files, columns, args.output, args.row_group_size)
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+    logging.info(f"Merged {rows} rows from {len(args.inputs)} inputs into {written} unique paths ({rows - written} duplicates dropped): {args.output}")
+
+    if args.inaccessible:
+        count = merge_inaccessible(args.inaccessible, args.inaccessible_out)
+        logging.info(f"Merged {count} inaccessible directories into {args.inaccessible_out}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,264 @@
+#!/usr/bin/env python3
+"""
+Scan telemetry for megacollector.
+
+The parent process feeds every StatBatch, listed directory and error into a
+ScanMetrics object. It can be scraped while the scan runs through a small
+/metrics HTTP endpoint in the Prometheus text format (stdlib only, so the
+scanner needs no extra packages) and is written as a JSON run report at the end.
+
+Together the numbers show where a slow scan is limited: high stat latency with
+idle workers points at the NAS or the network, busy workers with low latency
+and a full CPU point at the scanner host.
+"""
+import json
+import time
+import logging
+import threading
+from array import array
+from collections import Counter, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from statbatch import LATENCY_BUCKETS
+
+class ScanMetrics:
+    """
+    Thread-safe counters and gauges of one scan. Updates come from the main thread,
+    reads from the HTTP server thread.
+    """
+    def __init__(self, engine, workers, rate_window=10.0):
+        self.engine = engine
+        self.workers = workers
+        self.rate_window = rate_window
+        self.lock = threading.Lock()
+        self.started = time.time()
+        self.finished = None
+        self.files = 0
+        self.bytes = 0
+        # Files and bytes of directories reused from the checkpoint, which are not stat'ed again
+        self.files_reused = 0
+        self.bytes_reused = 0
+        self.directories = 0
+        self.directories_queued = 0
+        self.peak_directories_pending = 0
+        self.latency = array('q', bytes(8 * (len(LATENCY_BUCKETS) + 1)))
+        self.latency_seconds = 0.0
+        self.busy = Counter()
+        self.errors = Counter()
+        self.gauges = {}
+        # (time, files, directories, bytes) samples for the current rates
+        self.samples = deque([(self.started, 0, 0, 0)])
+
+    def add_roots(self, count):
+        with self.lock:
+            self.directories_queued += count
+
+    def observe_batch(self, batch):
+        """
+        Count the files of a StatBatch and merge its latency histogram and worker busy time.
+        """
+        with self.lock:
+            self.files += len(batch) - len(batch.error)
+            self.bytes += sum(batch.size)
+            for bucket, count in enumerate(batch.latency):
+                self.latency[bucket] += count
+            self.latency_seconds += batch.latency_seconds
+            self.busy.update(batch.busy)
+            self.sample()
+
+    def observe_reused(self, files, size):
+        """
+        Count the stored files of a directory reused from the checkpoint (--incremental).
+        """
+        with self.lock:
+            self.files_reused += files
+            self.bytes_reused += size
+
+    def observe_directory(self, subdirs):
+        """
+        Count a listed directory that found subdirs subdirectories to crawl next.
+        """
+        with self.lock:
+            self.directories += 1
+            self.directories_queued += subdirs
+            pending = self.directories_queued - self.directories
+            self.peak_directories_pending = max(self.peak_directories_pending, pending)
+            self.sample()
+
+    def observe_error(self, kind, errno_name):
+        with self.lock:
+            self.errors[(kind, errno_name)] += 1
+
+    def set_gauge(self, name, value):
+        with self.lock:
+            self.gauges[name] = value
+
+    def finish(self):
+        with self.lock:
+            self.finished = time.time()
+
+    def sample(self):
+        # Called with the lock held
+        now = time.time()
+        if now - self.samples[-1][0] >= 1.0:
+            self.samples.append((now, self.files, self.directories, self.bytes))
+        while len(self.samples) > 2 and now - self.samples[1][0] >= self.rate_window:
+            self.samples.popleft()
+
+    def rates(self):
+        """
+        (files/s, directories/s, bytes/s) over roughly the last rate_window seconds.
+        """
+        now = self.finished or time.time()
+        start, files, directories, size = self.samples[0]
+        elapsed = now - start
+        if elapsed <= 0:
+            return 0.0, 0.0, 0.0
+        return (self.files - files) / elapsed, (self.directories - directories) / elapsed, (self.bytes - size) / elapsed
+
+    def elapsed(self):
+        return (self.finished or time.time()) - self.started
+
+    def latency_quantile(self, q):
+        """
+        Upper bound of the histogram bucket holding quantile q, None without observations
+        (or when it falls in the open-ended last bucket).
+        """
+        total = sum(self.latency)
+        if not total:
+            return None
+        rank = q * total
+        seen = 0
+        for bucket, count in enumerate(self.latency):
+            seen += count
+            if seen >= rank:
+                return LATENCY_BUCKETS[bucket] if bucket < len(LATENCY_BUCKETS) else None
+        return None
+
+    def utilization(self):
+        """
+        Share of the wall time each worker spent listing and stat'ing.
+        """
+        elapsed = self.elapsed()
+        return {worker: (seconds / elapsed if elapsed > 0 else 0.0) for worker, seconds in self.busy.items()}
+
+    def render(self):
+        """
+        Prometheus text exposition of the current values.
+        """
+        with self.lock:
+            files_rate, dirs_rate, bytes_rate = self.rates()
+            lines = []
+
+            def metric(name, kind, help_text, samples):
+                lines.append(f"# HELP megacollector_{name} {help_text}")
+                lines.append(f"# TYPE megacollector_{name} {kind}")
+                for labels, value in samples:
+                    label_text = ','.join(f'{key}="{val}"' for key, val in labels.items())
+                    lines.append(f"megacollector_{name}{{{label_text}}} {value}" if label_text else f"megacollector_{name} {value}")
+
+            metric('info', 'gauge', 'Scan engine and worker count.', [({'engine': self.engine, 'workers': self.workers}, 1)])
+            metric('elapsed_seconds', 'gauge', 'Seconds since the scan started.', [({}, round(self.elapsed(), 3))])
+            metric('files_total', 'counter', "Files stat'ed successfully.", [({}, self.files)])
+            metric('bytes_total', 'counter', 'Bytes in the files found.', [({}, self.bytes)])
+            metric('files_reused_total', 'counter', 'Files of unchanged directories reused from the checkpoint.', [({}, self.files_reused)])
+            metric('bytes_reused_total', 'counter', 'Bytes in the files reused from the checkpoint.', [({}, self.bytes_reused)])
+            metric('directories_total', 'counter', 'Directories listed.', [({}, self.directories)])
+            metric('files_per_second', 'gauge', f'Files per second over the last {self.rate_window:g} seconds.', [({}, round(files_rate, 1))])
+            metric('directories_per_second', 'gauge', f'Directories per second over the last {self.rate_window:g} seconds.', [({}, round(dirs_rate, 1))])
+            metric('bytes_per_second', 'gauge', f'Bytes found per second over the last {self.rate_window:g} seconds.', [({}, round(bytes_rate, 1))])
+            metric('queue_depth', 'gauge', 'Work waiting in the scan queues.',
+                   [({'queue': 'directories'}, self.directories_queued - self.directories)]
+                   + [({'queue': name[len('queue_'):]}, value) for name, value in sorted(self.gauges.items()) if name.startswith('queue_')])
+
+            lines.append("# HELP megacollector_stat_latency_seconds Latency of single file stat calls.")
+            lines.append("# TYPE megacollector_stat_latency_seconds histogram")
+            cumulative = 0
+            for bound, count in zip(LATENCY_BUCKETS + ('+Inf',), self.latency):
+                cumulative += count
+                lines.append(f'megacollector_stat_latency_seconds_bucket{{le="{bound}"}} {cumulative}')
+            lines.append(f"megacollector_stat_latency_seconds_sum {self.latency_seconds}")
+            lines.append(f"megacollector_stat_latency_seconds_count {cumulative}")
+
+            metric('worker_busy_seconds_total', 'counter', 'Seconds each worker spent listing and stat\'ing.',
+                   [({'worker': worker}, round(seconds, 3)) for worker, seconds in sorted(self.busy.items())])
+            metric('worker_utilization', 'gauge', 'Busy share of the wall time per worker.',
+                   [({'worker': worker}, round(value, 4)) for worker, value in sorted(self.utilization().items())])
+            metric('errors_total', 'counter', 'Inaccessible directories and files by errno.',
+                   [({'kind': kind, 'errno': name}, count) for (kind, name), count in sorted(self.errors.items())])
+            metric('system', 'gauge', 'Host CPU and memory usage in percent (--monitor).',
+                   [({'resource': name[len('system_'):]}, value) for name, value in sorted(self.gauges.items()) if name.startswith('system_')])
+            return '\n'.join(lines) + '\n'
+
+    def report(self, extra=None):
+        """
+        Final run report as a JSON-serializable dict.
+        """
+        with self.lock:
+            elapsed = self.elapsed()
+            utilization = self.utilization()
+            report = dict(extra or {})
+            report.update({
+                'engine': self.engine,
+                'workers': self.workers,
+                'started': self.started,
+                'finished': self.finished,
+                'elapsed_seconds': round(elapsed, 3),
+                'files': self.files,
+                'bytes': self.bytes,
+                'files_reused': self.files_reused,
+                'bytes_reused': self.bytes_reused,
+                'directories': self.directories,
+                'files_per_second': round(self.files / elapsed, 1) if elapsed > 0 else None,
+                'directories_per_second': round(self.directories / elapsed, 1) if elapsed > 0 else None,
+                'bytes_per_second': round(self.bytes / elapsed, 1) if elapsed > 0 else None,
+                'peak_directories_pending': self.peak_directories_pending,
+                'stat_latency': {
+                    'count': sum(self.latency),
+                    'mean_seconds': self.latency_seconds / sum(self.latency) if sum(self.latency) else None,
+                    'p50_seconds_at_most': self.latency_quantile(0.5),
+                    'p90_seconds_at_most': self.latency_quantile(0.9),
+                    'p99_seconds_at_most': self.latency_quantile(0.99),
+                    'buckets': {str(bound): count for bound, count in zip(LATENCY_BUCKETS + ('+Inf',), self.latency)},
+                },
+                'worker_utilization': {
+                    'mean': round(sum(utilization.values()) / self.workers, 4) if self.workers else None,
+                    'per_worker': {worker: round(value, 4) for worker, value in sorted(utilization.items())},
+                },
+                'errors': [
+                    {'kind': kind, 'errno': name, 'count': count}
+                    for (kind, name), count in self.errors.most_common()
+                ],
+                'gauges': dict(self.gauges),
+            })
+            return report
+
+    def write_report(self, path, extra=None):
+        with open(path, 'w', encoding='utf-8') as fh:
+            json.dump(self.report(extra), fh, indent=2)
+
+def serve_metrics(metrics, port, address=''):
+    """
+    Serve metrics.render() on http://address:port/metrics from a daemon thread.
+    Returns the server; call shutdown() on it to stop.
+    """
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split('?')[0] != '/metrics':
+                self.send_error(404)
+                return
+            body = metrics.render().encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            # Scrapes every few seconds would flood the scan log
+            pass
+
+    server = ThreadingHTTPServer((address, port), MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    logging.info(f"Serving scan metrics on http://{address or '0.0.0.0'}:{port}/metrics")
+    return server
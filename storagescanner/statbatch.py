@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Column-oriented container for file stat results.
+
+The scan engines fill one StatBatch per work item instead of building a
+dictionary per file. Numeric columns are array.array buffers, so a batch
+pickles as a handful of byte strings when it crosses process boundaries.
+Each batch also carries the telemetry of the worker that produced it (a stat
+latency histogram and busy seconds per worker), which the parent aggregates
+into the scan metrics.
+"""
+from array import array
+from bisect import bisect_left
+
+# Upper bounds (seconds) of the stat latency histogram buckets; one more bucket counts everything slower
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+class StatBatch:
+    """
+    Stat results for a batch of files.
+    Times are raw epoch nanoseconds and stay integers until an output writer converts them.
+    errno is 0 for files that were stat'ed successfully; their numeric columns hold 0 otherwise.
+    """
+    __slots__ = ('path', 'access_time', 'modify_time', 'change_time', 'size', 'inode', 'errno', 'error',
+                 'latency', 'latency_seconds', 'busy')
+
+    NUMERIC_COLUMNS = ('access_time', 'modify_time', 'change_time', 'size', 'inode')
+
+    def __init__(self):
+        self.path = []
+        self.access_time = array('q')
+        self.modify_time = array('q')
+        self.change_time = array('q')
+        self.size = array('q')
+        self.inode = array('Q')
+        self.errno = array('i')
+        # Row index -> error message, only for rows that failed
+        self.error = {}
+        # Stat latency histogram over LATENCY_BUCKETS, their total, and worker name -> busy seconds
+        self.latency = array('q', bytes(8 * (len(LATENCY_BUCKETS) + 1)))
+        self.latency_seconds = 0.0
+        self.busy = {}
+
+    def __len__(self):
+        return len(self.path)
+
+    def append_stat(self, path, stat_info):
+        self.path.append(path)
+        self.access_time.append(stat_info.st_atime_ns)
+        self.modify_time.append(stat_info.st_mtime_ns)
+        self.change_time.append(stat_info.st_ctime_ns)
+        self.size.append(stat_info.st_size)
+        self.inode.append(stat_info.st_ino)
+        self.errno.append(0)
+
+    def append_error(self, path, error):
+        self.error[len(self.path)] = str(error)
+        self.path.append(path)
+        for column in self.NUMERIC_COLUMNS:
+            getattr(self, column).append(0)
+        # -1 marks failures that did not carry an errno
+        self.errno.append(getattr(error, 'errno', None) or -1)
+
+    def append_row(self, path, access_time, modify_time, change_time, size, inode, error_code, error):
+        """
+        Append an already-decoded row, e.g. one read back from the checkpoint store.
+        """
+        if error_code:
+            self.error[len(self.path)] = error
+        self.path.append(path)
+        self.access_time.append(access_time)
+        self.modify_time.append(modify_time)
+        self.change_time.append(change_time)
+        self.size.append(size)
+        self.inode.append(inode)
+        self.errno.append(error_code)
+
+    def observe_latency(self, seconds):
+        self.latency[bisect_left(LATENCY_BUCKETS, seconds)] += 1
+        self.latency_seconds += seconds
+
+    def add_busy(self, worker, seconds):
+        self.busy[worker] = self.busy.get(worker, 0.0) + seconds
+
+    def extend(self, other):
+        offset = len(self.path)
+        self.path.extend(other.path)
+        for column in self.NUMERIC_COLUMNS + ('errno',):
+            getattr(self, column).extend(getattr(other, column))
+        for index, message in other.error.items():
+            self.error[offset + index] = message
+        self.merge_telemetry(other)
+
+    def merge_telemetry(self, other):
+        for bucket, count in enumerate(other.latency):
+            self.latency[bucket] += count
+        self.latency_seconds += other.latency_seconds
+        for worker, seconds in other.busy.items():
+            self.add_busy(worker, seconds)
+
+    def without_errors(self):
+        """
+        Return a batch of only the rows that stat'ed successfully (self when none failed).
+        """
+        if not self.error:
+            return self
+        batch = StatBatch()
+        for row in self.rows():
+            if not row[6]:
+                batch.append_row(*row)
+        batch.merge_telemetry(self)
+        return batch
+
+    def rows(self):
+        """
+        Iterate (path, access_time, modify_time, change_time, size, inode, errno, error) tuples.
+        """
+        for index, values in enumerate(zip(
+            self.path, self.access_time, self.modify_time, self.change_time, self.size, self.inode, self.errno
+        )):
+            yield values + (self.error.get(index),)